@@ -16,6 +16,30 @@ explorer_settings = {
     "storage_path": "./storage/exp_store.json",
     "depreiciate_exp_store_path": "./storage/depreiciate_exp_store.json",
     "alpha": 10,
+    "prefix_kv_cache": True,  # Local models keep the KV cache of the env's static system prompt prefix
+    "constrained_action_decoding": None,  # None, "sample" or "argmax": local models pick discrete actions (FrozenLake, MountainCar) from the action-token logits of one forward pass
+    "candidate_ranking": None,  # None, "sample" or "argmax": local models pick WebShop click[...] actions by their mean token log-likelihood (one batch), search queries are still generated
+    "action_stop_pattern": True,  # Local models stop decoding at the end of the action (first digit, closing "]") instead of max_new_tokens; API responses are cut there client-side
+    "multi_sample_actions": True,  # After an invalid action, sample all remaining retries in one model call (num_return_sequences / n) instead of one call per retry
+}
+llm_cache = {
+    "enabled": False,                          # Wrap the explorer model with CachedExplorerModel
+    "cache_path": "./storage/llm_cache.json",
+    "mode": "replay",                          # "replay" (k-th call returns the k-th recorded response) or "rotate" (cycle through num_samples responses)
+    "num_samples": 4,                          # Only used when mode is "rotate"
+    "max_entries": 200000,                     # LRU bound on the number of cached prompts, None for unbounded
+    "seed": 0,                                 # Part of the cache key, change it to start a fresh cache
+    "save_every": 50,                          # Write the cache every N new responses (and at exit)
+}
+async_openai = {
+    "enabled": False,                          # Use AsyncOpenAIExplorerModel for API models
+    "timeout": 30.0,                           # Seconds per request
+    "max_attempts": 6,                         # Attempts per request, 429 / 5xx / timeouts are retried with jittered exponential backoff
+    "backoff_base": 0.5,                       # Seconds, doubled per attempt
+    "backoff_max": 30.0,                       # Cap on one backoff sleep (also on Retry-After)
+    "max_concurrency": 16,                     # In-flight requests per endpoint, shared by every episode of the process
+    "requests_per_second": None,               # Token-bucket rate limit per endpoint and process, None for unlimited
+    "burst": 4,                                # Token-bucket capacity
 }
 model_path = {
     # llama3 models
@@ -118,6 +118,15 @@ def format_full_openai_prompt(system_prompt, user_prompt):
     prompt = f"{system_prompt}\n\n{user_prompt}"
     return prompt
 
+def static_prompt_prefix(format_full_prompt, system_prompt):
+    """
+    format_full_prompt(system_prompt, user_prompt) 中 user_prompt 之前的部分。
+    同一个环境每一步都相同，本地模型可以缓存它的 KV。
+    """
+    marker = "\x00USER_PROMPT\x00"
+    full_prompt = format_full_prompt(system_prompt, marker)
+    return full_prompt[:full_prompt.index(marker)]
+
 def choose_format_full_prompt(model_name):
     # choose the format_full_xxx_prompt function
     if "llama" in model_name:
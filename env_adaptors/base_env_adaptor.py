@@ -19,6 +19,18 @@ class BaseEnvAdaptor:
     def get_action_prompt(self, instruction: str, state: dict, available_actions: list) -> str:
         raise NotImplementedError
 
+    def get_static_prompt_prefix(self) -> str:
+        """The part of every action prompt before the per-step user prompt, None if there is none."""
+        return None
+
+    def get_action_stop_pattern(self) -> str:
+        """Regex matching the end of an action in the model's response, decoding stops there. None to decode up to max_new_tokens."""
+        return None
+
+    def get_action_candidates(self) -> list:
+        """Every valid action of the current state as a full action string, None if they cannot be enumerated."""
+        return None
+
     def reconstruct_st(self, exp):
         """Reconstruct the state from the experience."""
         assert exp['action'] == exp['action_path'][-1]
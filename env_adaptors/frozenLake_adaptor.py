@@ -3,9 +3,9 @@ import os
 import random
 import gymnasium as gym
 from .base_env_adaptor import BaseEnvAdaptor
-from .adopter_util import frozenlake_goal_positions, choose_format_full_prompt
+from .adopter_util import frozenlake_goal_positions, choose_format_full_prompt, static_prompt_prefix
 from .env_config import frozenlake_config
-from utils import get_timestamp_ms
+from utils import new_trajectory_id
 import re
 from .adaptor_prompt_factory import build_frozenlake_user_prompt, FROZENLAKE_SYSTEM_PROMPT
 
@@ -46,6 +46,7 @@ class FrozenLakeAdaptor(BaseEnvAdaptor):
 
         # history records
         self.action_path = []
+        self.trajectory_id = None
         self.st = None
         self.prev_action = None
         self.st1 = None
@@ -66,6 +67,7 @@ class FrozenLakeAdaptor(BaseEnvAdaptor):
         self.prev_action = None
         self.st1 = self.get_state()
         self.action_path = []
+        self.trajectory_id = new_trajectory_id(self.destination_label)
         self.terminated = False
         self.reward = None
 
@@ -168,7 +170,10 @@ Init new environment:
         if self.st is None or self.prev_action is None or self.st1 is None:
             raise ValueError("[frozenLake_adaptor] In get_experience(), the history is not set, one of st0, a or st1 is None")
         experience = {
-            "id": f"{get_timestamp_ms()}_{self.destination_label}_{'-'.join(map(str, self.action_path))}",
+            "id": f"{self.trajectory_id}_{len(self.action_path)}",
+            # The backend keeps one shared action path per trajectory, see TrajectoryTable
+            "trajectory_id": self.trajectory_id,
+            "trajectory_step": len(self.action_path),
             "reproduce_method": self.reproduce_method,
             "action_path": self.get_action_path(),  # Use copy() to avoid reference issue
             "st": self.st,
@@ -235,7 +240,14 @@ Init new environment:
             print(f"[PROBLEM] Multiple actions found ({matches}) in: {action}")
         return int(matches[0])
 
+    def get_action_stop_pattern(self) -> str:
+        # The action is a single digit, nothing after it is used
+        return r"\d"
+
     # get action prompt
+    def get_static_prompt_prefix(self) -> str:
+        return static_prompt_prefix(self.format_full_prompt, FROZENLAKE_SYSTEM_PROMPT)
+
     def get_action_prompt(self, retrieved_experiences=None):
         if retrieved_experiences is None:
             retrieved_experiences = []
@@ -3,10 +3,11 @@ import os
 import gymnasium as gym
 from .base_env_adaptor import BaseEnvAdaptor
 from .env_config import mountaincar_config
-from utils import get_timestamp_ms
+from utils import new_trajectory_id
 import re
 from .adopter_util import (
     choose_format_full_prompt,
+    static_prompt_prefix,
 )
 from .adaptor_prompt_factory import (
     MOUNTAINCAR_SYSTEM_PROMPT,
@@ -55,6 +56,7 @@ class MountainCarAdaptor(BaseEnvAdaptor):
         
         # History records
         self.action_path = []
+        self.trajectory_id = None
         self.st = None
         self.prev_action = None
         self.st1 = None
@@ -77,6 +79,7 @@ class MountainCarAdaptor(BaseEnvAdaptor):
         self.prev_action = None
         self.st1 = self.get_state()
         self.action_path = []
+        self.trajectory_id = new_trajectory_id("mountaincar")
         self.terminated = False
         self.truncated = False
         self.reward = None
@@ -160,7 +163,10 @@ Actions:
             raise ValueError("[mountainCar_adaptor] In get_experience(), history not set")
         
         experience = {
-            "id": f"{get_timestamp_ms()}_mountaincar_{'-'.join(map(str, self.action_path))}",
+            "id": f"{self.trajectory_id}_{len(self.action_path)}",
+            # The backend keeps one shared action path per trajectory, see TrajectoryTable
+            "trajectory_id": self.trajectory_id,
+            "trajectory_step": len(self.action_path),
             "reproduce_method": self.reproduce_method,
             "action_path": self.get_action_path(),
             "st": self.st,
@@ -255,7 +261,14 @@ Actions:
         else:
             return int(matches[0])
 
+    def get_action_stop_pattern(self) -> str:
+        # The action is a single digit, nothing after it is used
+        return r"\d"
+
     # get action prompt
+    def get_static_prompt_prefix(self) -> str:
+        return static_prompt_prefix(self.format_full_prompt, MOUNTAINCAR_SYSTEM_PROMPT)
+
     def get_action_prompt(self, retrieved_experiences=None):
         if retrieved_experiences is None:
             retrieved_experiences = []
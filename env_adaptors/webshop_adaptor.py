@@ -6,10 +6,11 @@ from .env_config import webshop_config
 from .adopter_util import (
     extract_visible_text,
     choose_format_full_prompt,
+    static_prompt_prefix,
 )
 import re
 import random
-from utils import get_timestamp_ms
+from utils import new_trajectory_id
 from .adaptor_prompt_factory import build_webshop_user_prompt, WEBSHOP_SYSTEM_PROMPT
 
 _webshop_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'webshop')
@@ -61,6 +62,7 @@ class WebshopAdaptor(BaseEnvAdaptor):
         self.prev_action = None
         self.st1 = None
         self.action_path = []
+        self.trajectory_id = None
 
     # Getters
     def get_env_description(self):
@@ -125,6 +127,17 @@ Init new environment:
         available_actions = self.env.get_available_actions()
         return available_actions
 
+    def get_action_stop_pattern(self):
+        # search[...] / click[...] 在右括号处结束
+        return r"\]"
+
+    def get_action_candidates(self):
+        """页面上所有 click[...] 动作；有搜索框时需要模型生成搜索词，返回 None。"""
+        action_status = self.get_available_actions()
+        if action_status["has_search_bar"] or not action_status["clickables"]:
+            return None
+        return [f"click[{clickable}]" for clickable in action_status["clickables"]]
+
     def get_action_path(self):
         return self.action_path.copy()
 
@@ -132,7 +145,10 @@ Init new environment:
         if self.st is None or self.prev_action is None or self.st1 is None:
             raise ValueError("[webshop_adaptor] In get_experience(), the history is not set, one of st0, a or st1 is None")
         experience = {
-            "id": f"{get_timestamp_ms()}_{self.url_id}_{'-'.join(self.action_path)}",
+            "id": f"{self.trajectory_id}_{len(self.action_path)}",
+            # The backend keeps one shared action path per trajectory, see TrajectoryTable
+            "trajectory_id": self.trajectory_id,
+            "trajectory_step": len(self.action_path),
             "reproduce_method": self.reproduce_method,
             "action_path": self.get_action_path(),  # Use copy() to avoid reference issue
             "st": self.st,
@@ -188,6 +204,7 @@ Init new environment:
         self.prev_action = None
         self.st1 = self.get_state()
         self.action_path = []
+        self.trajectory_id = new_trajectory_id(self.url_id)
 
     def step(self, action):
         # record history
@@ -208,6 +225,9 @@ Init new environment:
             action = action + ']'
         return action
 
+    def get_static_prompt_prefix(self) -> str:
+        return static_prompt_prefix(self.format_full_prompt, WEBSHOP_SYSTEM_PROMPT)
+
     def get_action_prompt(self, retrieved_experiences=None):
         """生成用于LLM获取下一个action的prompt"""
         if retrieved_experiences is None:
@@ -0,0 +1,50 @@
+import copy
+from collections.abc import Mapping
+from types import MappingProxyType
+
+
+class AnnotatedExp(Mapping):
+    """
+    Read-only view of a stored experience plus retrieval annotations (max_score, retention, ...).
+
+    Reads (exp['st1'], exp.get('max_score'), iteration, dict(exp)) see the experience
+    fields overlaid with the annotations, so it can be passed wherever a retrieved
+    experience dict was used, without copying the experience. Annotating a view again
+    stacks on the same underlying experience.
+    """
+
+    __slots__ = ("_exp", "_annotations")
+
+    def __init__(self, exp, **annotations) -> None:
+        if isinstance(exp, AnnotatedExp):
+            annotations = {**exp._annotations, **annotations}
+            exp = exp._exp
+        self._exp = MappingProxyType(exp)
+        self._annotations = annotations
+
+    def __getitem__(self, key):
+        if key in self._annotations:
+            return self._annotations[key]
+        return self._exp[key]
+
+    def __iter__(self):
+        yield from self._exp
+        for key in self._annotations:
+            if key not in self._exp:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._exp) + sum(1 for key in self._annotations if key not in self._exp)
+
+    def __contains__(self, key) -> bool:
+        return key in self._annotations or key in self._exp
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def __deepcopy__(self, memo) -> dict:
+        return copy.deepcopy(dict(self), memo)
+
+    @property
+    def annotations(self) -> dict:
+        return dict(self._annotations)
@@ -1,5 +1,13 @@
 base_backend_config = {
     "log_dir": "./log",
+    "storage_mode": "json",  # "json" (rewrite both store files on every flush, see flush_*), "wal" (append-only log + periodic snapshot) or "sqlite" (one transactional database file, also selected by a .db / .sqlite storage_path)
+    "wal_compact_every": 500,  # Only used when storage_mode is "wal": compact the log into the snapshot after this many records
+    "redundancy_mode": "incremental",  # "incremental" (only check experiences stored since the last pass) or "full"
+    # Flush policy of the json snapshots; un-flushed mutations are lost if the process is killed
+    "flush_every_n": 1,  # Flush after this many mutations, None to disable (1 = write on every change)
+    "flush_interval_sec": None,  # Flush when this many seconds passed since the last flush, None to disable
+    "flush_on_episode_end": True,  # Flush when the explorer finishes an episode
+    "flush_at_exit": True,  # Flush pending mutations of the backends still open when the process exits (the explorer closes a backend it replaces)
 }
 mdp_config = {
     "theta": 0.3,
@@ -26,4 +34,13 @@ memorybank_config = {
 voyager_config = {
     "model_path": None,    # LLM 模型路径，None 则使用外部传入的 llm_func
     "max_new_tokens": 128, # 生成总结的最大 token 数
+    "summary_mode": "async",  # "sync"（存储前同步生成）或 "async"（后台线程池生成，仅对支持并发请求的 API 模型生效）
+    "summary_workers": 4,     # async 模式的后台线程数
+    "summary_cache": True,    # 把总结按 (st, action, st1) 缓存到 <store>_summaries.json，相同转移不再调用 LLM
+}
+generative_config = {
+    "scoring_mode": "sequential",  # "sequential"（逐条打分）, "concurrent"（API 模型线程池并发，本地模型批量 generate）或 "batched"（一次 prompt 给所有候选打分）
+    "max_workers": 8,              # concurrent 模式的最大并发数（本地模型为每批 prompt 数）
+    "topk": None,                  # 打分排序后只返回前 k 个，None 则返回全部
+    "score_cache": True,           # 把分数缓存到 <store>_scores.json，重复的 (经验, 查询状态) 不再调用 LLM
 }
@@ -1,12 +1,31 @@
+import atexit
 import json
 import os
 import itertools
+import time
+import weakref
 from typing import Any, Dict, Iterable, List
 from utils import get_timestamp
 from .backend_config import base_backend_config
 from utils import log_flush
-from env_adaptors.base_env_adaptor import BaseEnvAdaptor
 from .backend_config import mdp_config
+from .exp_store_wal import ExpStoreWal
+from .exp_store_sqlite import ExpStoreSqlite
+from .store_snapshot import StoreSnapshot
+from .state_table import StateTable
+from .trajectory_table import TrajectoryPath, TrajectoryTable
+
+# Backends not closed yet, flushed when the process exits. Weak references: a backend replaced
+# by the explorer is closed explicitly and can be freed, it never writes at exit.
+_open_backends = weakref.WeakSet()
+
+
+def _close_open_backends() -> None:
+    for backend in list(_open_backends):
+        backend.close()
+
+
+atexit.register(_close_open_backends)
 
 class BaseExpBackend:
     def __init__(self, env_name: str, storage_path: str ="./storage/exp_store.json", depreiciate_exp_store_path: str ="./storage/depreiciate_exp_store.json", log_dir: str = None) -> None:
@@ -20,15 +39,77 @@ class BaseExpBackend:
         self.logIO = open(f'{log_dir}/exp_backendLog_{get_timestamp()}.log', 'a')
 
         self.theta = mdp_config["theta"]
+        self.storage_mode = base_backend_config.get("storage_mode", "json")
+        if str(storage_path).endswith((".db", ".sqlite")):
+            self.storage_mode = "sqlite"
+        if self.storage_mode not in ["json", "wal", "sqlite"]:
+            raise NotImplementedError(f"Storage mode {self.storage_mode} is not supported.")
         
-        self.exp_store = self._load_store(self.storage_path)
-        self.depreiciate_exp_store = self._load_store(self.depreiciate_exp_store_path)
+        self.flush_every_n = base_backend_config.get("flush_every_n", 1)
+        self.flush_interval_sec = base_backend_config.get("flush_interval_sec")
+        self.flush_on_episode_end = base_backend_config.get("flush_on_episode_end", True)
+        # Mutations not yet written to the json snapshots
+        self._pending_mutations = 0
+        self._last_flush_time = time.time()
+        self._in_bulk = False
+
+        # Interned states, the stores reference them by digest on disk
+        self.state_table_path = f"{os.path.splitext(self.storage_path)[0]}_states.json"
+        self.state_table = StateTable()
+        # Shared episode action paths, experiences reference them by (trajectory_id, trajectory_step)
+        self.trajectory_table_path = f"{os.path.splitext(self.storage_path)[0]}_trajectories.json"
+        self.trajectory_table = TrajectoryTable()
+
+        self._wal = None
+        self._sqlite = None
+        if self.storage_mode == "sqlite":
+            # A single database file holds both stores, depreiciate_exp_store_path is not used
+            self._sqlite = ExpStoreSqlite(self.storage_path)
+            self.exp_store, self.depreiciate_exp_store, states, trajectories = self._sqlite.load()
+            log_flush(self.logIO, f"Loaded sqlite store, path: {self.storage_path}, size: {len(self.exp_store)}, deprecated size: {len(self.depreiciate_exp_store)}, at {get_timestamp()}")
+        else:
+            # Finish or discard a snapshot write interrupted by a crash before loading
+            self._snapshot = StoreSnapshot([self.storage_path, self.depreiciate_exp_store_path, self.state_table_path, self.trajectory_table_path], f"{self.storage_path}.commit")
+            recovered = self._snapshot.recover()
+            if recovered is not None:
+                log_flush(self.logIO, f"Recovered interrupted snapshot write ({recovered}) at {get_timestamp()}")
+
+            self.exp_store = self._load_store(self.storage_path)
+            self.depreiciate_exp_store = self._load_store(self.depreiciate_exp_store_path)
+            states = self._load_store(self.state_table_path)
+            trajectories = self._load_store(self.trajectory_table_path)
+        for digest, state in states.items():
+            self.state_table.add(digest, state)
+        for trajectory_id, actions in trajectories.items():
+            self.trajectory_table.extend(trajectory_id, 0, actions)
+        if self.storage_mode == "wal":
+            self._wal = ExpStoreWal(f"{self.storage_path}.wal", compact_every=base_backend_config.get("wal_compact_every"))
+            self._replay_wal()
+        # Digests / trajectory lengths already persisted (snapshot or wal)
+        self._persisted_state_digests = set(self.state_table.states)
+        self._persisted_trajectory_lengths = {trajectory_id: len(actions) for trajectory_id, actions in self.trajectory_table.trajectories.items()}
+        self._resolve_store_refs()
         if not self._is_valid_exp_store():
             raise ValueError(f"Invalid experience store, did not pass the validation.")
 
         # Check no overlap between stores
         self.check_stores_no_overlap()
 
+        # Inverted index: canonical state key -> exp ids starting from that state (insertion ordered)
+        self.state_index = {}
+        self._exp_state_keys = {}
+        # Redundancy buckets: (st_key, action, st1_key) -> exp ids, and the buckets touched since the last pass
+        self.fingerprint_index = {}
+        self._dirty_fingerprints = {}
+        # BFS value table: (st_key, action, st1_key) -> (value, expanded state keys), and the reverse dependencies
+        self.bfs_value_table = {}
+        self._bfs_value_deps = {}
+        self._build_state_index()
+
+        self._closed = False
+        if base_backend_config.get("flush_at_exit", True):
+            _open_backends.add(self)
+
     def _load_store(self, exp_storage_path):
         log_flush(self.logIO, f"########################################################")
         log_flush(self.logIO, f"Start loading {exp_storage_path} the store at {get_timestamp()}")
@@ -61,39 +142,364 @@ class BaseExpBackend:
         log_flush(self.logIO, f"Successfully loaded the store, path: {storage_path}, size: {len(exp_store)}, at {get_timestamp()}")
         return exp_store
 
+    def _replay_wal(self) -> None:
+        """
+        Apply the write-ahead log on top of the loaded snapshots.
+        Records already contained in the snapshot (crash between snapshot and log reset) are skipped.
+        """
+        records = self._wal.replay()
+        for record in records:
+            op = record.get("op")
+            if op in ["store", "update"]:
+                exp = record["exp"]
+                if exp["id"] in self.depreiciate_exp_store:
+                    continue
+                self.exp_store[exp["id"]] = exp
+            elif op == "state":
+                self.state_table.add(record["digest"], record["state"])
+            elif op == "trajectory":
+                self.trajectory_table.extend(record["id"], record["start"], record["actions"])
+            elif op == "deprecate":
+                exp_id = record["id"]
+                if exp_id not in self.exp_store:
+                    continue
+                self.depreiciate_exp_store[exp_id] = self.exp_store.pop(exp_id)
+                self.depreiciate_exp_store[exp_id]['deprecated_at'] = record.get("deprecated_at")
+            else:
+                raise ValueError(f"Unrecognized wal record: {record}")
+        log_flush(self.logIO, f"Replayed {len(records)} wal records from {self._wal.wal_path}, store size: {len(self.exp_store)}, deprecated size: {len(self.depreiciate_exp_store)}")
+
+    def _resolve_store_refs(self) -> None:
+        """
+        Point the loaded experiences to the interned states and the shared trajectories.
+        Stores written before interning hold the states / action paths inline.
+        """
+        for store in [self.exp_store, self.depreiciate_exp_store]:
+            for exp in store.values():
+                if "trajectory_id" in exp and "action_path" not in exp:
+                    if exp["trajectory_id"] not in self.trajectory_table:
+                        raise ValueError(f"Experience {exp.get('id')} references unknown trajectory {exp['trajectory_id']}")
+                    exp["action_path"] = self.trajectory_table.path(exp["trajectory_id"], exp["trajectory_step"])
+                for field in ["st", "st1"]:
+                    if field not in exp:
+                        continue
+                    if isinstance(exp[field], str):
+                        if exp[field] not in self.state_table:
+                            raise ValueError(f"Experience {exp.get('id')} references unknown state {exp[field]}")
+                        exp[field] = self.state_table.get(exp[field])
+                    else:
+                        exp[field] = self.state_table.intern(exp[field])[1]
+        log_flush(self.logIO, f"Resolved references, num distinct states: {len(self.state_table)}, num trajectories: {len(self.trajectory_table)}")
+
+    def _compact_exp(self, exp) -> dict:
+        """Copy of the experience as written to disk: st / st1 as digests, a shared action_path as trajectory reference."""
+        compact_exp = dict(exp)
+        compact_exp['st'], exp['st'] = self.state_table.intern(exp['st'])
+        compact_exp['st1'], exp['st1'] = self.state_table.intern(exp['st1'])
+        if isinstance(exp['action_path'], TrajectoryPath):
+            del compact_exp['action_path']
+        return compact_exp
+
+    def _attach_trajectory(self, exp) -> None:
+        """Replace the action_path of an experience recorded within a trajectory by the shared view."""
+        if "trajectory_id" not in exp:
+            return
+        exp['action_path'] = self.trajectory_table.attach(exp['trajectory_id'], exp['action_path'])
+        exp['trajectory_step'] = len(exp['action_path'])
+
+    def _take_unpersisted_refs(self, exp, compact_exp) -> tuple:
+        """
+        States and trajectory actions referenced by the experience that are not persisted yet.
+        Returns ({digest: state}, (trajectory_id, start) or None), and marks them as persisted.
+        """
+        new_states = {}
+        for field in ["st", "st1"]:
+            digest = compact_exp[field]
+            if digest not in self._persisted_state_digests:
+                new_states[digest] = exp[field]
+                self._persisted_state_digests.add(digest)
+        new_actions = None
+        if "action_path" not in compact_exp:
+            trajectory_id = exp['trajectory_id']
+            num_actions = len(self.trajectory_table.trajectories[trajectory_id])
+            start = self._persisted_trajectory_lengths.get(trajectory_id, 0)
+            if num_actions > start:
+                new_actions = (trajectory_id, start)
+                self._persisted_trajectory_lengths[trajectory_id] = num_actions
+        return new_states, new_actions
+
+    def _append_wal_exp(self, op, exp) -> None:
+        """Append a store / update record, preceded by the states / trajectory actions the log does not contain yet."""
+        compact_exp = self._compact_exp(exp)
+        new_states, new_actions = self._take_unpersisted_refs(exp, compact_exp)
+        for digest, state in new_states.items():
+            self._wal.append({"op": "state", "digest": digest, "state": state})
+        if new_actions is not None:
+            trajectory_id, start = new_actions
+            actions = self.trajectory_table.trajectories[trajectory_id]
+            self._wal.append({"op": "trajectory", "id": trajectory_id, "start": start, "actions": actions[start:]})
+        self._wal.append({"op": op, "exp": compact_exp})
+
+    def _put_sqlite_exp(self, exp, deprecate: bool = False) -> None:
+        """Write the experience row, together with the states / trajectory it references."""
+        compact_exp = self._compact_exp(exp)
+        new_states, new_actions = self._take_unpersisted_refs(exp, compact_exp)
+        if new_states:
+            self._sqlite.put_states(new_states)
+        if new_actions is not None:
+            trajectory_id, start = new_actions
+            self._sqlite.put_trajectory(trajectory_id, start, self.trajectory_table.trajectories[trajectory_id][start:])
+        if deprecate:
+            self._sqlite.deprecate(compact_exp)
+        else:
+            self._sqlite.put_exp(compact_exp)
+
+    def _compact_wal(self) -> None:
+        """Write the current stores as a snapshot and reset the log."""
+        log_flush(self.logIO, f"Compacting wal with {self._wal.num_records} records at {get_timestamp()}")
+        self.save_store()
+        self._wal.reset()
+
+    def _persist_store(self, exp) -> None:
+        """Persist a newly stored experience."""
+        self._check_open()
+        if self.storage_mode == "wal":
+            self._append_wal_exp("store", exp)
+            if self._wal.need_compact():
+                self._compact_wal()
+        elif self.storage_mode == "sqlite":
+            self._put_sqlite_exp(exp)
+            self._mark_dirty()
+        else:
+            self._mark_dirty()
+
+    def _persist_update(self, exp) -> None:
+        """
+        Persist an in-place modification of a stored experience (e.g. refreshed mb_timestep).
+        In json / sqlite mode it counts as a mutation of the flush policy.
+        """
+        self._check_open()
+        if self.storage_mode == "wal":
+            self._append_wal_exp("update", exp)
+            if self._wal.need_compact():
+                self._compact_wal()
+        elif self.storage_mode == "sqlite":
+            self._put_sqlite_exp(exp)
+            self._mark_dirty()
+        else:
+            self._mark_dirty()
+
+    def _persist_deprecate(self, exp_id) -> None:
+        """Persist moving an experience to the deprecated store."""
+        self._check_open()
+        if self.storage_mode == "wal":
+            deprecated_at = self.depreiciate_exp_store[exp_id].get('deprecated_at')
+            self._wal.append({"op": "deprecate", "id": exp_id, "deprecated_at": deprecated_at})
+            if self._wal.need_compact():
+                self._compact_wal()
+        elif self.storage_mode == "sqlite":
+            self._put_sqlite_exp(self.depreiciate_exp_store[exp_id], deprecate=True)
+            self._mark_dirty()
+        else:
+            self._mark_dirty()
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise ValueError(f"Experience backend of {self.storage_path} is closed.")
+
+    def _mark_dirty(self) -> None:
+        """Count a json / sqlite mode mutation and flush if the flush policy says so."""
+        self._pending_mutations += 1
+        if self._in_bulk:
+            return
+        if self.flush_every_n is not None and self._pending_mutations >= self.flush_every_n:
+            self.flush_store()
+        elif self.flush_interval_sec is not None and time.time() - self._last_flush_time >= self.flush_interval_sec:
+            self.flush_store()
+
+    def flush_store(self) -> None:
+        """Write the pending mutations to the json snapshots / commit them to sqlite (wal mode writes every record right away)."""
+        if self._closed:
+            return
+        if self.storage_mode in ["json", "sqlite"] and self._pending_mutations > 0:
+            self.save_store()
+
+    def close(self) -> None:
+        """
+        Flush the pending mutations and release the store files. Called by the explorer before it
+        replaces the backend (or at exit), a closed backend never writes to the store again.
+        """
+        if self._closed:
+            return
+        self.flush_store()
+        self._closed = True
+        _open_backends.discard(self)
+        if self._wal is not None:
+            self._wal.close()
+        if self._sqlite is not None:
+            self._sqlite.close()
+        log_flush(self.logIO, f"Closed the experience backend, path: {self.storage_path}, at {get_timestamp()}")
+        self.logIO.close()
+
+    def finish_episode(self) -> None:
+        """Called by the explorer at the end of every episode."""
+        if self.flush_on_episode_end:
+            self.flush_store()
+
     def save_store(self) -> None:
         """
         Store the experience store to the storage path.
         """
+        if self.storage_mode == "sqlite":
+            # Rows are written on every mutation, only the transaction is left to commit
+            self._sqlite.commit()
+            log_flush(self.logIO, f"Commit sqlite store, path: {self.storage_path}, size: {len(self.exp_store)}, deprecated size: {len(self.depreiciate_exp_store)}, at {get_timestamp()}")
+            self._pending_mutations = 0
+            self._last_flush_time = time.time()
+            return
+
         # Validate no overlap before saving
         self.check_stores_no_overlap()
         
-        with open(self.storage_path, 'w') as file:
-            json.dump(self.exp_store, file)
+        exp_store = {exp_id: self._compact_exp(exp) for exp_id, exp in self.exp_store.items()}
+        depreiciate_exp_store = {exp_id: self._compact_exp(exp) for exp_id, exp in self.depreiciate_exp_store.items()}
+        # Only the states still referenced by one of the stores are written
+        digests = {}
+        trajectory_ids = {}
+        for store in [exp_store, depreiciate_exp_store]:
+            for exp in store.values():
+                digests[exp['st']] = None
+                digests[exp['st1']] = None
+                if "action_path" not in exp:
+                    trajectory_ids[exp['trajectory_id']] = None
+        trajectories = self.trajectory_table.export(trajectory_ids)
+        # All files are written as one generation: temp file + fsync + rename
+        self._snapshot.save([exp_store, depreiciate_exp_store, self.state_table.export(digests), trajectories])
+        self._persisted_state_digests = set(digests)
+        self._persisted_trajectory_lengths = {trajectory_id: len(actions) for trajectory_id, actions in trajectories.items()}
         log_flush(self.logIO, f"Save store, path: {self.storage_path}, size: {len(self.exp_store)}, at {get_timestamp()}")
-        with open(self.depreiciate_exp_store_path, 'w') as file:
-            json.dump(self.depreiciate_exp_store, file)
         log_flush(self.logIO, f"Save depreiciate store, path: {self.depreiciate_exp_store_path}, size: {len(self.depreiciate_exp_store)}, at {get_timestamp()}")
+        log_flush(self.logIO, f"Save state table, path: {self.state_table_path}, size: {len(digests)}, at {get_timestamp()}")
+        log_flush(self.logIO, f"Save trajectory table, path: {self.trajectory_table_path}, size: {len(trajectories)}, at {get_timestamp()}")
+        self._pending_mutations = 0
+        self._last_flush_time = time.time()
 
     def _loop_detect_exp_conflict(self):
         """
         Detect all the conflict pairs in the experience store.
+        Experiences are grouped by (st, action), only groups whose st1 differ can contain conflicts.
+        Pairs are returned in the same order as itertools.combinations over the store.
         """
-        log_flush(self.logIO, f"Loop detecting conflict pairs")
+        log_flush(self.logIO, f"Group detecting conflict pairs")
+        exp_positions = {}
+        groups = {}
+        for pos, (exp_id, exp) in enumerate(self.exp_store.items()):
+            exp_positions[exp_id] = pos
+            st_key, st1_key = self._get_exp_state_keys(exp)
+            groups.setdefault((st_key, exp['action']), []).append((exp_id, st1_key))
+
         conflict_pairs = []
-        exp_ids = self.exp_store.keys()
-        exp_id_combinations = list(itertools.combinations(exp_ids, 2))
-        log_flush(self.logIO, f"Number of experience combinations: {len(exp_id_combinations)}")
-        for i in range(len(exp_id_combinations)):
-            exp_pair = exp_id_combinations[i]
-            assert len(exp_pair) == 2
-            log_flush(self.logIO, f"{i}/{len(exp_id_combinations)}: {exp_pair[0]} and {exp_pair[1]})")
-            if self._has_conflict(self.exp_store[exp_pair[0]], self.exp_store[exp_pair[1]]):
-                log_flush(self.logIO, f"Conflict pair detected: {exp_pair[0]} and {exp_pair[1]}")
-                conflict_pairs.append(exp_pair)
-        log_flush( self.logIO, f"Loop finish, num conflict pairs detected: {len(conflict_pairs)}")
+        num_conflict_groups = 0
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            if len(set(st1_key for _, st1_key in members)) < 2:
+                continue
+            num_conflict_groups += 1
+            for (e0_id, e0_st1_key), (e1_id, e1_st1_key) in itertools.combinations(members, 2):
+                if e0_st1_key != e1_st1_key:
+                    conflict_pairs.append((e0_id, e1_id))
+        conflict_pairs.sort(key=lambda pair: (exp_positions[pair[0]], exp_positions[pair[1]]))
+        log_flush(self.logIO, f"Number of experiences: {len(exp_positions)}, (st, action) groups: {len(groups)}, groups with conflict: {num_conflict_groups}")
+        log_flush(self.logIO, f"Group finish, num conflict pairs detected: {len(conflict_pairs)}")
         return conflict_pairs
 
+    # State index
+    def _state_index_key(self, state) -> str:
+        """Digest of a state, equal digests <=> BaseEnvAdaptor.two_states_equal."""
+        return self.state_table.key(state)
+
+    def _build_state_index(self) -> None:
+        self.state_index = {}
+        self._exp_state_keys = {}
+        self.fingerprint_index = {}
+        self._dirty_fingerprints = {}
+        self.bfs_value_table = {}
+        self._bfs_value_deps = {}
+        for exp in self.exp_store.values():
+            self._index_add(exp)
+        log_flush(self.logIO, f"Built state index, num states: {len(self.state_index)}, num experiences: {len(self._exp_state_keys)}")
+
+    def _index_add(self, exp) -> None:
+        exp_id = exp["id"]
+        # Interning replaces st / st1 by the shared state objects
+        st_key, exp['st'] = self.state_table.intern(exp['st'])
+        st1_key, exp['st1'] = self.state_table.intern(exp['st1'])
+        self._exp_state_keys[exp_id] = (st_key, st1_key)
+        self.state_index.setdefault(st_key, {})[exp_id] = None
+        fingerprint = (st_key, exp['action'], st1_key)
+        self.fingerprint_index.setdefault(fingerprint, {})[exp_id] = None
+        self._dirty_fingerprints[fingerprint] = None
+        self._invalidate_bfs_values(st_key)
+
+    def _index_remove(self, exp_id) -> None:
+        st_key, st1_key = self._exp_state_keys.pop(exp_id)
+        bucket = self.state_index[st_key]
+        del bucket[exp_id]
+        if not bucket:
+            del self.state_index[st_key]
+        fingerprint = (st_key, self.exp_store[exp_id]['action'], st1_key)
+        bucket = self.fingerprint_index[fingerprint]
+        del bucket[exp_id]
+        if not bucket:
+            del self.fingerprint_index[fingerprint]
+        self._invalidate_bfs_values(st_key)
+
+    def _get_exp_state_keys(self, exp) -> tuple:
+        """(st_key, st1_key) of an experience, cached for the ones in exp_store."""
+        keys = self._exp_state_keys.get(exp["id"])
+        if keys is None:
+            keys = (self._state_index_key(exp['st']), self._state_index_key(exp['st1']))
+        return keys
+
+    def _get_exps_by_state(self, state) -> list:
+        """All experiences in exp_store whose st equals the given state, in store order."""
+        return self._get_exps_by_state_key(self._state_index_key(state))
+
+    def _get_exps_by_state_key(self, st_key) -> list:
+        exp_ids = self.state_index.get(st_key, ())
+        return [self.exp_store[exp_id] for exp_id in exp_ids]
+
+    # BFS value table
+    def _lookup_bfs_value(self, exp, compute_func):
+        """
+        Memoized compute_func(exp, expanded), keyed by the experience's (st, action, st1).
+
+        compute_func must add the key of every state whose outgoing experiences it iterated to `expanded`.
+        The entry is dropped as soon as one of these states gains or loses an outgoing experience,
+        so a lookup always equals a fresh search.
+        """
+        st_key, st1_key = self._get_exp_state_keys(exp)
+        table_key = (st_key, exp['action'], st1_key)
+        if table_key in self.bfs_value_table:
+            return self.bfs_value_table[table_key][0]
+        expanded = set()
+        value = compute_func(exp, expanded)
+        self.bfs_value_table[table_key] = (value, expanded)
+        for state_key in expanded:
+            self._bfs_value_deps.setdefault(state_key, set()).add(table_key)
+        return value
+
+    def _invalidate_bfs_values(self, st_key) -> None:
+        """Drop the BFS values that depend on the outgoing experiences of st_key."""
+        for table_key in self._bfs_value_deps.pop(st_key, ()):
+            entry = self.bfs_value_table.pop(table_key, None)
+            if entry is None:
+                continue
+            for state_key in entry[1]:
+                if state_key != st_key and state_key in self._bfs_value_deps:
+                    self._bfs_value_deps[state_key].discard(table_key)
+
     # Getters
     def get_exp_by_id(self, exp_id) -> dict:
         return self.exp_store[exp_id]
@@ -119,30 +525,35 @@ class BaseExpBackend:
             raise ValueError(error_msg)
         log_flush(self.logIO, f"Store validation passed: No overlap between exp_store ({len(exp_store_keys)} items) and depreiciate_exp_store ({len(depreiciate_store_keys)} items)")
 
-    def get_redundant_experience_groups(self) -> list:
-        """Get the redundant experience ids."""
-        log_flush(self.logIO, f"Loop detecting redundant experiences")
+    def get_redundant_experience_groups(self, incremental: bool = None) -> list:
+        """
+        Get the redundant experience ids.
+        Experiences with the same (st, action, st1) share a fingerprint bucket, every bucket with more
+        than one experience is a redundant group.
+
+        Args:
+            incremental: only examine the buckets touched by experiences stored since the last pass,
+                defaults to base_backend_config["redundancy_mode"] == "incremental"
+        """
+        if incremental is None:
+            incremental = base_backend_config.get("redundancy_mode", "full") == "incremental"
+        log_flush(self.logIO, f"Bucket detecting redundant experiences, incremental: {incremental}")
+        if incremental:
+            fingerprints = list(self._dirty_fingerprints.keys())
+        else:
+            fingerprints = list(self.fingerprint_index.keys())
+        self._dirty_fingerprints = {}
+
         redundant_experience_groups = []
-        exp_ids = list(self.exp_store.keys())
-        grouped_exp_ids = set()
-        for i in range(len(exp_ids)):
-            cur_redundant_group = set()
-            cur_id = exp_ids[i]
-            if cur_id in grouped_exp_ids:
-                continue
-            grouped_exp_ids.add(cur_id)
-            cur_redundant_group.add(cur_id)
-            for j in range(i+1, len(exp_ids)):
-                test_id = exp_ids[j]
-                if test_id in grouped_exp_ids:
-                    continue
-                if self._are_same_exp(self.exp_store[cur_id], self.exp_store[test_id]):
-                    cur_redundant_group.add(cur_id)
-                    cur_redundant_group.add(test_id)
-                    grouped_exp_ids.add(test_id)
-            if len(cur_redundant_group) > 1:
-                redundant_experience_groups.append(cur_redundant_group)
-        log_flush(self.logIO, f"Loop finish, num redundant experience groups detected: {len(redundant_experience_groups)}")
+        for fingerprint in fingerprints:
+            bucket = self.fingerprint_index.get(fingerprint)
+            if bucket is not None and len(bucket) > 1:
+                redundant_experience_groups.append(set(bucket))
+        if not incremental:
+            # Keep the store order of the groups' first experience
+            exp_positions = {exp_id: pos for pos, exp_id in enumerate(self.exp_store.keys())}
+            redundant_experience_groups.sort(key=lambda group: min(exp_positions[exp_id] for exp_id in group))
+        log_flush(self.logIO, f"Examined {len(fingerprints)} buckets, num redundant experience groups detected: {len(redundant_experience_groups)}")
         return redundant_experience_groups
 
     # To be implemented in the subclass
@@ -190,17 +601,16 @@ class BaseExpBackend:
     def store_experience(self, exp):
         if not self._is_valid_exp(exp):
             raise ValueError(f"Invalid experience: {exp}")
+        if exp["id"] in self._exp_state_keys:
+            self._index_remove(exp["id"])
+        self._attach_trajectory(exp)
         self.exp_store[exp["id"]] = exp
-        self.save_store() # TODO: maybe should not save so frequent
+        self._index_add(exp)
+        self._persist_store(exp)
 
     def get_exp_ids_by_state(self, st) -> list:
         """Get all exp id that have the same st (starting state)."""
-        results = []
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(st, exp['st']):
-                results.append(exp_id)
-        return results
+        return list(self.state_index.get(self._state_index_key(st), ()))
 
     def retrieve_experience_theta(self, state, theta: float) -> list:
         """
@@ -208,13 +618,11 @@ class BaseExpBackend:
         Filters out experiences with probability < theta.
         """
         results = []
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                # Skip if probability exists and is below theta
-                if 'probability' in exp and exp['probability'] < theta:
-                    continue
-                results.append(exp)
+        for exp in self._get_exps_by_state(state):
+            # Skip if probability exists and is below theta
+            if 'probability' in exp and exp['probability'] < theta:
+                continue
+            results.append(exp)
         return results
 
     def get_conflict_states(self, conflict_pair_ids: list) -> list:
@@ -222,18 +630,13 @@ class BaseExpBackend:
         Get all unique st from the conflict pairs.
         Since conflicts have same st, we only need one from each pair.
         """
-        unique_states = []
+        unique_states = {}
         for pair in conflict_pair_ids:
             exp = self.exp_store[pair[0]]  # Both have same st, just take first
-            st = exp['st']
-            # Check if already exists
-            is_duplicate = any(
-                BaseEnvAdaptor.two_states_equal(st, existing_st) 
-                for existing_st in unique_states
-            )
-            if not is_duplicate:
-                unique_states.append(st)
-        return unique_states
+            st_key, _ = self._get_exp_state_keys(exp)
+            if st_key not in unique_states:
+                unique_states[st_key] = exp['st']
+        return list(unique_states.values())
 
     def get_all_expIds_from_conflict_st(self, conflict_pair_ids: list) -> list:
         """
@@ -262,7 +665,7 @@ class BaseExpBackend:
             action_path = exp['action_path']
             assert action == action_path[-1]
             action_path = action_path[:-1]
-            key = (BaseEnvAdaptor.get_state_str(st), action)
+            key = (self._get_exp_state_keys(exp)[0], action)
             
             if key not in pair_map or len(action_path) < len(pair_map[key][3]):
                 pair_map[key] = (st, action, exp_id, action_path)
@@ -270,7 +673,10 @@ class BaseExpBackend:
         return list(pair_map.values())
 
     def _has_conflict(self, e1, e2) -> bool:
-        return BaseEnvAdaptor.has_conflict(e1, e2)
+        """Same st and action but different st1, compared by state digest."""
+        e1_st_key, e1_st1_key = self._get_exp_state_keys(e1)
+        e2_st_key, e2_st1_key = self._get_exp_state_keys(e2)
+        return e1_st_key == e2_st_key and e1['action'] == e2['action'] and e1_st1_key != e2_st1_key
 
     def resolve_experience_conflict(self, **kwargs):
         """
@@ -351,7 +757,7 @@ class BaseExpBackend:
         log_flush(self.logIO, f"Conflict resolution completed for {e0_id} and {e1_id}")
 
     def _are_same_exp(self, e1, e2) -> bool:
-        return BaseEnvAdaptor.are_same_exp(e1, e2)
+        return self._get_exp_state_keys(e1) == self._get_exp_state_keys(e2) and e1['action'] == e2['action']
 
     def get_most_optmized_path_exp_id(self, exp_id_group: set) -> str:
         """
@@ -391,12 +797,23 @@ class BaseExpBackend:
         elif exp_id in self.exp_store:
             self.depreiciate_exp_store[exp_id] = self.exp_store[exp_id]
             self.depreiciate_exp_store[exp_id]['deprecated_at'] = get_timestamp()
+            self._index_remove(exp_id)
             del self.exp_store[exp_id]
             log_flush(self.logIO, f"[DEPRECIATE] Experience {exp_id} moved to deprecated store")
-            self.save_store()
+            self._persist_deprecate(exp_id)
         else:
             raise ValueError(f"Experience {exp_id} not found in in any store")
 
+    def bulk_deprecate(self, exp_ids) -> None:
+        """Deprecate several experiences and flush the stores once at the end."""
+        self._in_bulk = True
+        try:
+            for exp_id in exp_ids:
+                self._deprecate_experience(exp_id)
+        finally:
+            self._in_bulk = False
+            self.flush_store()
+
     def step(self):
         pass
 
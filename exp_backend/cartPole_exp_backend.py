@@ -1,4 +1,5 @@
 from .base_exp_backend import BaseExpBackend
+from .trajectory_table import TrajectoryPath
 from utils import log_flush
 
 class CartPoleExpBackend(BaseExpBackend):
@@ -7,7 +8,7 @@ class CartPoleExpBackend(BaseExpBackend):
         # because parent's __init__ calls _is_valid_exp_store() which uses this field
         self.expected_fields = {
             "id": str,
-            "action_path": list,
+            "action_path": (list, TrajectoryPath),
             "st": dict,
             "action": int,  # CartPole action is int (0 or 1)
             "st1": dict,
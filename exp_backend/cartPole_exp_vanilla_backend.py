@@ -1,7 +1,6 @@
 from .cartPole_exp_backend import CartPoleExpBackend
 from .backend_config import cartpole_vanilla_config
 from utils import log_flush
-from env_adaptors.base_env_adaptor import BaseEnvAdaptor
 
 class CartPoleExpVanillaBackend(CartPoleExpBackend):
     def __init__(self, env_name, storage_path, depreiciate_exp_store_path, log_dir=None):
@@ -19,12 +18,8 @@ class CartPoleExpVanillaBackend(CartPoleExpBackend):
         Retrieve experiences that start from the same state.
         For CartPole, we match experiences with the same discretized state.
         """
-        results = []
         log_flush(self.logIO, f"Retrieving experience for state: {state}")
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                results.append(exp)
+        results = self._get_exps_by_state(state)
         log_flush(self.logIO, f"Retrieved {len(results)} experiences, results ids: {[exp['id'] for exp in results]}")        
         return results
 
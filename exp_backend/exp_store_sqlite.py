@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+
+
+class ExpStoreSqlite:
+    """
+    SQLite file holding the experience store, the deprecated store and their shared tables.
+
+    Tables:
+    - experiences(id, st_key, action, st1_key, mb_timestep, data): one row per experience,
+      action is JSON encoded, data is the experience as written to disk (see BaseExpBackend._compact_exp), rowid keeps the store order
+    - deprecations(id, deprecated_at): experiences moved to the deprecated store, rowid keeps the deprecation order
+    - states(digest, state): interned states (see StateTable)
+    - trajectory_actions(trajectory_id, idx, action): shared action paths (see TrajectoryTable),
+      one row per step, so a growing trajectory only appends its new actions
+
+    Every mutation is one row write; commit() is driven by the backend's flush policy.
+    The database runs in WAL journal mode, so analysis scripts can read a live store.
+    load() returns both stores in full, the backend keeps serving lookups from its in-memory
+    indexes; the st_key / action / st1_key / mb_timestep columns are for such scripts.
+    """
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS experiences (
+                id TEXT PRIMARY KEY,
+                st_key TEXT NOT NULL,
+                action TEXT NOT NULL,
+                st1_key TEXT NOT NULL,
+                mb_timestep INTEGER,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS deprecations (
+                id TEXT PRIMARY KEY REFERENCES experiences(id),
+                deprecated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS states (
+                digest TEXT PRIMARY KEY,
+                state TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS trajectory_actions (
+                trajectory_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                PRIMARY KEY (trajectory_id, idx)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def load(self) -> tuple:
+        """Return (exp_store, depreiciate_exp_store, states, trajectories), experiences still hold references."""
+        exp_store = {}
+        for exp_id, data in self.conn.execute(
+            "SELECT id, data FROM experiences WHERE id NOT IN (SELECT id FROM deprecations) ORDER BY rowid"
+        ):
+            exp_store[exp_id] = json.loads(data)
+        depreiciate_exp_store = {}
+        for exp_id, data in self.conn.execute(
+            "SELECT e.id, e.data FROM deprecations d JOIN experiences e ON e.id = d.id ORDER BY d.rowid"
+        ):
+            depreiciate_exp_store[exp_id] = json.loads(data)
+        states = {digest: json.loads(state) for digest, state in self.conn.execute("SELECT digest, state FROM states")}
+        trajectories = {}
+        for trajectory_id, action in self.conn.execute("SELECT trajectory_id, action FROM trajectory_actions ORDER BY trajectory_id, idx"):
+            trajectories.setdefault(trajectory_id, []).append(json.loads(action))
+        return exp_store, depreiciate_exp_store, states, trajectories
+
+    def put_states(self, states: dict) -> None:
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO states (digest, state) VALUES (?, ?)",
+            [(digest, json.dumps(state, ensure_ascii=False)) for digest, state in states.items()],
+        )
+
+    def put_trajectory(self, trajectory_id: str, start: int, actions: list) -> None:
+        """Write actions at positions start, start + 1, ... of the trajectory."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO trajectory_actions (trajectory_id, idx, action) VALUES (?, ?, ?)",
+            [(trajectory_id, start + offset, json.dumps(action, ensure_ascii=False)) for offset, action in enumerate(actions)],
+        )
+
+    def put_exp(self, compact_exp: dict) -> None:
+        """Insert or update an experience, an update keeps its position in the store."""
+        self.conn.execute(
+            """
+            INSERT INTO experiences (id, st_key, action, st1_key, mb_timestep, data) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                st_key = excluded.st_key, action = excluded.action, st1_key = excluded.st1_key,
+                mb_timestep = excluded.mb_timestep, data = excluded.data
+            """,
+            (
+                compact_exp["id"],
+                compact_exp["st"],
+                json.dumps(compact_exp["action"], ensure_ascii=False),
+                compact_exp["st1"],
+                compact_exp.get("mb_timestep"),
+                json.dumps(compact_exp, ensure_ascii=False),
+            ),
+        )
+
+    def deprecate(self, compact_exp: dict) -> None:
+        self.put_exp(compact_exp)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO deprecations (id, deprecated_at) VALUES (?, ?)",
+            (compact_exp["id"], compact_exp.get("deprecated_at")),
+        )
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,70 @@
+import json
+import os
+
+
+class ExpStoreWal:
+    """
+    Append-only JSONL log for the experience store.
+
+    Every insert / deprecation is written as one line, so the per-step persistence
+    cost does not depend on the size of the store. The backend periodically compacts
+    the log into the regular JSON snapshots (see BaseExpBackend._compact_wal).
+
+    Record format (one JSON object per line):
+    - {"op": "store", "exp": {...}}
+    - {"op": "update", "exp": {...}}
+    - {"op": "deprecate", "id": "...", "deprecated_at": "..."}
+    """
+
+    def __init__(self, wal_path: str, compact_every: int = 500) -> None:
+        self.wal_path = wal_path
+        self.compact_every = compact_every
+        wal_dir = os.path.dirname(wal_path)
+        if wal_dir:
+            os.makedirs(wal_dir, exist_ok=True)
+        # Number of records written since the last compaction
+        self.num_records = 0
+        self.fileIO = None
+
+    def replay(self) -> list:
+        """
+        Read all records of the log.
+        A truncated last line (process killed mid-write) is ignored.
+        """
+        records = []
+        if not os.path.exists(self.wal_path):
+            return records
+        with open(self.wal_path, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        self.num_records = len(records)
+        return records
+
+    def append(self, record: dict) -> None:
+        if self.fileIO is None:
+            self.fileIO = open(self.wal_path, 'a')
+        self.fileIO.write(json.dumps(record, ensure_ascii=False))
+        self.fileIO.write("\n")
+        self.fileIO.flush()
+        self.num_records += 1
+
+    def need_compact(self) -> bool:
+        return self.compact_every is not None and self.num_records >= self.compact_every
+
+    def reset(self) -> None:
+        """Truncate the log, called after its content has been written to a snapshot."""
+        if self.fileIO is not None:
+            self.fileIO.close()
+        self.fileIO = open(self.wal_path, 'w')
+        self.num_records = 0
+
+    def close(self) -> None:
+        if self.fileIO is not None:
+            self.fileIO.close()
+            self.fileIO = None
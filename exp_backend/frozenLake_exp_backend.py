@@ -1,4 +1,5 @@
 from .base_exp_backend import BaseExpBackend
+from .trajectory_table import TrajectoryPath
 
 class FrozenLakeExpBackend(BaseExpBackend):
     def __init__(self, env_name, storage_path, depreiciate_exp_store_path, log_dir=None):
@@ -6,7 +7,7 @@ class FrozenLakeExpBackend(BaseExpBackend):
         # because parent's __init__ calls _is_valid_exp_store() which uses this field
         self.expected_fields = {
             "id": str,
-            "action_path": list,
+            "action_path": (list, TrajectoryPath),
             "st": dict,
             "action": int,
             "st1": dict,
@@ -1,3 +1,4 @@
+import os
 from .frozenLake_exp_vanilla_backend import FrozenLakeExpVanillaBackend
 from .generative_mixin import GenerativeMixin
 from utils import log_flush
@@ -24,7 +25,26 @@ Score (1-10):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
 """
 
 
-class FrozenLakeExpGenerativeBackend(FrozenLakeExpVanillaBackend, GenerativeMixin):
+# FrozenLake 一次给所有候选经验打分的 prompt 模板（batched 模式）
+FROZENLAKE_BATCH_SCORE_PROMPT = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+You are an agent that scores the relevance of past experiences for navigation tasks.
+Score from 1-10 how helpful each past experience is for the current situation.
+Only output one line with one score per experience, comma-separated, in the given order.<|eot_id|><|start_header_id|>user<|end_header_id|>
+
+Current situation:
+- Position: {query_position}
+
+Past experiences:
+{experience_lines}
+
+How relevant is each experience for the current situation?
+Scores (1-10, comma-separated):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+"""
+
+
+class FrozenLakeExpGenerativeBackend(GenerativeMixin, FrozenLakeExpVanillaBackend):
     """
     FrozenLake 带 Generative 打分排序机制的 Backend
     
@@ -39,7 +59,11 @@ class FrozenLakeExpGenerativeBackend(FrozenLakeExpVanillaBackend, GenerativeMixi
             explorer_model: Explorer 模型实例，用于打分
         """
         super().__init__(env_name, storage_path, depreiciate_exp_store_path, log_dir=log_dir)
-        self.init_generative(explorer_model=explorer_model)
+        self.init_generative(
+            explorer_model=explorer_model,
+            score_cache_path=f"{os.path.splitext(storage_path)[0]}_scores.json",
+            score_prompt_templates=[FROZENLAKE_SCORE_PROMPT, FROZENLAKE_BATCH_SCORE_PROMPT],
+        )
         
         # 保存原始检索方法
         self._base_retrieve = self.retrieve_experience
@@ -62,6 +86,24 @@ class FrozenLakeExpGenerativeBackend(FrozenLakeExpVanillaBackend, GenerativeMixi
             next_position=st1.get('position', 0)
         )
 
+    def _build_batch_score_prompt(self, experiences: list, query_state: dict) -> str:
+        """构建 FrozenLake 的批量打分 prompt"""
+        action_names = ['Left', 'Down', 'Right', 'Up']
+        experience_lines = []
+        for idx, exp in enumerate(experiences, 1):
+            st = exp.get('st', {})
+            st1 = exp.get('st1', {})
+            action = exp.get('action', 0)
+            action_name = action_names[action] if 0 <= action <= 3 else 'unknown'
+            experience_lines.append(
+                f"{idx}. From Position: {st.get('position', 0)}; Action: {action_name} ({action}); To Position: {st1.get('position', 0)}"
+            )
+        
+        return FROZENLAKE_BATCH_SCORE_PROMPT.format(
+            query_position=query_state.get('position', 0),
+            experience_lines="\n".join(experience_lines)
+        )
+
     def retrieve_experience_with_scoring(self, state) -> list:
         """检索经验并用 LLM 打分排序"""
         log_flush(self.logIO, f"[Generative] Retrieving for state: {state}")
@@ -76,7 +118,8 @@ class FrozenLakeExpGenerativeBackend(FrozenLakeExpVanillaBackend, GenerativeMixi
         ranked_results = self.generative_rank_experiences(
             experiences=raw_results,
             query_state=state,
-            build_score_prompt_func=self._build_score_prompt
+            build_score_prompt_func=self._build_score_prompt,
+            build_batch_score_prompt_func=self._build_batch_score_prompt
         )
         
         log_flush(self.logIO, f"[Generative] Retrieved {len(ranked_results)} experiences after scoring")
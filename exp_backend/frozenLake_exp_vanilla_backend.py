@@ -1,9 +1,8 @@
 from .frozenLake_exp_backend import FrozenLakeExpBackend
 from .backend_config import frozenlake_vanilla_config
+from .annotated_exp import AnnotatedExp
 from utils import log_flush
-from env_adaptors.base_env_adaptor import BaseEnvAdaptor
 from collections import deque
-import copy
 import json
 
 class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
@@ -22,12 +21,8 @@ class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
             raise NotImplementedError(f"Algorithm {self.algorithm} is not supported.")
 
     def retrieve_experience_sameSt_1Step(self, state) -> list:
-        results = []
         log_flush(self.logIO, f"Retrieving experience for state: {state}")
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                results.append(exp)
+        results = self._get_exps_by_state(state)
         log_flush(self.logIO, f"Retrieved {len(results)} experiences, results ids: {[exp['id'] for exp in results]}")        
         return results
 
@@ -53,10 +48,13 @@ class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
             return True, 0.0
         return False, 0.0
 
-    def _compute_max_score_bfs(self, exp: dict) -> float:
+    def _compute_max_score_bfs(self, exp: dict, expanded: set = None) -> float:
         """
         Use BFS to compute the maximum achievable score starting from this experience.
+        The index keys of the expanded states are added to `expanded` (see _lookup_bfs_value).
         """
+        if expanded is None:
+            expanded = set()
         # Check if exp's st1 is already a finished state
         is_finished, score = self._check_finished_and_get_score(exp['st1'])
         if is_finished:
@@ -73,23 +71,18 @@ class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
         start_state = exp['st1']
         start_key = self._get_state_key(start_state)
         
-        queue.append((start_state, 0))
+        queue.append((start_state, self._get_exp_state_keys(exp)[1], 0))
         visited.add(start_key)
         
         while queue:
-            current_state, current_depth = queue.popleft()
+            current_state, current_index_key, current_depth = queue.popleft()
             
             if current_depth >= self.max_bfs_depth:
                 continue
             
-            # Iterate all experiences to find transitions
-            for exp_id in self.exp_store.keys():
-                next_exp = self.exp_store[exp_id]
-                
-                # Check if this experience starts from current_state
-                if not BaseEnvAdaptor.two_states_equal(current_state, next_exp['st']):
-                    continue
-                
+            # Iterate the experiences starting from current_state
+            expanded.add(current_index_key)
+            for next_exp in self._get_exps_by_state_key(current_index_key):
                 next_state = next_exp['st1']
                 next_key = self._get_state_key(next_state)
                 
@@ -104,7 +97,7 @@ class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
                     continue
                 
                 visited.add(next_key)
-                queue.append((next_state, current_depth + 1))
+                queue.append((next_state, self._get_exp_state_keys(next_exp)[1], current_depth + 1))
         
         return max_score
 
@@ -115,24 +108,11 @@ class FrozenLakeExpVanillaBackend(FrozenLakeExpBackend):
         """
         results = []
         log_flush(self.logIO, f"[BFS] Retrieving experience for state: {state}")
-        
-        # Cache st1 max scores to avoid recalculating for the same start point
-        st1_cache = {}
 
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                exp_with_score = copy.deepcopy(exp)
-                
-                st1_key = self._get_state_key(exp['st1'])
-                if st1_key in st1_cache:
-                    max_score = st1_cache[st1_key]
-                else:
-                    max_score = self._compute_max_score_bfs(exp)
-                    st1_cache[st1_key] = max_score
-                
-                exp_with_score['max_score'] = max_score
-                results.append(exp_with_score)
+        for exp in self._get_exps_by_state(state):
+            # Looked up in the BFS value table, only searched again when the graph around it changed
+            max_score = self._lookup_bfs_value(exp, self._compute_max_score_bfs)
+            results.append(AnnotatedExp(exp, max_score=max_score))
         
         log_flush(self.logIO, f"[BFS] Retrieved {len(results)} experiences, ids: {[exp['id'] for exp in results]}")
         log_flush(self.logIO, f"[BFS] Max scores: {[(exp['id'], exp.get('max_score')) for exp in results]}")
@@ -1,3 +1,4 @@
+import os
 from .frozenLake_exp_vanilla_backend import FrozenLakeExpVanillaBackend
 from .voyager_mixin import VoyagerMixin
 from utils import log_flush
@@ -28,7 +29,7 @@ Your summary:<|eot_id|><|start_header_id|>assistant<|end_header_id|>
 """
 
 
-class FrozenLakeExpVoyagerBackend(FrozenLakeExpVanillaBackend, VoyagerMixin):
+class FrozenLakeExpVoyagerBackend(VoyagerMixin, FrozenLakeExpVanillaBackend):
     """
     FrozenLake 带 Voyager 总结机制的 Backend
     
@@ -43,18 +44,34 @@ class FrozenLakeExpVoyagerBackend(FrozenLakeExpVanillaBackend, VoyagerMixin):
             explorer_model: Explorer 模型实例，用于生成总结
         """
         super().__init__(env_name, storage_path, depreiciate_exp_store_path, log_dir=log_dir)
-        self.init_voyager(explorer_model=explorer_model)
+        self.init_voyager(
+            explorer_model=explorer_model,
+            build_summary_prompt_func=self._build_summary_prompt,
+            summary_cache_path=f"{os.path.splitext(storage_path)[0]}_summaries.json",
+            summary_prompt_template=FROZENLAKE_SUMMARY_PROMPT,
+        )
+        
+        # 保存原始检索方法，然后包装
+        self._base_retrieve = self.retrieve_experience
+        self.retrieve_experience = self.retrieve_experience_with_summaries
 
     def store_experience(self, exp) -> None:
         """存储经验并生成总结"""
-        # 生成总结
-        self._voyager_store_frozenlake_exp(exp)
+        # 写回后台已生成好的总结
+        self.voyager_collect_summaries()
+        # 生成总结（async 模式下只提交到后台，不阻塞当前 step）
+        self.voyager_summarize(exp, self._build_summary_prompt(exp))
         # 调用父类存储
         super().store_experience(exp)
-        log_flush(self.logIO, f"[Voyager] Experience {exp['id']} stored with summary")
+        log_flush(self.logIO, f"[Voyager] Experience {exp['id']} stored with {'pending ' if exp.get('voyager_summary_pending') else ''}summary")
 
-    def _voyager_store_frozenlake_exp(self, exp: dict) -> None:
-        """FrozenLake 专用的总结生成"""
+    def retrieve_experience_with_summaries(self, state) -> list:
+        """检索前先写回已生成好的总结，未完成的经验不带总结返回"""
+        self.voyager_collect_summaries()
+        return self._base_retrieve(state)
+
+    def _build_summary_prompt(self, exp: dict) -> str:
+        """构建 FrozenLake 的总结 prompt"""
         st = exp.get('st', {})
         st1 = exp.get('st1', {})
         action = exp.get('action', 0)
@@ -76,6 +93,4 @@ class FrozenLakeExpVoyagerBackend(FrozenLakeExpVanillaBackend, VoyagerMixin):
             next_tile=next_tile,
             outcome_safety=outcome_safety
         )
-        
-        summary = self.voyager_generate_summary(prompt)
-        exp['voyager_summary'] = summary
+        return prompt
@@ -6,8 +6,12 @@ Generative Mixin - 检索时用 LLM 对经验打分排序的通用模块
 
 使用方式：传入 explorer_model，通过 explorer_model.get_next_action(prompt) 调用 LLM
 """
+import hashlib
 import re
-import copy
+from concurrent.futures import ThreadPoolExecutor
+from .annotated_exp import AnnotatedExp
+from .backend_config import generative_config
+from .score_cache import ScoreCache
 from utils import log_flush
 
 
@@ -16,27 +20,109 @@ class GenerativeMixin:
     Generative 打分排序机制 Mixin
     
     使用方式：让你的 Backend 类继承这个 Mixin，然后调用 init_generative()
+    Mixin 要写在 Backend 前面，它的 _deprecate_experience / finish_episode / close 才能包住 Backend 的同名方法
     
     Example:
-        class MyBackend(SomeExpBackend, GenerativeMixin):
+        class MyBackend(GenerativeMixin, SomeExpBackend):
             def __init__(self, ..., explorer_model=None):
                 super().__init__(...)
                 self.init_generative(explorer_model)
     """
     
-    def init_generative(self, explorer_model=None) -> None:
+    def init_generative(
+        self,
+        explorer_model=None,
+        scoring_mode: str = None,
+        max_workers: int = None,
+        topk: int = None,
+        score_cache_path: str = None,
+        score_prompt_templates: list = None,
+    ) -> None:
         """
         初始化 Generative 参数
         
         Args:
             explorer_model: Explorer 模型实例，通过 get_next_action(prompt) 调用
+            scoring_mode: "sequential" / "concurrent" / "batched" (默认从 config 读取)
+            max_workers: concurrent 模式的最大并发数 (默认从 config 读取)
+            topk: 排序后返回前 k 个 (默认从 config 读取)
+            score_cache_path: 打分缓存文件路径，None 或 config 关闭 score_cache 时不缓存
+            score_prompt_templates: 打分用到的 prompt 模板，其 hash 是缓存 key 的一部分，模板一改旧缓存自动失效
         """
         self.generative_model = explorer_model
+        self.generative_scoring_mode = scoring_mode if scoring_mode is not None else generative_config["scoring_mode"]
+        if self.generative_scoring_mode not in ["sequential", "concurrent", "batched"]:
+            raise NotImplementedError(f"Generative scoring mode {self.generative_scoring_mode} is not supported.")
+        self.generative_max_workers = max_workers if max_workers is not None else generative_config["max_workers"]
+        self.generative_topk = topk if topk is not None else generative_config["topk"]
+        
+        self.score_cache = None
+        if score_cache_path is not None and generative_config.get("score_cache", True):
+            self.score_cache = ScoreCache(score_cache_path)
+            # 已被废弃（或已不存在）的经验的分数不再需要
+            dropped = self.score_cache.retain(self.exp_store)
+            self._score_prompt_hash = hashlib.blake2b("\n".join(score_prompt_templates or []).encode("utf-8"), digest_size=8).hexdigest()
+            log_flush(self.logIO, f"[Generative] Loaded score cache {score_cache_path}, {len(self.score_cache)} scores, dropped {dropped} deprecated exps")
         
         if self.generative_model is None:
             log_flush(self.logIO, f"[Generative] WARNING: No explorer_model provided, scoring will be skipped")
         else:
-            log_flush(self.logIO, f"[Generative] Initialized with explorer_model")
+            log_flush(self.logIO, f"[Generative] Initialized with explorer_model, scoring_mode={self.generative_scoring_mode}, topk={self.generative_topk}")
+
+    def _generative_model_name(self) -> str:
+        """打分模型的名字，作为缓存 key 的一部分"""
+        model_name = getattr(self.generative_model, "model_name", None)
+        if model_name is None:
+            # HF 模型：取 from_pretrained 的路径
+            model_name = getattr(getattr(self.generative_model, "model", None), "name_or_path", None)
+        return model_name or type(self.generative_model).__name__
+
+    def generative_invalidate_scores(self, exp_id: str) -> None:
+        """经验被废弃时删除它的缓存分数"""
+        if self.score_cache is not None:
+            self.score_cache.invalidate(exp_id)
+
+    def flush_score_cache(self) -> None:
+        """把新打的分数写回磁盘"""
+        if self.score_cache is not None and self.score_cache.save():
+            log_flush(self.logIO, f"[Generative] Saved score cache {self.score_cache.path}, {len(self.score_cache)} scores")
+
+    def _deprecate_experience(self, exp_id):
+        """废弃经验时同时删除它的缓存分数"""
+        super()._deprecate_experience(exp_id)
+        self.generative_invalidate_scores(exp_id)
+
+    def finish_episode(self) -> None:
+        super().finish_episode()
+        self.flush_score_cache()
+
+    def close(self) -> None:
+        """先写回打分缓存，再关闭经验库"""
+        self.flush_score_cache()
+        super().close()
+
+    def _generative_cached_scores(self, experiences: list, query_state: dict, build_score_prompt_func, build_batch_score_prompt_func=None) -> list:
+        """先查缓存，只给未命中的经验调用 LLM 打分，返回与 experiences 对齐的分数列表"""
+        if self.score_cache is None:
+            return self._generative_scores(experiences, query_state, build_score_prompt_func, build_batch_score_prompt_func)
+        
+        scoring_key = ScoreCache.scoring_key(self.state_table.key(query_state), self._score_prompt_hash, self._generative_model_name())
+        scores = [self.score_cache.get(exp['id'], scoring_key) for exp in experiences]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        log_flush(self.logIO, f"[Generative] Score cache: {len(experiences) - len(missing)} hits, {len(missing)} to score")
+        if missing:
+            new_scores = self._generative_scores([experiences[i] for i in missing], query_state, build_score_prompt_func, build_batch_score_prompt_func)
+            for i, score in zip(missing, new_scores):
+                scores[i] = score
+                # 0 表示打分失败，不缓存，下次重试
+                if score > 0:
+                    self.score_cache.put(experiences[i]['id'], scoring_key, score)
+        return scores
+
+    @staticmethod
+    def _clamp_score(score: int) -> int:
+        # 限制分数范围在 1-10
+        return max(1, min(10, score))
 
     def generative_score_experience(self, exp: dict, query_state: dict, score_prompt: str) -> int:
         """
@@ -55,23 +141,95 @@ class GenerativeMixin:
         
         try:
             response = self.generative_model.get_next_action(score_prompt)
-            # 从响应中提取数字分数
-            match = re.search(r'\d+', response)
-            score = int(match.group()) if match else 0
-            # 限制分数范围在 1-10
-            score = max(1, min(10, score))
-            log_flush(self.logIO, f"[Generative] Scored exp {exp.get('id', 'unknown')}: {score}")
-            return score
+            return self._parse_score(exp, response)
         except Exception as e:
             log_flush(self.logIO, f"[Generative] ERROR scoring exp: {e}")
             return 0
 
+    def _parse_score(self, exp: dict, response: str) -> int:
+        # 从响应中提取数字分数
+        match = re.search(r'\d+', response)
+        score = int(match.group()) if match else 0
+        score = self._clamp_score(score)
+        log_flush(self.logIO, f"[Generative] Scored exp {exp.get('id', 'unknown')}: {score}")
+        return score
+
+    def generative_score_experiences_batched_generation(self, experiences: list, score_prompts: list) -> list:
+        """
+        本地模型一次 generate() 给多个经验打分（每个经验仍是独立的单条 prompt）
+        
+        每批最多 max_workers 条 prompt，返回与 experiences 对齐的分数列表，失败的批次为 0
+        """
+        scores = []
+        batch_size = max(1, self.generative_max_workers)
+        for start in range(0, len(experiences), batch_size):
+            batch_exps = experiences[start:start + batch_size]
+            try:
+                responses = self.generative_model.get_next_actions(score_prompts[start:start + batch_size])
+                scores.extend(self._parse_score(exp, response) for exp, response in zip(batch_exps, responses))
+            except Exception as e:
+                log_flush(self.logIO, f"[Generative] ERROR batch generating scores: {e}")
+                scores.extend([0] * len(batch_exps))
+        return scores
+
+    def generative_score_batch(self, experiences: list, query_state: dict, batch_prompt: str) -> list:
+        """
+        一次 LLM 调用给所有候选经验打分
+        
+        模型按顺序输出逗号分隔的分数（单行，如 "7, 3, 9"），第 i 个数字对应第 i 个经验
+        
+        Returns:
+            分数列表，与 experiences 对齐；缺失或解析失败的位置为 0
+        """
+        if self.generative_model is None:
+            return [0] * len(experiences)
+        
+        try:
+            response = self.generative_model.get_next_action(batch_prompt)
+            numbers = [int(number) for number in re.findall(r'\d+', response)]
+            if len(numbers) < len(experiences):
+                log_flush(self.logIO, f"[Generative] WARNING: batch response has {len(numbers)} scores for {len(experiences)} experiences: {response}")
+            scores = [self._clamp_score(numbers[i]) if i < len(numbers) else 0 for i in range(len(experiences))]
+            log_flush(self.logIO, f"[Generative] Batch scored exps {[exp.get('id', 'unknown') for exp in experiences]}: {scores}")
+            return scores
+        except Exception as e:
+            log_flush(self.logIO, f"[Generative] ERROR batch scoring exps: {e}")
+            return [0] * len(experiences)
+
+    def _generative_scores(self, experiences: list, query_state: dict, build_score_prompt_func, build_batch_score_prompt_func=None) -> list:
+        """按 scoring_mode 给候选经验打分，返回与 experiences 对齐的分数列表"""
+        mode = self.generative_scoring_mode
+        if mode == "batched" and build_batch_score_prompt_func is None:
+            log_flush(self.logIO, f"[Generative] No batch prompt for this backend, falling back to sequential scoring")
+            mode = "sequential"
+        if mode == "concurrent" and not getattr(self.generative_model, "supports_concurrent_requests", False):
+            # 本地模型共享一张卡，并发调用没有收益；能批量生成的改为一次 generate() 跑一批 prompt
+            mode = "batched_generation" if getattr(self.generative_model, "supports_batched_generation", False) else "sequential"
+        
+        if mode == "batched":
+            batch_prompt = build_batch_score_prompt_func(experiences, query_state)
+            return self.generative_score_batch(experiences, query_state, batch_prompt)
+        
+        if mode == "batched_generation" and len(experiences) > 1:
+            score_prompts = [build_score_prompt_func(exp, query_state) for exp in experiences]
+            return self.generative_score_experiences_batched_generation(experiences, score_prompts)
+        
+        def score_one(exp):
+            prompt = build_score_prompt_func(exp, query_state)
+            return self.generative_score_experience(exp, query_state, prompt)
+        
+        if mode == "concurrent" and len(experiences) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.generative_max_workers, len(experiences))) as executor:
+                return list(executor.map(score_one, experiences))
+        return [score_one(exp) for exp in experiences]
+
     def generative_rank_experiences(
         self, 
         experiences: list, 
         query_state: dict,
         build_score_prompt_func,
-        topk: int = None
+        topk: int = None,
+        build_batch_score_prompt_func=None,
     ) -> list:
         """
         对经验列表进行 LLM 打分并排序
@@ -80,13 +238,16 @@ class GenerativeMixin:
             experiences: 原始经验列表
             query_state: 当前查询状态
             build_score_prompt_func: 构建打分 prompt 的函数，签名: (exp, query_state) -> str
-            topk: 返回前 k 个，None 则返回全部
+            topk: 返回前 k 个，None 则使用 init_generative 的 topk
+            build_batch_score_prompt_func: batched 模式构建打分 prompt 的函数，签名: (experiences, query_state) -> str
             
         Returns:
             排序后的经验列表（带 'generative_score' 字段）
         """
         if not experiences:
             return []
+        if topk is None:
+            topk = self.generative_topk
         
         if self.generative_model is None:
             log_flush(self.logIO, f"[Generative] No model, returning original order")
@@ -94,14 +255,8 @@ class GenerativeMixin:
         
         log_flush(self.logIO, f"[Generative] Scoring {len(experiences)} experiences...")
         
-        scored_experiences = []
-        for exp in experiences:
-            prompt = build_score_prompt_func(exp, query_state)
-            score = self.generative_score_experience(exp, query_state, prompt)
-            
-            exp_copy = copy.deepcopy(exp)
-            exp_copy['generative_score'] = score
-            scored_experiences.append(exp_copy)
+        scores = self._generative_cached_scores(experiences, query_state, build_score_prompt_func, build_batch_score_prompt_func)
+        scored_experiences = [AnnotatedExp(exp, generative_score=score) for exp, score in zip(experiences, scores)]
         
         # 按分数降序排序
         scored_experiences.sort(key=lambda x: x['generative_score'], reverse=True)
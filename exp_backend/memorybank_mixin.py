@@ -2,10 +2,12 @@
 Memory Bank Mixin - 带时间戳遗忘机制的通用模块
 """
 import math
-import copy
+import heapq
+import itertools
 from typing import List
 from utils import log_flush
 from .backend_config import memorybank_config
+from .annotated_exp import AnnotatedExp
 
 
 class MemoryBankMixin:
@@ -38,6 +40,10 @@ class MemoryBankMixin:
         self.mb_threshold: float = threshold if threshold is not None else memorybank_config["threshold"]
         self.mb_decay_rate: float = decay_rate if decay_rate is not None else memorybank_config["decay_rate"]
         self.mb_current_timestep: int = start_timestep
+        # 过期堆：(过期时间步, 序号, exp_id, 入堆时的 mb_timestep)，时间戳刷新后旧条目惰性丢弃
+        self._mb_expiry_heap = []
+        self._mb_expiry_seq = itertools.count()
+        self._mb_rebuild_expiry_heap()
         
         log_flush(
             self.logIO, 
@@ -57,6 +63,34 @@ class MemoryBankMixin:
         """
         return math.exp(-time_interval / self.mb_decay_rate)
 
+    def _mb_forget_interval(self) -> float:
+        """
+        最小的整数时间间隔 Δt，使 retention(Δt) < threshold，即 decay_rate·ln(1/threshold) 之后的第一个整数
+        遗忘曲线单调递减，所以经验在 mb_timestep + Δt 时被遗忘
+        """
+        if self.mb_threshold <= 0:
+            return math.inf
+        interval = math.floor(self.mb_decay_rate * math.log(1 / self.mb_threshold))
+        # 以遗忘函数本身为准，修正浮点误差
+        while self._forgetting_function(interval) < self.mb_threshold:
+            interval -= 1
+        while self._forgetting_function(interval) >= self.mb_threshold:
+            interval += 1
+        return interval
+
+    def _mb_schedule_expiry(self, exp) -> None:
+        """将经验按当前时间戳的过期时间步加入过期堆"""
+        exp_timestep = exp.get("mb_timestep", 0)
+        expiry = exp_timestep + self._mb_expiry_interval
+        heapq.heappush(self._mb_expiry_heap, (expiry, next(self._mb_expiry_seq), exp["id"], exp_timestep))
+
+    def _mb_rebuild_expiry_heap(self) -> None:
+        """根据当前参数重建过期堆（初始化、参数变化、过期条目过多时调用）"""
+        self._mb_expiry_interval = self._mb_forget_interval()
+        self._mb_expiry_heap = []
+        for exp in self.exp_store.values():
+            self._mb_schedule_expiry(exp)
+
     def mb_store_experience(self, exp) -> None:
         """
         存储经验并记录时间戳
@@ -65,32 +99,30 @@ class MemoryBankMixin:
         这样经验对象在存储时就已经包含了时间戳信息
         """
         exp["mb_timestep"] = self.mb_current_timestep
+        self._mb_schedule_expiry(exp)
         log_flush(self.logIO, f"[MemoryBank] Stored exp {exp['id']} at timestep {exp['mb_timestep']}")
 
     def mb_filter_by_forgetting(self, experiences: list) -> list:
         """
         对经验列表应用遗忘过滤
         
+        retention >= threshold 等价于 time_interval < 遗忘间隔（见 _mb_forget_interval），用整数比较避免浮点误差
+        
         Args:
             experiences: 原始经验列表
             
         Returns:
-            过滤后的经验列表，按保留度降序排列，每个经验附加 'retention' 字段
+            过滤后的经验列表，保持原顺序，每个经验是附加了 'retention' 字段的只读视图（AnnotatedExp，不拷贝）
         """
         results = []
-        
         for exp in experiences:
-            exp_id = exp["id"]
-            exp_timestep = exp.get("mb_timestep")
+            exp_timestep = exp.get("mb_timestep", 0)
             time_interval = self.mb_current_timestep - exp_timestep
             retention = self._forgetting_function(time_interval)
-            
-            if retention >= self.mb_threshold:
-                exp_copy = copy.deepcopy(exp)
-                exp_copy['retention'] = retention
-                results.append(exp_copy)
+            if time_interval < self._mb_expiry_interval:
+                results.append(AnnotatedExp(exp, retention=retention))
             else:
-                log_flush(self.logIO, f"  [FORGET] exp {exp_id}, retention={retention:.3f}, timestep={exp_timestep}")
+                log_flush(self.logIO, f"  [FORGET] exp {exp['id']}, retention={retention:.3f}, timestep={exp_timestep}")
         
         return results
 
@@ -109,6 +141,7 @@ class MemoryBankMixin:
             self.mb_threshold = threshold
         if decay_rate is not None:
             self.mb_decay_rate = decay_rate
+        self._mb_rebuild_expiry_heap()
         log_flush(self.logIO, f"[MemoryBank] Updated params: threshold={self.mb_threshold}, decay_rate={self.mb_decay_rate}")
 
     def mb_get_stats(self) -> dict:
@@ -125,27 +158,33 @@ class MemoryBankMixin:
     def mb_cleanup_forgotten(self) -> List[str]:
         """
         清理被遗忘的经验：删除所有 retention < threshold 的经验
+        只从过期堆弹出已到期的条目，开销与到期经验数成正比
         
         Returns:
             被删除的经验 ID 列表
         """
-        forgotten_ids = []
+        forgotten_ids = {}
         
-        # 遍历所有经验，找出被遗忘的
-        for exp_id, exp in list(self.exp_store.items()):
-            exp_timestep = exp.get("mb_timestep", 0)
-            time_interval = self.mb_current_timestep - exp_timestep
-            retention = self._forgetting_function(time_interval)
-            
-            if retention < self.mb_threshold:
-                forgotten_ids.append(exp_id)
+        # 弹出所有到期条目，已废弃或时间戳已刷新的条目直接丢弃
+        heap = self._mb_expiry_heap
+        while heap and heap[0][0] <= self.mb_current_timestep:
+            _, _, exp_id, exp_timestep = heapq.heappop(heap)
+            exp = self.exp_store.get(exp_id)
+            if exp is None or exp.get("mb_timestep", 0) != exp_timestep:
+                continue
+            forgotten_ids[exp_id] = None
+        forgotten_ids = list(forgotten_ids)
         
-        # 废弃这些经验
+        # 废弃这些经验，结束后统一写盘一次
         for exp_id in forgotten_ids:
             log_flush(self.logIO, f"[MemoryBank] Cleanup: deprecating forgotten exp {exp_id}")
-            self._deprecate_experience(exp_id)
+        self.bulk_deprecate(forgotten_ids)
         
         log_flush(self.logIO, f"[MemoryBank] Cleanup done: {len(forgotten_ids)} experiences deprecated")
+
+        # 失效条目过多时重建，避免堆无限增长
+        if len(heap) > 2 * len(self.exp_store) + 64:
+            self._mb_rebuild_expiry_heap()
         return forgotten_ids
 
     def mb_finish_explore_trail(self, exp_ids: List[str]) -> None:
@@ -161,6 +200,8 @@ class MemoryBankMixin:
                 exp = self.exp_store[exp_id]
                 old_timestep = exp.get("mb_timestep", 0)
                 exp["mb_timestep"] = self.mb_current_timestep
+                self._mb_schedule_expiry(exp)
+                self._persist_update(exp)
                 updated_count += 1
                 log_flush(self.logIO, f"[MemoryBank] Updated exp {exp_id} timestep: {old_timestep} -> {self.mb_current_timestep}")
         
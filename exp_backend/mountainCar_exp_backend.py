@@ -1,4 +1,5 @@
 from .base_exp_backend import BaseExpBackend
+from .trajectory_table import TrajectoryPath
 from utils import log_flush
 
 class MountainCarExpBackend(BaseExpBackend):
@@ -7,7 +8,7 @@ class MountainCarExpBackend(BaseExpBackend):
         # because parent's __init__ calls _is_valid_exp_store() which uses this field
         self.expected_fields = {
             "id": str,
-            "action_path": list,
+            "action_path": (list, TrajectoryPath),
             "st": dict,
             "action": int,  # MountainCar action is int (0, 1, or 2)
             "st1": dict,
@@ -1,3 +1,4 @@
+import os
 from .mountainCar_exp_vanilla_backend import MountainCarExpVanillaBackend
 from .generative_mixin import GenerativeMixin
 from utils import log_flush
@@ -26,7 +27,28 @@ Score (1-10):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
 """
 
 
-class MountainCarExpGenerativeBackend(MountainCarExpVanillaBackend, GenerativeMixin):
+# MountainCar 一次给所有候选经验打分的 prompt 模板（batched 模式）
+MOUNTAINCAR_BATCH_SCORE_PROMPT = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+You are an agent that scores the relevance of past experiences for MountainCar tasks.
+Score from 1-10 how helpful each past experience is for the current situation.
+Consider: Does this experience help build momentum toward the goal (position >= 0.5)?
+Only output one line with one score per experience, comma-separated, in the given order.<|eot_id|><|start_header_id|>user<|end_header_id|>
+
+Current situation:
+- Position: {query_position:.3f}
+- Velocity: {query_velocity:.4f}
+
+Past experiences:
+{experience_lines}
+
+How relevant is each experience for reaching the goal?
+Scores (1-10, comma-separated):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+"""
+
+
+class MountainCarExpGenerativeBackend(GenerativeMixin, MountainCarExpVanillaBackend):
     """
     MountainCar 带 Generative 打分排序机制的 Backend
     
@@ -41,7 +63,11 @@ class MountainCarExpGenerativeBackend(MountainCarExpVanillaBackend, GenerativeMi
             explorer_model: Explorer 模型实例，用于打分
         """
         super().__init__(env_name, storage_path, depreiciate_exp_store_path, log_dir=log_dir)
-        self.init_generative(explorer_model=explorer_model)
+        self.init_generative(
+            explorer_model=explorer_model,
+            score_cache_path=f"{os.path.splitext(storage_path)[0]}_scores.json",
+            score_prompt_templates=[MOUNTAINCAR_SCORE_PROMPT, MOUNTAINCAR_BATCH_SCORE_PROMPT],
+        )
         
         # 保存原始检索方法
         self._base_retrieve = self.retrieve_experience
@@ -67,6 +93,27 @@ class MountainCarExpGenerativeBackend(MountainCarExpVanillaBackend, GenerativeMi
             next_velocity=st1.get('velocity', 0)
         )
 
+    def _build_batch_score_prompt(self, experiences: list, query_state: dict) -> str:
+        """构建 MountainCar 的批量打分 prompt"""
+        action_names = ['push left', 'coast', 'push right']
+        experience_lines = []
+        for idx, exp in enumerate(experiences, 1):
+            st = exp.get('st', {})
+            st1 = exp.get('st1', {})
+            action = exp.get('action', 1)
+            action_name = action_names[action] if 0 <= action <= 2 else 'unknown'
+            experience_lines.append(
+                f"{idx}. From: position={st.get('position', 0):.3f}, velocity={st.get('velocity', 0):.4f}; "
+                f"Action: {action_name} ({action}); "
+                f"To: position={st1.get('position', 0):.3f}, velocity={st1.get('velocity', 0):.4f}"
+            )
+        
+        return MOUNTAINCAR_BATCH_SCORE_PROMPT.format(
+            query_position=query_state.get('position', 0),
+            query_velocity=query_state.get('velocity', 0),
+            experience_lines="\n".join(experience_lines)
+        )
+
     def retrieve_experience_with_scoring(self, state) -> list:
         """检索经验并用 LLM 打分排序"""
         log_flush(self.logIO, f"[Generative] Retrieving for state: {state}")
@@ -81,7 +128,8 @@ class MountainCarExpGenerativeBackend(MountainCarExpVanillaBackend, GenerativeMi
         ranked_results = self.generative_rank_experiences(
             experiences=raw_results,
             query_state=state,
-            build_score_prompt_func=self._build_score_prompt
+            build_score_prompt_func=self._build_score_prompt,
+            build_batch_score_prompt_func=self._build_batch_score_prompt
         )
         
         log_flush(self.logIO, f"[Generative] Retrieved {len(ranked_results)} experiences after scoring")
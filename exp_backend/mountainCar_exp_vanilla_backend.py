@@ -1,9 +1,8 @@
 from .mountainCar_exp_backend import MountainCarExpBackend
 from .backend_config import mountaincar_vanilla_config
+from .annotated_exp import AnnotatedExp
 from utils import log_flush
-from env_adaptors.base_env_adaptor import BaseEnvAdaptor
 from collections import deque
-import copy
 
 class MountainCarExpVanillaBackend(MountainCarExpBackend):
     def __init__(self, env_name, storage_path, depreiciate_exp_store_path, log_dir=None):
@@ -26,12 +25,8 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
         Retrieve experiences with exact state match.
         For fine-grained numerical states (position: 3 decimals, velocity: 4 decimals).
         """
-        results = []
         log_flush(self.logIO, f"Retrieving experience for exact state: {state}")
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                results.append(exp)
+        results = self._get_exps_by_state(state)
         log_flush(self.logIO, f"Retrieved {len(results)} experiences, ids: {[exp['id'] for exp in results]}")        
         return results
 
@@ -45,9 +40,10 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
         """Check if state has reached the goal (position >= 0.5)."""
         return state.get('position', -1.2) >= self.goal_position
     
-    def _compute_reachable_path_bfs(self, exp: dict) -> dict:
+    def _compute_reachable_path_bfs(self, exp: dict, expanded: set = None) -> dict:
         """
         Use BFS to find if the goal is reachable from this experience.
+        The index keys of the expanded states are added to `expanded` (see _lookup_bfs_value).
         
         Returns:
             dict with:
@@ -63,6 +59,8 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
                 'path': [(exp['st'], exp['action'], exp['st1'])]
             }
         
+        if expanded is None:
+            expanded = set()
         visited = set()
         queue = deque()
         
@@ -76,20 +74,18 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
         # Initial path: [(st, action, st1)]
         initial_path = [(exp['st'], exp['action'], exp['st1'])]
         
-        queue.append((start_state, 0, initial_path))
+        queue.append((start_state, self._get_exp_state_keys(exp)[1], 0, initial_path))
         visited.add(start_key)
         
         while queue:
-            current_state, current_depth, current_path = queue.popleft()
+            current_state, current_index_key, current_depth, current_path = queue.popleft()
             
             if current_depth >= self.max_bfs_depth:
                 continue
             
             # Find all experiences starting from current_state
-            for exp_id, next_exp in self.exp_store.items():
-                if not BaseEnvAdaptor.two_states_equal(current_state, next_exp['st']):
-                    continue
-                
+            expanded.add(current_index_key)
+            for next_exp in self._get_exps_by_state_key(current_index_key):
                 next_state = next_exp['st1']
                 next_key = self._get_state_key(next_state)
                 
@@ -108,7 +104,7 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
                     }
                 
                 visited.add(next_key)
-                queue.append((next_state, current_depth + 1, new_path))
+                queue.append((next_state, self._get_exp_state_keys(next_exp)[1], current_depth + 1, new_path))
         
         # Goal not reachable within max_bfs_depth
         return {
@@ -129,14 +125,14 @@ class MountainCarExpVanillaBackend(MountainCarExpBackend):
         results = []
         log_flush(self.logIO, f"[BFS] Retrieving experience for state: {state}")
         
-        for exp_id, exp in self.exp_store.items():
-            if BaseEnvAdaptor.two_states_equal(state, exp['st']):
-                exp_with_info = copy.deepcopy(exp)
-                reachability = self._compute_reachable_path_bfs(exp)
-                exp_with_info['reachable'] = reachability['reachable']
-                exp_with_info['path_length'] = reachability['path_length']
-                exp_with_info['path_to_goal'] = reachability['path']
-                results.append(exp_with_info)
+        for exp in self._get_exps_by_state(state):
+            reachability = self._lookup_bfs_value(exp, self._compute_reachable_path_bfs)
+            results.append(AnnotatedExp(
+                exp,
+                reachable=reachability['reachable'],
+                path_length=reachability['path_length'],
+                path_to_goal=reachability['path'],
+            ))
         
         # Sort by: reachable first, then by shortest path
         results.sort(key=lambda x: (not x['reachable'], x['path_length'] or float('inf')))
@@ -0,0 +1,67 @@
+import json
+import os
+from .store_snapshot import StoreSnapshot
+
+
+class ScoreCache:
+    """
+    Disk-backed cache of the LLM scores given by generative retrieval.
+
+    Scores are grouped by experience id: exp id -> {scoring key: score}, where the scoring
+    key is "<query state digest>:<prompt templates hash>:<model name>". A deprecated
+    experience is invalidated with a single pop, and changing the prompt templates or
+    the model makes every old entry miss. Only successful scores (1-10) are cached.
+    The file is written with StoreSnapshot, so a crash leaves the previous version.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._snapshot = StoreSnapshot([path], f"{path}.commit")
+        self._snapshot.recover()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.entries = json.load(file)
+
+    def __len__(self) -> int:
+        return sum(len(scores) for scores in self.entries.values())
+
+    @staticmethod
+    def scoring_key(query_key: str, prompt_hash: str, model_name: str) -> str:
+        return f"{query_key}:{prompt_hash}:{model_name}"
+
+    def get(self, exp_id: str, scoring_key: str):
+        """Cached score or None."""
+        scores = self.entries.get(exp_id)
+        if scores is None:
+            return None
+        return scores.get(scoring_key)
+
+    def put(self, exp_id: str, scoring_key: str, score: int) -> None:
+        self.entries.setdefault(exp_id, {})[scoring_key] = score
+        self._dirty = True
+
+    def invalidate(self, exp_id: str) -> None:
+        if self.entries.pop(exp_id, None) is not None:
+            self._dirty = True
+
+    def retain(self, exp_ids) -> int:
+        """Drop the entries of experiences not in exp_ids, returns the number of dropped experiences."""
+        stale = [exp_id for exp_id in self.entries if exp_id not in exp_ids]
+        for exp_id in stale:
+            del self.entries[exp_id]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def save(self) -> bool:
+        """Write the cache if it changed since the last save, returns whether it was written."""
+        if not self._dirty:
+            return False
+        self._snapshot.save([self.entries])
+        self._dirty = False
+        return True
@@ -0,0 +1,62 @@
+import hashlib
+from env_adaptors.base_env_adaptor import BaseEnvAdaptor
+
+
+class StateTable:
+    """
+    Content-addressed table of the states referenced by experiences.
+
+    Every distinct state is kept once, keyed by a stable digest of its canonical
+    string (BaseEnvAdaptor.get_state_str). Experiences point to the shared state
+    object in memory and to the digest on disk, so e.g. the st1 of step k and the
+    st of step k+1 are a single entry. Interned states must not be modified in place.
+
+    _digest_by_obj maps id(state object) -> digest, so it is only valid while the interned
+    objects are never mutated or freed: a mutated state would keep its old digest, and a
+    freed object's id could be reused by another state. The table holds every interned
+    state in `states` and never drops one, which keeps the ids alive.
+    """
+
+    def __init__(self) -> None:
+        self.states = {}
+        # id(interned state object) -> digest, to intern already interned objects without hashing
+        self._digest_by_obj = {}
+
+    @staticmethod
+    def digest(state) -> str:
+        return hashlib.blake2b(BaseEnvAdaptor.get_state_str(state).encode("utf-8"), digest_size=16).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.states)
+
+    def __contains__(self, digest) -> bool:
+        return digest in self.states
+
+    def get(self, digest):
+        return self.states[digest]
+
+    def key(self, state) -> str:
+        """Digest of the state, without interning it."""
+        digest = self._digest_by_obj.get(id(state))
+        if digest is not None:
+            return digest
+        return self.digest(state)
+
+    def add(self, digest: str, state) -> None:
+        """Register a state read from disk under its stored digest."""
+        if digest not in self.states:
+            self.states[digest] = state
+            self._digest_by_obj[id(state)] = digest
+
+    def intern(self, state) -> tuple:
+        """Return (digest, interned state object) for the given state."""
+        digest = self.key(state)
+        interned = self.states.get(digest)
+        if interned is None:
+            self.add(digest, state)
+            interned = state
+        return digest, interned
+
+    def export(self, digests) -> dict:
+        """digest -> state for the given digests, used to write the snapshot."""
+        return {digest: self.states[digest] for digest in digests}
@@ -0,0 +1,87 @@
+import json
+import os
+
+
+class StoreSnapshot:
+    """
+    Crash-safe writer for the json snapshots of the experience store.
+
+    All files of one save are written as a single generation:
+    1. every file is dumped to "<path>.tmp" and fsynced
+    2. the commit marker is created (atomically), from now on the generation is complete
+    3. every "<path>.tmp" is renamed over "<path>"
+    4. the commit marker is removed
+    recover() is called before loading: with a marker the interrupted renames are finished,
+    without one the leftover temp files of an incomplete save are discarded.
+    The live files therefore always hold either the previous or the new generation, never a mix.
+    """
+
+    def __init__(self, paths: list, marker_path: str) -> None:
+        self.paths = list(paths)
+        self.marker_path = marker_path
+
+    @staticmethod
+    def _tmp_path(path: str) -> str:
+        return f"{path}.tmp"
+
+    @staticmethod
+    def _fsync_dir(path: str) -> None:
+        dir_path = os.path.dirname(os.path.abspath(path))
+        try:
+            fd = os.open(dir_path, os.O_RDONLY)
+        except OSError:
+            # Directories cannot be opened on some platforms (e.g. Windows)
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _write_file(path: str, content) -> None:
+        with open(path, 'w') as file:
+            json.dump(content, file)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _rename_all(self) -> None:
+        for path in self.paths:
+            tmp_path = self._tmp_path(path)
+            if os.path.exists(tmp_path):
+                os.replace(tmp_path, path)
+        self._fsync_dir(self.paths[0])
+
+    def save(self, contents: list) -> None:
+        """Write contents[i] to paths[i], all or nothing."""
+        if len(contents) != len(self.paths):
+            raise ValueError(f"Expected {len(self.paths)} contents, got {len(contents)}")
+        for path, content in zip(self.paths, contents):
+            self._write_file(self._tmp_path(path), content)
+
+        marker_tmp_path = self._tmp_path(self.marker_path)
+        self._write_file(marker_tmp_path, {"paths": self.paths})
+        os.replace(marker_tmp_path, self.marker_path)
+        self._fsync_dir(self.marker_path)
+
+        self._rename_all()
+        os.remove(self.marker_path)
+
+    def recover(self) -> str:
+        """
+        Bring the live files back to a complete generation after a crash.
+        Returns "rolled_forward", "discarded" or None if there was nothing to do.
+        """
+        if os.path.exists(self.marker_path):
+            self._rename_all()
+            os.remove(self.marker_path)
+            return "rolled_forward"
+
+        discarded = False
+        for path in self.paths + [self.marker_path]:
+            tmp_path = self._tmp_path(path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+                discarded = True
+        return "discarded" if discarded else None
@@ -0,0 +1,67 @@
+import json
+import os
+from .store_snapshot import StoreSnapshot
+
+
+class SummaryCache:
+    """
+    Disk-backed cache of Voyager summaries, shared by every experience of the same transition.
+
+    Keys are "<transition digest>:<prompt template hash>:<model name>", the transition
+    digest covering (st, action, st1) only, so experiences that differ in id and path
+    reuse one summary across runs. Summaries are grouped by transition digest:
+    digest -> {"<prompt template hash>:<model name>": summary}, so a transition no
+    experience in the store uses any more is invalidated with a single pop.
+    Only successfully generated summaries are cached.
+    The file is written with StoreSnapshot, so a crash leaves the previous version.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.summaries = {}
+        self._dirty = False
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._snapshot = StoreSnapshot([path], f"{path}.commit")
+        self._snapshot.recover()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.summaries = json.load(file)
+
+    def __len__(self) -> int:
+        return sum(len(summaries) for summaries in self.summaries.values())
+
+    def get(self, key: str):
+        """Cached summary or None."""
+        transition_digest, _, generation_key = key.partition(":")
+        summaries = self.summaries.get(transition_digest)
+        if summaries is None:
+            return None
+        return summaries.get(generation_key)
+
+    def put(self, key: str, summary: str) -> None:
+        transition_digest, _, generation_key = key.partition(":")
+        self.summaries.setdefault(transition_digest, {})[generation_key] = summary
+        self._dirty = True
+
+    def invalidate(self, transition_digest: str) -> None:
+        if self.summaries.pop(transition_digest, None) is not None:
+            self._dirty = True
+
+    def retain(self, transition_digests) -> int:
+        """Drop the summaries of transitions not in transition_digests, returns the number of dropped transitions."""
+        stale = [digest for digest in self.summaries if digest not in transition_digests]
+        for digest in stale:
+            del self.summaries[digest]
+        if stale:
+            self._dirty = True
+        return len(stale)
+
+    def save(self) -> bool:
+        """Write the cache if it changed since the last save, returns whether it was written."""
+        if not self._dirty:
+            return False
+        self._snapshot.save([self.summaries])
+        self._dirty = False
+        return True
@@ -0,0 +1,89 @@
+import itertools
+from collections.abc import Sequence
+
+
+class TrajectoryPath(Sequence):
+    """
+    Read-only view of the first `length` actions of a shared trajectory.
+    Behaves like the action_path list it replaces (len, indexing, iteration, slicing returns a list).
+    """
+
+    __slots__ = ("actions", "length")
+
+    def __init__(self, actions: list, length: int) -> None:
+        self.actions = actions
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.actions[:self.length][index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("action path index out of range")
+        return self.actions[index]
+
+    def __iter__(self):
+        return itertools.islice(self.actions, self.length)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, TrajectoryPath)):
+            return len(other) == self.length and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(self.to_list())
+
+    def __deepcopy__(self, memo) -> list:
+        # Copies handed out by the retrieval functions are plain lists, as before
+        return self.to_list()
+
+    def to_list(self) -> list:
+        return self.actions[:self.length]
+
+
+class TrajectoryTable:
+    """
+    Actions of every recorded episode, keyed by trajectory id.
+
+    An experience of step k only stores (trajectory_id, trajectory_step=k) on disk and
+    sees its action_path as a TrajectoryPath over the shared record, so an episode of
+    length L keeps L actions instead of L^2 / 2.
+    """
+
+    def __init__(self) -> None:
+        self.trajectories = {}
+
+    def __contains__(self, trajectory_id) -> bool:
+        return trajectory_id in self.trajectories
+
+    def __len__(self) -> int:
+        return len(self.trajectories)
+
+    def extend(self, trajectory_id: str, start: int, actions: list) -> None:
+        """Write actions at position start of the trajectory (used when loading)."""
+        record = self.trajectories.setdefault(trajectory_id, [])
+        del record[start:]
+        record.extend(actions)
+
+    def attach(self, trajectory_id: str, action_path) -> TrajectoryPath:
+        """Merge an experience's action_path into its trajectory and return the shared view."""
+        record = self.trajectories.setdefault(trajectory_id, [])
+        common = min(len(action_path), len(record))
+        if list(action_path[:common]) != record[:common]:
+            raise ValueError(f"Action path diverges from the recorded trajectory {trajectory_id}")
+        if len(action_path) > len(record):
+            record.extend(action_path[len(record):])
+        return TrajectoryPath(record, len(action_path))
+
+    def path(self, trajectory_id: str, length: int) -> TrajectoryPath:
+        record = self.trajectories[trajectory_id]
+        if length > len(record):
+            raise ValueError(f"Trajectory {trajectory_id} has {len(record)} actions, {length} requested")
+        return TrajectoryPath(record, length)
+
+    def export(self, trajectory_ids) -> dict:
+        return {trajectory_id: self.trajectories[trajectory_id] for trajectory_id in trajectory_ids}
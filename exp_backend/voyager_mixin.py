@@ -4,8 +4,19 @@ Voyager Mixin - 存储时生成 LLM 总结的通用模块
 简易版 Voyager：在存储经验时，调用 LLM 生成一条总结 (summary)，
 其他检索逻辑保持不变。
 
+async 模式下总结在后台线程池生成：经验先带 voyager_summary_pending 标记存入，
+总结生成好后在主线程写回 voyager_summary 并持久化，检索只用已经生成好的总结。
+
+(st, action, st1) 相同的经验共用一条总结：按转移内容 digest + prompt 模板 hash + 模型名缓存到磁盘，
+只有没见过的转移才调用 LLM。某个转移的经验全部被废弃后，它的缓存总结随之删除。
+
 使用方式：传入 explorer_model，通过 explorer_model.get_next_action(prompt) 调用 LLM
 """
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from .backend_config import voyager_config
+from .summary_cache import SummaryCache
 from utils import log_flush
 
 
@@ -14,27 +25,113 @@ class VoyagerMixin:
     Voyager 总结机制 Mixin
     
     使用方式：让你的 Backend 类继承这个 Mixin，然后调用 init_voyager()
+    Mixin 要写在 Backend 前面，它的 _deprecate_experience / finish_episode / close 才能包住 Backend 的同名方法
     
     Example:
-        class MyBackend(SomeExpBackend, VoyagerMixin):
+        class MyBackend(VoyagerMixin, SomeExpBackend):
             def __init__(self, ..., explorer_model=None):
                 super().__init__(...)
                 self.init_voyager(explorer_model)
     """
     
-    def init_voyager(self, explorer_model=None) -> None:
+    def init_voyager(
+        self,
+        explorer_model=None,
+        build_summary_prompt_func=None,
+        summary_mode: str = None,
+        summary_workers: int = None,
+        summary_cache_path: str = None,
+        summary_prompt_template: str = None,
+    ) -> None:
         """
         初始化 Voyager 参数
         
         Args:
             explorer_model: Explorer 模型实例，通过 get_next_action(prompt) 调用
+            build_summary_prompt_func: 构建总结 prompt 的函数，签名: (exp) -> str，用于重新提交上次未完成的总结
+            summary_mode: "sync" / "async" (默认从 config 读取)
+            summary_workers: async 模式的后台线程数 (默认从 config 读取)
+            summary_cache_path: 总结缓存文件路径，None 或 config 关闭 summary_cache 时不缓存
+            summary_prompt_template: 总结 prompt 模板，其 hash 是缓存 key 的一部分，模板一改旧缓存自动失效
         """
         self.voyager_model = explorer_model
+        self.voyager_build_summary_prompt = build_summary_prompt_func
+        self.voyager_summary_mode = summary_mode if summary_mode is not None else voyager_config["summary_mode"]
+        if self.voyager_summary_mode not in ["sync", "async"]:
+            raise NotImplementedError(f"Voyager summary mode {self.voyager_summary_mode} is not supported.")
+        if self.voyager_summary_mode == "async" and not getattr(self.voyager_model, "supports_concurrent_requests", False):
+            # 本地模型和 explorer 共用 tokenizer 和显卡，不能在后台线程并发调用
+            self.voyager_summary_mode = "sync"
+        summary_workers = summary_workers if summary_workers is not None else voyager_config["summary_workers"]
+        
+        self.summary_cache = None
+        if summary_cache_path is not None and voyager_config.get("summary_cache", True):
+            self.summary_cache = SummaryCache(summary_cache_path)
+            # 经验已全部被废弃（或已不存在）的转移不再需要总结
+            dropped = self.summary_cache.retain({self._voyager_transition_digest(exp) for exp in self.exp_store.values()})
+            log_flush(self.logIO, f"[Voyager] Loaded summary cache {summary_cache_path}, {len(self.summary_cache)} summaries, dropped {dropped} deprecated transitions")
+        self._summary_prompt_hash = hashlib.blake2b((summary_prompt_template or "").encode("utf-8"), digest_size=8).hexdigest()
+        
+        # exp_id -> 总结 key，以及 总结 key -> 生成中的 future（相同转移共用一个请求）
+        self._voyager_pending = {}
+        self._voyager_inflight = {}
+        self._voyager_executor = None
+        if self.voyager_summary_mode == "async":
+            self._voyager_executor = ThreadPoolExecutor(max_workers=summary_workers, thread_name_prefix="voyager-summary")
         
         if self.voyager_model is None:
             log_flush(self.logIO, f"[Voyager] WARNING: No explorer_model provided, summary will be placeholder")
         else:
-            log_flush(self.logIO, f"[Voyager] Initialized with explorer_model")
+            log_flush(self.logIO, f"[Voyager] Initialized with explorer_model, summary_mode={self.voyager_summary_mode}")
+        
+        # 上次运行退出前没生成完的总结
+        if self.voyager_build_summary_prompt is not None:
+            pending_ids = [exp_id for exp_id, exp in self.exp_store.items() if exp.get('voyager_summary_pending')]
+            if pending_ids:
+                log_flush(self.logIO, f"[Voyager] Resuming {len(pending_ids)} pending summaries")
+            for exp_id in pending_ids:
+                exp = self.exp_store[exp_id]
+                summary_key = self._voyager_summary_key(exp)
+                summary = self.summary_cache.get(summary_key) if self.summary_cache is not None else None
+                if summary is not None:
+                    self._voyager_apply_summary(exp_id, summary)
+                elif self.voyager_summary_mode == "async":
+                    self._voyager_submit(exp_id, summary_key, self.voyager_build_summary_prompt(exp))
+                else:
+                    self._voyager_apply_summary(exp_id, self._voyager_generate_and_cache(summary_key, self.voyager_build_summary_prompt(exp)))
+
+    def _voyager_transition_digest(self, exp: dict) -> str:
+        """(st, action, st1) 的 digest，不含经验 id 和路径"""
+        transition = f"{self.state_table.key(exp['st'])}|{json.dumps(exp['action'], ensure_ascii=False)}|{self.state_table.key(exp['st1'])}"
+        return hashlib.blake2b(transition.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _voyager_summary_key(self, exp: dict) -> str:
+        """总结缓存 key：(st, action, st1) 的 digest + prompt 模板 hash + 模型名"""
+        transition_digest = self._voyager_transition_digest(exp)
+        model_name = getattr(self.voyager_model, "model_name", None)
+        if model_name is None:
+            # HF 模型：取 from_pretrained 的路径
+            model_name = getattr(getattr(self.voyager_model, "model", None), "name_or_path", None)
+        return f"{transition_digest}:{self._summary_prompt_hash}:{model_name or type(self.voyager_model).__name__}"
+
+    def _voyager_call_model(self, prompt: str) -> tuple:
+        """调用 LLM 生成总结，返回 (总结, 是否成功)；失败时返回占位/错误信息，不应缓存"""
+        if self.voyager_model is None:
+            return "No explorer_model available for summary generation.", False
+        
+        try:
+            summary = self.voyager_model.get_next_action(prompt)
+            # 清理可能的多余空白
+            summary = summary.strip()
+            # 模型出错时可能返回空字符串（如 OpenAIExplorerModel 捕获 API 异常），视为失败，不写入缓存
+            if not summary:
+                log_flush(self.logIO, f"[Voyager] ERROR generating summary: empty response")
+                return "Summary generation failed: empty response", False
+            log_flush(self.logIO, f"[Voyager] Generated summary: {summary[:100]}...")
+            return summary, True
+        except Exception as e:
+            log_flush(self.logIO, f"[Voyager] ERROR generating summary: {e}")
+            return f"Summary generation failed: {str(e)}", False
 
     def voyager_generate_summary(self, prompt: str) -> str:
         """
@@ -46,18 +143,113 @@ class VoyagerMixin:
         Returns:
             生成的总结字符串
         """
-        if self.voyager_model is None:
-            return "No explorer_model available for summary generation."
+        return self._voyager_call_model(prompt)[0]
+
+    def _voyager_generate_and_cache(self, summary_key: str, prompt: str) -> str:
+        summary, ok = self._voyager_call_model(prompt)
+        if ok and self.summary_cache is not None:
+            self.summary_cache.put(summary_key, summary)
+        return summary
+
+    def voyager_summarize(self, exp: dict, prompt: str) -> None:
+        """
+        给将要存储的经验生成总结
         
-        try:
-            summary = self.voyager_model.get_next_action(prompt)
-            # 清理可能的多余空白
-            summary = summary.strip()
-            log_flush(self.logIO, f"[Voyager] Generated summary: {summary[:100]}...")
-            return summary
-        except Exception as e:
-            log_flush(self.logIO, f"[Voyager] ERROR generating summary: {e}")
-            return f"Summary generation failed: {str(e)}"
+        相同转移已有缓存总结时直接复用；否则 sync 模式直接写入 exp['voyager_summary']，
+        async 模式只打上 pending 标记并提交到后台，需要在 exp 存储之后由 voyager_collect_summaries() 写回
+        """
+        summary_key = self._voyager_summary_key(exp)
+        summary = self.summary_cache.get(summary_key) if self.summary_cache is not None else None
+        if summary is not None:
+            log_flush(self.logIO, f"[Voyager] Reused cached summary for {exp['id']}")
+            exp['voyager_summary'] = summary
+            return
+        if self.voyager_summary_mode == "sync":
+            exp['voyager_summary'] = self._voyager_generate_and_cache(summary_key, prompt)
+            return
+        exp['voyager_summary_pending'] = True
+        self._voyager_submit(exp['id'], summary_key, prompt)
+
+    def _voyager_submit(self, exp_id: str, summary_key: str, prompt: str) -> None:
+        if summary_key not in self._voyager_inflight:
+            self._voyager_inflight[summary_key] = self._voyager_executor.submit(self._voyager_call_model, prompt)
+        else:
+            log_flush(self.logIO, f"[Voyager] Summary for {exp_id} shares an in-flight request")
+        self._voyager_pending[exp_id] = summary_key
+
+    def _voyager_apply_summary(self, exp_id: str, summary: str) -> None:
+        """在主线程把总结写回已存储的经验并持久化"""
+        if exp_id in self.exp_store:
+            exp = self.exp_store[exp_id]
+        elif exp_id in self.depreiciate_exp_store:
+            exp = self.depreiciate_exp_store[exp_id]
+        else:
+            return
+        exp['voyager_summary'] = summary
+        exp.pop('voyager_summary_pending', None)
+        if exp_id in self.exp_store:
+            self._persist_update(exp)
+
+    def voyager_collect_summaries(self, wait: bool = False) -> int:
+        """
+        写回后台已生成好的总结，返回写回的数量
+        
+        Args:
+            wait: 是否等待所有未完成的总结
+        """
+        done_keys = [summary_key for summary_key, future in self._voyager_inflight.items() if wait or future.done()]
+        if not done_keys:
+            return 0
+        results = {}
+        for summary_key in done_keys:
+            # _voyager_call_model 自己处理异常，result() 不会抛出
+            summary, ok = self._voyager_inflight.pop(summary_key).result()
+            if ok and self.summary_cache is not None:
+                self.summary_cache.put(summary_key, summary)
+            results[summary_key] = summary
+        done_ids = [exp_id for exp_id, summary_key in self._voyager_pending.items() if summary_key in results]
+        for exp_id in done_ids:
+            self._voyager_apply_summary(exp_id, results[self._voyager_pending.pop(exp_id)])
+        log_flush(self.logIO, f"[Voyager] Collected {len(done_ids)} summaries from {len(done_keys)} requests, {len(self._voyager_pending)} still pending")
+        return len(done_ids)
+
+    def flush_summary_cache(self) -> None:
+        """把新生成的总结写回磁盘"""
+        if self.summary_cache is not None and self.summary_cache.save():
+            log_flush(self.logIO, f"[Voyager] Saved summary cache {self.summary_cache.path}, {len(self.summary_cache)} summaries")
+
+    def voyager_drain(self) -> None:
+        """等待并写回所有未完成的总结，然后关闭线程池（关闭经验库前调用）"""
+        if self._voyager_executor is not None:
+            self.voyager_collect_summaries(wait=True)
+            self._voyager_executor.shutdown(wait=True)
+            self._voyager_executor = None
+            self.flush_store()
+        self.flush_summary_cache()
+
+    def _deprecate_experience(self, exp_id):
+        """废弃经验时，若 store 中已没有同一转移的经验，同时删除该转移的缓存总结"""
+        super()._deprecate_experience(exp_id)
+        if self.summary_cache is None:
+            return
+        exp = self.depreiciate_exp_store[exp_id]
+        transition_digest = self._voyager_transition_digest(exp)
+        for other_id in self.get_exp_ids_by_state(exp['st']):
+            if self._voyager_transition_digest(self.exp_store[other_id]) == transition_digest:
+                return
+        self.summary_cache.invalidate(transition_digest)
+
+    def finish_episode(self) -> None:
+        self.voyager_collect_summaries()
+        super().finish_episode()
+        self.flush_summary_cache()
+
+    def close(self) -> None:
+        """先写回所有总结，再关闭经验库"""
+        if self._closed:
+            return
+        self.voyager_drain()
+        super().close()
 
     def voyager_get_summary(self, exp_id: str) -> str:
         """获取经验的总结"""
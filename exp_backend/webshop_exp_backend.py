@@ -1,7 +1,7 @@
 from .base_exp_backend import BaseExpBackend
+from .trajectory_table import TrajectoryPath
 from env_adaptors.webshop_adaptor import WebshopAdaptor
 from utils import log_flush
-from utils import get_timestamp
 import json
 
 class WebshopExpBackend(BaseExpBackend):
@@ -10,7 +10,7 @@ class WebshopExpBackend(BaseExpBackend):
         # because parent's __init__ calls _is_valid_exp_store() which uses this field
         self.expected_fields = {
             "id": str,
-            "action_path": list,
+            "action_path": (list, TrajectoryPath),
             "st": dict,
             "action": str,
             "st1": dict,
@@ -115,29 +115,3 @@ class WebshopExpBackend(BaseExpBackend):
                 self._deprecate_experience(e1_id)
 
         log_flush(self.logIO, f"Conflict resolution completed for {e0_id} and {e1_id}")
-
-    def _exp_exist(self, exp_id):
-        return exp_id in self.exp_store or exp_id in self.depreiciate_exp_store
-
-    def _exp_is_depreciated(self, exp_id):
-        """Check if an experience is depreciated."""
-        if exp_id in self.depreiciate_exp_store:
-            assert exp_id not in self.exp_store
-            return True
-        return False
-    
-    def _deprecate_experience(self, exp_id):
-        """Move an experience from exp_store to deprecated_exp_store."""
-        if exp_id in self.exp_store and exp_id in self.depreiciate_exp_store:
-            raise ValueError(f"Experience {exp_id} in both store and deprecated store")
-        elif exp_id in self.depreiciate_exp_store:
-            log_flush(self.logIO, f"  Experience {exp_id} already in deprecated store")
-            return
-        elif exp_id in self.exp_store:
-            self.depreiciate_exp_store[exp_id] = self.exp_store[exp_id]
-            self.depreiciate_exp_store[exp_id]['deprecated_at'] = get_timestamp()
-            del self.exp_store[exp_id]
-            log_flush(self.logIO, f"[DEPRECIATE] Experience {exp_id} moved to deprecated store")
-            self.save_store()
-        else:
-            raise ValueError(f"Experience {exp_id} not found in in any store")
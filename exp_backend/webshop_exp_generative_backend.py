@@ -1,3 +1,4 @@
+import os
 from .webshop_exp_vanilla_backend import WebshopExpVanillaBackend
 from .generative_mixin import GenerativeMixin
 from utils import log_flush
@@ -25,7 +26,27 @@ Score (1-10):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
 """
 
 
-class WebshopExpGenerativeBackend(WebshopExpVanillaBackend, GenerativeMixin):
+# Webshop 一次给所有候选经验打分的 prompt 模板（batched 模式）
+WEBSHOP_BATCH_SCORE_PROMPT = """<|begin_of_text|><|start_header_id|>system<|end_header_id|>
+
+You are an agent that scores the relevance of past shopping experiences for the current task.
+Score from 1-10 how helpful each past experience is for the current situation.
+Consider: Does this action lead to finding or purchasing the target product?
+Only output one line with one score per experience, comma-separated, in the given order.<|eot_id|><|start_header_id|>user<|end_header_id|>
+
+Current situation:
+- URL: {query_url}
+
+Past experiences:
+{experience_lines}
+
+How relevant is each experience for the current shopping task?
+Scores (1-10, comma-separated):<|eot_id|><|start_header_id|>assistant<|end_header_id|>
+
+"""
+
+
+class WebshopExpGenerativeBackend(GenerativeMixin, WebshopExpVanillaBackend):
     """
     Webshop 带 Generative 打分排序机制的 Backend
     
@@ -40,7 +61,11 @@ class WebshopExpGenerativeBackend(WebshopExpVanillaBackend, GenerativeMixin):
             explorer_model: Explorer 模型实例，用于打分
         """
         super().__init__(env_name, storage_path, depreiciate_exp_store_path, log_dir=log_dir)
-        self.init_generative(explorer_model=explorer_model)
+        self.init_generative(
+            explorer_model=explorer_model,
+            score_cache_path=f"{os.path.splitext(storage_path)[0]}_scores.json",
+            score_prompt_templates=[WEBSHOP_SCORE_PROMPT, WEBSHOP_BATCH_SCORE_PROMPT],
+        )
         
         # 保存原始检索方法
         self._base_retrieve = self.retrieve_experience
@@ -59,6 +84,21 @@ class WebshopExpGenerativeBackend(WebshopExpVanillaBackend, GenerativeMixin):
             next_url=st1.get('url', 'unknown')
         )
 
+    def _build_batch_score_prompt(self, experiences: list, query_state: dict) -> str:
+        """构建 Webshop 的批量打分 prompt"""
+        experience_lines = []
+        for idx, exp in enumerate(experiences, 1):
+            st = exp.get('st', {})
+            st1 = exp.get('st1', {})
+            experience_lines.append(
+                f"{idx}. From URL: {st.get('url', 'unknown')}; Action: {exp.get('action', '')}; To URL: {st1.get('url', 'unknown')}"
+            )
+        
+        return WEBSHOP_BATCH_SCORE_PROMPT.format(
+            query_url=query_state.get('url', 'unknown'),
+            experience_lines="\n".join(experience_lines)
+        )
+
     def retrieve_experience_with_scoring(self, state) -> list:
         """检索经验并用 LLM 打分排序"""
         log_flush(self.logIO, f"[Generative] Retrieving for state: {state}")
@@ -73,7 +113,8 @@ class WebshopExpGenerativeBackend(WebshopExpVanillaBackend, GenerativeMixin):
         ranked_results = self.generative_rank_experiences(
             experiences=raw_results,
             query_state=state,
-            build_score_prompt_func=self._build_score_prompt
+            build_score_prompt_func=self._build_score_prompt,
+            build_batch_score_prompt_func=self._build_batch_score_prompt
         )
         
         log_flush(self.logIO, f"[Generative] Retrieved {len(ranked_results)} experiences after scoring")
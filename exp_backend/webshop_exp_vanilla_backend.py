@@ -1,9 +1,9 @@
 from .webshop_exp_backend import WebshopExpBackend
 from .backend_config import webshop_vanilla_config
+from .annotated_exp import AnnotatedExp
 from utils import log_flush
 from env_adaptors.webshop_adaptor import WebshopAdaptor
 from collections import deque
-import copy
 
 class WebshopExpVanillaBackend(WebshopExpBackend):
     def __init__(self, env_name, storage_path, depreiciate_exp_store_path, log_dir=None):
@@ -21,12 +21,8 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
             raise NotImplementedError(f"Algorithm {self.algorithm} is not supported.")
 
     def retrieve_experience_sameSt_1Step(self, state) -> list:
-        results = []
         log_flush(self.logIO, f"Retrieving experience for state: {state}")
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if WebshopAdaptor.two_states_equal(state, exp['st']):
-                results.append(exp)
+        results = self._get_exps_by_state(state)
         log_flush(self.logIO, f"Retrieved {len(results)} experiences, results ids: {[exp['id'] for exp in results]}")        
         return results
 
@@ -54,7 +50,7 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
         """Generate a unique key for a state to track visited states."""
         return state.get('url', '')
 
-    def _compute_max_score_bfs(self, exp: dict) -> float:
+    def _compute_max_score_bfs(self, exp: dict, expanded: set = None) -> float:
         """
         Use BFS to compute the maximum achievable score starting from this experience.
         
@@ -63,7 +59,11 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
         - Skip search pages to avoid cycles
         - Track visited states to avoid infinite loops
         - Respect max_bfs_depth to limit search depth
+        
+        The index keys of the expanded states are added to `expanded` (see _lookup_bfs_value).
         """
+        if expanded is None:
+            expanded = set()
         # Check if exp's st1 is already a finished state
         is_finished, score = WebshopAdaptor.check_finished_and_get_score(exp['st1'])
         if is_finished:
@@ -84,21 +84,17 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
         if self._is_search_page(start_state):
             return None
         
-        queue.append((start_state, 0))
+        queue.append((start_state, self._get_exp_state_keys(exp)[1], 0))
         visited.add(start_key)
         
         while queue:
-            current_state, current_depth = queue.popleft()
+            current_state, current_index_key, current_depth = queue.popleft()
             
             if current_depth >= self.max_bfs_depth:
                 continue
             
-            for exp_id in self.exp_store.keys():
-                next_exp = self.exp_store[exp_id]
-                
-                if not WebshopAdaptor.two_states_equal(current_state, next_exp['st']):
-                    continue
-                
+            expanded.add(current_index_key)
+            for next_exp in self._get_exps_by_state_key(current_index_key):
                 next_state = next_exp['st1']
                 next_key = self._get_state_key(next_state)
 
@@ -118,7 +114,7 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
                     continue
 
                 visited.add(next_key)
-                queue.append((next_state, current_depth + 1))
+                queue.append((next_state, self._get_exp_state_keys(next_exp)[1], current_depth + 1))
         
         return max_score
 
@@ -130,13 +126,9 @@ class WebshopExpVanillaBackend(WebshopExpBackend):
         results = []
         log_flush(self.logIO, f"[BFS] Retrieving experience for state: {state}")
         
-        for exp_id in self.exp_store.keys():
-            exp = self.exp_store[exp_id]
-            if WebshopAdaptor.two_states_equal(state, exp['st']):
-                exp_with_score = copy.deepcopy(exp)
-                max_score = self._compute_max_score_bfs(exp)
-                exp_with_score['max_score'] = max_score
-                results.append(exp_with_score)
+        for exp in self._get_exps_by_state(state):
+            max_score = self._lookup_bfs_value(exp, self._compute_max_score_bfs)
+            results.append(AnnotatedExp(exp, max_score=max_score))
         
         log_flush(self.logIO, f"[BFS] Retrieved {len(results)} experiences, ids: {[exp['id'] for exp in results]}")
         log_flush(self.logIO, f"[BFS] Max scores: {[(exp['id'], exp.get('max_score')) for exp in results]}")
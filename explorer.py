@@ -5,6 +5,8 @@ from plugin_loader import load_explorer_model, load_adaptor, load_exp_backend
 from utils import log_flush, get_timestamp, get_timestamp_ms, is_success_trail, extract_exp_ids
 from config import explorer_settings
 import time
+import math
+import random
 
 class Explorer:
     def __init__(
@@ -158,6 +160,15 @@ class Explorer:
             adaptor_kwargs["correct_index"] = self.correct_index
             adaptor_kwargs["session"] = self.session
         self.adaptor = load_adaptor(self.env_name, self.model_name, **adaptor_kwargs)
+        # 本地模型缓存该环境固定的 system prompt 前缀的 KV，每步只 prefill 动态的 user 部分
+        if explorer_settings.get("prefix_kv_cache", True):
+            static_prefix = self.adaptor.get_static_prompt_prefix()
+            if static_prefix:
+                self.explorer_model.register_prompt_prefix(static_prefix)
+        # The previous backend flushes and closes before the new one loads the same store files,
+        # so the new backend sees every change and the old one never writes a stale snapshot
+        if getattr(self, "exp_backend", None) is not None:
+            self.exp_backend.close()
         # 传入 explorer_model 给 backend（voyager backend 需要用它生成总结）
         self.exp_backend = load_exp_backend(
             self.backend_env,
@@ -186,6 +197,19 @@ class Explorer:
         self.in_process = False
         self.conflict_soultion = explorer_settings["conflict_soultion"]
         self.alpha = explorer_settings["alpha"]
+        self.constrained_action_decoding = explorer_settings.get("constrained_action_decoding")
+        if self.constrained_action_decoding not in [None, "sample", "argmax"]:
+            raise NotImplementedError(f"Constrained action decoding {self.constrained_action_decoding} is not supported.")
+        self.candidate_ranking = explorer_settings.get("candidate_ranking")
+        if self.candidate_ranking not in [None, "sample", "argmax"]:
+            raise NotImplementedError(f"Candidate ranking {self.candidate_ranking} is not supported.")
+        self.action_stop_pattern = explorer_settings.get("action_stop_pattern", True)
+        # Samples drawn at once after an invalid first action (the checks left for this step)
+        self.num_action_samples = max(1, self.max_action_retries - 1) if explorer_settings.get("multi_sample_actions", True) else 1
+
+    def close(self) -> None:
+        """Flush and close the experience backend, called once the run is finished."""
+        self.exp_backend.close()
 
     def process_memory_env(self, memory_env: str):
         if memory_env not in ["vanilla", "generative", "memorybank", "voyager"]:
@@ -193,13 +217,53 @@ class Explorer:
         self.backend_env = f"{self.env_name}-{memory_env}"
 
     def get_next_action(self, retrieved_experiences: list = None) -> str:
+        return self.get_next_action_samples(retrieved_experiences, 1)[0]
+
+    def get_next_action_samples(self, retrieved_experiences: list = None, num_samples: int = 1) -> list:
+        """
+        Formatted candidate actions for the current state, in the order they should be tried.
+        Generation returns num_samples samples from one model call; constrained decoding and
+        candidate ranking return a single action.
+        """
         if retrieved_experiences is None:
             retrieved_experiences = []
         get_action_prompt = self.adaptor.get_action_prompt(retrieved_experiences)
         log_flush(self.promptLogIO, f"Action prompt: [{get_timestamp()}] - {get_action_prompt}")
-        raw_action = self.explorer_model.get_next_action(get_action_prompt)
-        formatted_action = self.adaptor.format_action(raw_action)
-        return formatted_action
+        raw_action = None
+        if self.constrained_action_decoding is not None and getattr(self.explorer_model, "supports_constrained_choice", False):
+            available_actions = self.adaptor.get_available_actions()
+            # Discrete-action envs (FrozenLake, MountainCar): one forward pass over the action tokens
+            if available_actions and all(isinstance(action, int) for action in available_actions):
+                raw_action = self.explorer_model.choose_action(
+                    get_action_prompt,
+                    [str(action) for action in available_actions],
+                    sample=self.constrained_action_decoding == "sample",
+                )
+        if raw_action is None and self.candidate_ranking is not None and getattr(self.explorer_model, "supports_candidate_scoring", False):
+            # WebShop pages without a search bar: score every click[...] by log-likelihood in one batch
+            candidates = self.adaptor.get_action_candidates()
+            if candidates:
+                scores = self.explorer_model.score_candidates(get_action_prompt, candidates)
+                if scores is not None:
+                    index = self._pick_candidate(scores)
+                    raw_action = candidates[index]
+                    log_flush(self.logIO, f"- Candidate ranking ({self.candidate_ranking}): {raw_action} ({scores[index]:.3f}) among {len(candidates)} candidates")
+        if raw_action is not None:
+            return [self.adaptor.format_action(raw_action)]
+        stop_pattern = self.adaptor.get_action_stop_pattern() if self.action_stop_pattern else None
+        if num_samples > 1 and getattr(self.explorer_model, "supports_multiple_samples", False):
+            raw_actions = self.explorer_model.get_next_action_samples(get_action_prompt, num_samples, stop_pattern=stop_pattern)
+        else:
+            raw_actions = [self.explorer_model.get_next_action(get_action_prompt, stop_pattern=stop_pattern)]
+        return [self.adaptor.format_action(raw_action) for raw_action in raw_actions]
+
+    def _pick_candidate(self, scores: list) -> int:
+        """Index of the chosen candidate: argmax, or a sample from the softmax over the scores."""
+        if self.candidate_ranking == "argmax":
+            return max(range(len(scores)), key=lambda i: scores[i])
+        top = max(scores)
+        weights = [math.exp(score - top) for score in scores]
+        return random.choices(range(len(scores)), weights=weights)[0]
 
     def record_experience(self):
         """Record the current step's experience to the backend."""
@@ -240,7 +304,9 @@ class Explorer:
             log_flush(self.logIO, f"- Experience retrieval disabled (use_experience=False), using empty experience list")
         
         # Get and validate action (pass retrieved experiences to the prompt if enabled)
-        todo_action = self.get_next_action(retrieved_experiences)
+        # A single sample first; if it is invalid, one model call samples the remaining retries
+        todo_actions = self.get_next_action_samples(retrieved_experiences, 1)
+        todo_action = todo_actions.pop(0)
         log_flush(self.logIO, f"- Todo action: {todo_action}")
         action_valid = False
         
@@ -249,10 +315,15 @@ class Explorer:
                 log_flush(self.logIO, f"- Action is valid after {j} retries")
                 action_valid = True
                 break
-            # Not valid, re-inference and get new action
+            # Not valid, take the next sample or re-inference and get new action
             print(f"   - Action is not valid: {todo_action}")
             log_flush(self.logIO, f"- Action is not valid: {todo_action}")
-            todo_action = self.get_next_action(retrieved_experiences)
+            if j == self.max_action_retries - 1:
+                # Out of retries, do not sample an action that would not be checked
+                break
+            if not todo_actions:
+                todo_actions = self.get_next_action_samples(retrieved_experiences, self.num_action_samples)
+            todo_action = todo_actions.pop(0)
             print(f"   - new todo action: {todo_action}")
             log_flush(self.logIO, f"- New todo action: {todo_action}")
         
@@ -443,8 +514,7 @@ class Explorer:
             self._mdp_store_experiences_with_probability(st, action, action_path, exp_id, st1_counts)
         
         # Deprecate all original conflict experiences
-        for exp_id in conflict_exp_ids:
-            self.exp_backend._deprecate_experience(exp_id)
+        self.exp_backend.bulk_deprecate(conflict_exp_ids)
         log_flush(self.logIO, f"---------------- Finished Resolve Experience Conflict ----------------")
 
     def remove_redundant_experiences(self):
@@ -453,11 +523,12 @@ class Explorer:
         redundant_experience_groups = self._detect_experience_redundancy()
         print(f"Redundant experience len: {len(redundant_experience_groups)}, groups: {redundant_experience_groups}")
         log_flush(self.logIO, f"Redundant experience len: {len(redundant_experience_groups)}, groups: {redundant_experience_groups}")
+        redundant_exp_ids = []
         for group in redundant_experience_groups:
             best_exp_id = self.exp_backend.get_most_optmized_path_exp_id(group)
             group.remove(best_exp_id)
-            for exp_id in group:
-                self.exp_backend._deprecate_experience(exp_id)
+            redundant_exp_ids.extend(group)
+        self.exp_backend.bulk_deprecate(redundant_exp_ids)
         log_flush(self.logIO, f"---------------- Finished Remove Redundant Experiences ----------------")
 
     def refine_experience(self):
@@ -571,3 +642,5 @@ class Explorer:
         else:
             log_flush(self.logIO, f"[POST-EXPLORE] Running redundancy removal only")
             self.remove_redundant_experiences()
+        # After the post-explore deprecations, so the flush on episode end covers them
+        self.exp_backend.finish_episode()
@@ -0,0 +1,207 @@
+from .base_explorer_model import BaseExplorerModel
+from .model_util import truncate_at_stop
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
+from config import api
+import asyncio
+import os
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Client-side rate limiter: requests_per_second on average, bursts of up to burst requests."""
+
+    def __init__(self, requests_per_second: float, burst: int = 1) -> None:
+        self.rate = requests_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        # Only used from the runtime's event loop, so no lock is needed
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Endpoint:
+    """Client (one pooled HTTP connection pool), concurrency limit and rate limiter of one base_url + api key."""
+
+    def __init__(self, base_url: str, api_key: str, timeout: float, max_concurrency: int, requests_per_second: float, burst: int) -> None:
+        # Retries are done by AsyncOpenAIExplorerModel, with jitter and the shared limits
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.rate_limiter = TokenBucket(requests_per_second, burst) if requests_per_second else None
+
+
+class _AsyncRuntime:
+    """
+    One event loop thread per process. Endpoints are shared by every model instance on it,
+    so episodes and Explorers of the same process draw from the same connection pool,
+    concurrency limit and rate limiter. The first model of an endpoint sets its limits.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> "_AsyncRuntime":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="async-openai", daemon=True)
+        self.thread.start()
+        self.endpoints = {}
+
+    def endpoint(self, base_url: str, api_key: str, **limits) -> _Endpoint:
+        # Called on the loop, the client and the semaphore belong to it
+        key = (base_url, api_key)
+        if key not in self.endpoints:
+            self.endpoints[key] = _Endpoint(base_url, api_key, **limits)
+        return self.endpoints[key]
+
+    def run(self, coro):
+        """Run a coroutine on the loop and wait for its result from a synchronous caller."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class AsyncOpenAIExplorerModel(BaseExplorerModel):
+    """
+    OpenAI-compatible explorer model on AsyncOpenAI.
+
+    The synchronous interface (get_next_action, get_next_action_samples, get_next_actions)
+    runs coroutines on a process-wide event loop, so it can be called from any thread;
+    asyncio callers use the a* coroutines directly. Every request has a timeout, 429 / 5xx /
+    timeouts / connection errors are retried with exponential backoff and full jitter
+    (honoring Retry-After). A request that still fails returns "" for every sample, like
+    OpenAIExplorerModel, so the Explorer treats it as an invalid action instead of crashing.
+    base_url defaults to config.api["base_url"], point it at a local server to test.
+    """
+
+    supports_concurrent_requests = True
+    supports_multiple_samples = True
+    sampling_params = {"temperature": 0.9, "top_p": 1.0}
+
+    def __init__(
+        self,
+        model_name: str,
+        max_new_tokens: int = 64,
+        base_url: str = None,
+        api_key: str = None,
+        timeout: float = 30.0,
+        max_attempts: int = 6,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        max_concurrency: int = 16,
+        requests_per_second: float = None,
+        burst: int = 4,
+    ) -> None:
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("Environment variable OPENAI_API_KEY is not set.")
+        self.model_name = model_name
+        self.max_new_tokens = max_new_tokens
+        self.base_url = base_url or api["base_url"]
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limits = {
+            "timeout": timeout,
+            "max_concurrency": max_concurrency,
+            "requests_per_second": requests_per_second,
+            "burst": burst,
+        }
+        self.runtime = _AsyncRuntime.get()
+
+    def digest_goal(self, goal: str) -> None:
+        pass
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        # APITimeoutError is an APIConnectionError
+        if isinstance(error, (RateLimitError, APIConnectionError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        """Full jitter over base * 2^attempt, at least the server's Retry-After, capped at backoff_max."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return min(delay, self.backoff_max)
+
+    async def _request(self, get_action_prompt: str, num_samples: int) -> list:
+        endpoint = self.runtime.endpoint(self.base_url, self.api_key, **self.limits)
+        for attempt in range(self.max_attempts):
+            async with endpoint.semaphore:
+                if endpoint.rate_limiter is not None:
+                    await endpoint.rate_limiter.acquire()
+                try:
+                    # gpt-3.5-turbo-instruct uses the Completions API, the chat models the Chat API
+                    if self.model_name == "gpt-3.5-turbo-instruct":
+                        response = await endpoint.client.completions.create(
+                            model=self.model_name,
+                            prompt=get_action_prompt,
+                            max_tokens=self.max_new_tokens,
+                            n=num_samples,
+                            timeout=self.timeout,
+                            **self.sampling_params,
+                        )
+                        return [choice.text for choice in response.choices]
+                    response = await endpoint.client.chat.completions.create(
+                        model=self.model_name,
+                        messages=[{"role": "user", "content": get_action_prompt}],
+                        max_tokens=self.max_new_tokens,
+                        n=num_samples,
+                        timeout=self.timeout,
+                        **self.sampling_params,
+                    )
+                    return [choice.message.content or "" for choice in response.choices]
+                except Exception as e:
+                    if not self.is_retryable(e) or attempt == self.max_attempts - 1:
+                        print(f"OpenAI API Error (attempt {attempt + 1}/{self.max_attempts}): {e}, giving up")
+                        return [""] * num_samples
+                    error = e
+            # Sleep outside the semaphore so other requests can use the slot
+            delay = self.backoff_delay(attempt, error)
+            print(f"OpenAI API Error (attempt {attempt + 1}/{self.max_attempts}): {error}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def aget_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        texts = await self._request(get_action_prompt, num_samples)
+        # Drop any explanation after the first line (a leading newline would make a server-side stop return "")
+        return [truncate_at_stop(text.strip().split('\n')[0].strip(), stop_pattern) for text in texts]
+
+    async def aget_next_actions(self, get_action_prompts: list, stop_pattern: str = None) -> list:
+        samples = await asyncio.gather(*[
+            self.aget_next_action_samples(get_action_prompt, 1, stop_pattern=stop_pattern)
+            for get_action_prompt in get_action_prompts
+        ])
+        return [actions[0] for actions in samples]
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
+        return self.get_next_action_samples(get_action_prompt, 1, stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        return self.runtime.run(self.aget_next_action_samples(get_action_prompt, num_samples, stop_pattern=stop_pattern))
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None) -> list:
+        """All prompts are requested concurrently, within the endpoint's limits."""
+        return self.runtime.run(self.aget_next_actions(get_action_prompts, stop_pattern=stop_pattern))
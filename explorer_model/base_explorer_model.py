@@ -1,3 +1,45 @@
 class BaseExplorerModel:
+    # Whether get_next_action() may be called from several threads at once (e.g. remote API clients)
+    supports_concurrent_requests = False
+    # Decoding parameters passed to generate() / the API (part of the response cache key)
+    sampling_params = {}
+    # Whether get_next_actions() runs the prompts as one batched generate() call
+    supports_batched_generation = False
+    # Whether get_next_action_samples() draws all samples in one call (num_return_sequences / n)
+    supports_multiple_samples = False
+    # Whether choose_action() can pick among discrete actions with one forward pass
+    supports_constrained_choice = False
+    # Whether score_candidates() can rank full action strings by their log-likelihood
+    supports_candidate_scoring = False
+
     def digest_goal(self, goal: str) -> None:
         pass
+
+    def register_prompt_prefix(self, prefix: str) -> None:
+        """Static prefix shared by the prompts of an env (see BaseEnvAdaptor.get_static_prompt_prefix); local models cache its KV."""
+        pass
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None) -> list:
+        """
+        Next action for each prompt; models that can batch override this.
+        stop_pattern (see BaseEnvAdaptor.get_action_stop_pattern) ends decoding at its first match.
+        """
+        return [self.get_next_action(get_action_prompt, stop_pattern=stop_pattern) for get_action_prompt in get_action_prompts]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        """num_samples independent responses to one prompt; models that can sample them in one call override this."""
+        return [self.get_next_action(get_action_prompt, stop_pattern=stop_pattern) for _ in range(num_samples)]
+
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        """
+        Pick one of the choices (action strings) from the logits of a single forward pass,
+        sampling or argmax. Returns None when the model cannot do it for these choices.
+        """
+        return None
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        """
+        Mean per-token log-likelihood of each candidate action string as the continuation of
+        the prompt, in the order of candidates. Returns None when the model cannot score them.
+        """
+        return None
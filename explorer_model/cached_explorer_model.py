@@ -0,0 +1,251 @@
+from .base_explorer_model import BaseExplorerModel
+from collections import OrderedDict
+import atexit
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+
+# Caches with responses not written yet are saved when the process exits. Weak references:
+# a wrapper that is dropped can be freed instead of being kept alive (and saved) until exit.
+_open_caches = weakref.WeakSet()
+
+
+def _save_open_caches() -> None:
+    for cache in list(_open_caches):
+        cache.save()
+
+
+atexit.register(_save_open_caches)
+
+
+class CachedExplorerModel(BaseExplorerModel):
+    """
+    Disk-backed response cache around an explorer model's get_next_action().
+
+    Responses are keyed by (model, prompt hash, sampling params, max_new_tokens, seed) and
+    every key keeps the list of responses in the order they were generated:
+    - "replay": the k-th call with a prompt in this run returns the k-th recorded response
+      and only calls the model past the end of the record, so a rerun with the same
+      prompts reproduces the original run.
+    - "rotate": the first num_samples calls with a prompt sample the model, later calls
+      cycle through the recorded samples.
+    The cache holds at most max_entries keys, the least recently used are evicted.
+    Empty responses, which the models return for failed calls, are never recorded.
+    The seed only separates caches, it does not seed the model.
+    """
+
+    def __init__(self, model: BaseExplorerModel, cache_path: str, mode: str = "replay", num_samples: int = 1, max_entries: int = None, seed: int = 0, save_every: int = 50) -> None:
+        if mode not in ["replay", "rotate"]:
+            raise NotImplementedError(f"LLM cache mode {mode} is not supported.")
+        self.model = model
+        self.cache_path = cache_path
+        self.mode = mode
+        self.num_samples = max(1, num_samples)
+        self.max_entries = max_entries
+        self.seed = seed
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        # key -> recorded responses, in LRU order
+        self.entries = OrderedDict()
+        # key -> number of calls in this run
+        self._calls = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as file:
+                self.entries = OrderedDict(json.load(file))
+        self._key_prefix = json.dumps({
+            "model": self.model_identity(model),
+            "sampling_params": getattr(model, "sampling_params", {}),
+            "max_new_tokens": getattr(model, "max_new_tokens", None),
+            "seed": seed,
+        }, sort_keys=True)
+        _open_caches.add(self)
+
+    @staticmethod
+    def model_identity(model) -> str:
+        model_name = getattr(model, "model_name", None)
+        if model_name is None:
+            # HF models: the path passed to from_pretrained
+            model_name = getattr(getattr(model, "model", None), "name_or_path", None)
+        return model_name or type(model).__name__
+
+    @property
+    def model_name(self) -> str:
+        return self.model_identity(self.model)
+
+    @property
+    def supports_concurrent_requests(self) -> bool:
+        return getattr(self.model, "supports_concurrent_requests", False)
+
+    @property
+    def sampling_params(self) -> dict:
+        return getattr(self.model, "sampling_params", {})
+
+    def __getattr__(self, name):
+        # model_name, tokenizer, max_new_tokens, ... of the wrapped model
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def digest_goal(self, goal: str) -> None:
+        self.model.digest_goal(goal)
+
+    def register_prompt_prefix(self, prefix: str) -> None:
+        self.model.register_prompt_prefix(prefix)
+
+    def _key(self, prompt: str, stop_pattern: str = None) -> str:
+        if stop_pattern is not None:
+            prompt = f"{prompt}\x00stop:{stop_pattern}"
+        return hashlib.blake2b(f"{self._key_prefix}\n{prompt}".encode("utf-8"), digest_size=16).hexdigest()
+
+    @property
+    def supports_batched_generation(self) -> bool:
+        return getattr(self.model, "supports_batched_generation", False)
+
+    def _lookup(self, key: str):
+        """Cached response for the next call with this key, or None (caller holds the lock)."""
+        call_index = self._calls.get(key, 0)
+        self._calls[key] = call_index + 1
+        responses = self.entries.get(key)
+        if responses is not None:
+            self.entries.move_to_end(key)
+            if call_index < len(responses):
+                self.hits += 1
+                return responses[call_index]
+            if self.mode == "rotate" and len(responses) >= self.num_samples:
+                self.hits += 1
+                return responses[call_index % len(responses)]
+        self.misses += 1
+        return None
+
+    def _record(self, key: str, response: str) -> None:
+        """Append a generated response (caller holds the lock)."""
+        # "" is what a failed call returns (e.g. OpenAIExplorerModel on an API error), replaying it would replay the outage
+        if isinstance(response, str) and not response.strip():
+            return
+        responses = self.entries.setdefault(key, [])
+        self.entries.move_to_end(key)
+        responses.append(response)
+        while self.max_entries is not None and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._unsaved += 1
+
+    def _maybe_save(self) -> None:
+        if self.save_every is not None and self._unsaved >= self.save_every:
+            self.save()
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
+        key = self._key(get_action_prompt, stop_pattern)
+        with self._lock:
+            response = self._lookup(key)
+        if response is not None:
+            return response
+
+        response = self.model.get_next_action(get_action_prompt, stop_pattern=stop_pattern)
+
+        with self._lock:
+            self._record(key, response)
+        self._maybe_save()
+        return response
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        """Each sample counts as one call with the prompt, the misses are sampled by the wrapped model in one call."""
+        key = self._key(get_action_prompt, stop_pattern)
+        with self._lock:
+            responses = [self._lookup(key) for _ in range(num_samples)]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            generated = self.model.get_next_action_samples(get_action_prompt, len(missing), stop_pattern=stop_pattern)
+            with self._lock:
+                for i, response in zip(missing, generated):
+                    self._record(key, response)
+                    responses[i] = response
+            self._maybe_save()
+        # A failed request may return fewer samples than asked for
+        return [response for response in responses if response is not None]
+
+    @property
+    def supports_multiple_samples(self) -> bool:
+        return getattr(self.model, "supports_multiple_samples", False)
+
+    @property
+    def supports_constrained_choice(self) -> bool:
+        return getattr(self.model, "supports_constrained_choice", False)
+
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        key = self._key(f"{get_action_prompt}\x00choose:{sample}:{json.dumps(choices)}")
+        with self._lock:
+            response = self._lookup(key)
+        if response is not None:
+            return response
+
+        response = self.model.choose_action(get_action_prompt, choices, sample=sample)
+        # None means unsupported, the caller falls back to get_next_action()
+        if response is not None:
+            with self._lock:
+                self._record(key, response)
+            self._maybe_save()
+        return response
+
+    @property
+    def supports_candidate_scoring(self) -> bool:
+        return getattr(self.model, "supports_candidate_scoring", False)
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        key = self._key(f"{get_action_prompt}\x00score:{json.dumps(candidates)}")
+        with self._lock:
+            scores = self._lookup(key)
+        if scores is not None:
+            return scores
+
+        scores = self.model.score_candidates(get_action_prompt, candidates)
+        if scores is not None:
+            with self._lock:
+                self._record(key, scores)
+            self._maybe_save()
+        return scores
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None) -> list:
+        """Cached responses where available, the misses go to the wrapped model as one batch."""
+        keys = [self._key(get_action_prompt, stop_pattern) for get_action_prompt in get_action_prompts]
+        with self._lock:
+            responses = [self._lookup(key) for key in keys]
+        missing = [i for i, response in enumerate(responses) if response is None]
+        if missing:
+            generated = self.model.get_next_actions([get_action_prompts[i] for i in missing], stop_pattern=stop_pattern)
+            with self._lock:
+                for i, response in zip(missing, generated):
+                    self._record(keys[i], response)
+                    responses[i] = response
+            self._maybe_save()
+        return responses
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def save(self) -> None:
+        """Write the cache atomically (temp file + rename)."""
+        with self._lock:
+            if self._unsaved == 0:
+                return
+            cache_dir = os.path.dirname(self.cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(list(self.entries.items()), file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.cache_path)
+            self._unsaved = 0
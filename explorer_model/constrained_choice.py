@@ -0,0 +1,119 @@
+import copy
+import torch
+
+
+def choice_token_ids(tokenizer, prompt: str, prompt_ids: list, choices: list):
+    """
+    First token the model would emit for each choice right after the prompt, or None when the
+    choices cannot be told apart by one token (multi-token prefixes shared, tokenizer merges
+    across the prompt boundary, ...).
+    """
+    token_ids = []
+    for choice in choices:
+        full_ids = tokenizer(prompt + choice).input_ids
+        if len(full_ids) <= len(prompt_ids) or full_ids[:len(prompt_ids)] != prompt_ids:
+            return None
+        token_ids.append(full_ids[len(prompt_ids)])
+    if len(set(token_ids)) != len(token_ids):
+        return None
+    return token_ids
+
+
+def choose_among(model, tokenizer, prompt: str, choices: list, sample: bool, temperature: float = 1.0, prefix_cache=None):
+    """
+    Pick one of the choices with a single forward pass over the prompt: the logits of the
+    choices' first tokens are compared, then sampled (softmax with temperature) or argmaxed.
+    Returns the chosen choice string, or None when the choices are not single-token separable.
+    """
+    model_inputs = tokenizer([prompt], return_tensors="pt").to(model.device)
+    token_ids = choice_token_ids(tokenizer, prompt, model_inputs.input_ids[0].tolist(), choices)
+    if token_ids is None:
+        return None
+
+    forward_kwargs = {}
+    input_ids = model_inputs.input_ids
+    if prefix_cache is not None:
+        forward_kwargs = prefix_cache.generate_kwargs([prompt], input_ids)
+        if "past_key_values" in forward_kwargs:
+            # Unlike generate(), forward() only takes the tokens after the cached prefix
+            input_ids = input_ids[:, forward_kwargs["past_key_values"].get_seq_length():]
+
+    with torch.no_grad():
+        logits = model(input_ids=input_ids, attention_mask=model_inputs.attention_mask, **forward_kwargs).logits[0, -1]
+
+    choice_logits = logits[token_ids].float()
+    if sample:
+        probs = torch.softmax(choice_logits / max(temperature, 1e-5), dim=-1)
+        index = int(torch.multinomial(probs, 1).item())
+    else:
+        index = int(torch.argmax(choice_logits).item())
+    return choices[index]
+
+
+def _common_prefix_length(a: list, b: list) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def score_continuations(model, tokenizer, prompt: str, continuations: list, prefix_cache=None, batch_size: int = 16):
+    """
+    Length-normalized log-likelihood of each continuation given the prompt: the mean log-prob
+    of its tokens, so short generic candidates are not favored over long specific ones.
+
+    Each batch holds the rows prompt + continuation, right padded, so one forward pass scores
+    up to batch_size candidates. When the prompt starts with a cached static prefix, the prefix
+    KV is repeated over the batch and only the tokens after it are fed.
+    """
+    prompt_ids = tokenizer(prompt).input_ids
+    rows = []
+    for continuation in continuations:
+        full_ids = tokenizer(prompt + continuation).input_ids
+        # The continuation starts where the tokens stop matching the prompt's own tokenization
+        start = min(_common_prefix_length(full_ids, prompt_ids), len(prompt_ids))
+        rows.append((full_ids, max(start, 1)))
+
+    prefix_length = 0
+    prefix_past = None
+    if prefix_cache is not None:
+        prompt_tensor = torch.tensor([prompt_ids], device=model.device)
+        prefix_past = prefix_cache.generate_kwargs([prompt], prompt_tensor).get("past_key_values")
+        if prefix_past is not None:
+            prefix_length = prefix_past.get_seq_length()
+            # Every row has to score at least its first continuation token after the prefix
+            if any(start <= prefix_length for _, start in rows) or not hasattr(prefix_past, "batch_repeat_interleave"):
+                prefix_past, prefix_length = None, 0
+
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    scores = []
+    for batch_start in range(0, len(rows), batch_size):
+        batch_rows = rows[batch_start:batch_start + batch_size]
+        max_length = max(len(full_ids) for full_ids, _ in batch_rows)
+        input_ids = torch.full((len(batch_rows), max_length - prefix_length), pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_rows), max_length), dtype=torch.long)
+        for row, (full_ids, _) in enumerate(batch_rows):
+            input_ids[row, :len(full_ids) - prefix_length] = torch.tensor(full_ids[prefix_length:])
+            attention_mask[row, :len(full_ids)] = 1
+
+        forward_kwargs = {}
+        if prefix_past is not None:
+            past_key_values = copy.deepcopy(prefix_past)
+            past_key_values.batch_repeat_interleave(len(batch_rows))
+            forward_kwargs["past_key_values"] = past_key_values
+        with torch.no_grad():
+            logits = model(
+                input_ids=input_ids.to(model.device),
+                attention_mask=attention_mask.to(model.device),
+                **forward_kwargs,
+            ).logits
+        log_probs = torch.log_softmax(logits.float(), dim=-1)
+
+        for row, (full_ids, start) in enumerate(batch_rows):
+            # Token t is predicted by the logits at position t - 1 (positions are offset by the prefix)
+            positions = torch.arange(start - 1, len(full_ids) - 1, device=log_probs.device) - prefix_length
+            targets = torch.tensor(full_ids[start:], device=log_probs.device)
+            scores.append(float(log_probs[row, positions, targets].mean().item()))
+    return scores
@@ -1,6 +1,9 @@
 from .base_explorer_model import BaseExplorerModel
+from .constrained_choice import choose_among, score_continuations
+from .prefix_cache import PrefixKVCache
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from .model_util import extract_internlm_response
+from .model_util import extract_internlm_response, trim_generated_ids, truncate_at_stop
+from .stopping import stopping_kwargs
 import torch
 
 # InternLM3 remote code expects transformers.utils.LossKwargs (a TypedDict).
@@ -18,6 +21,12 @@ except ImportError:  # pragma: no cover
     _tf_utils.LossKwargs = LossKwargs
 
 class InternLMExplorerModel(BaseExplorerModel):
+    supports_batched_generation = True
+    supports_multiple_samples = True
+    supports_constrained_choice = True
+    supports_candidate_scoring = True
+    sampling_params = {"do_sample": True, "temperature": 0.8, "top_p": 0.95}  # 稍微降低温度以保证动作生成的稳定性
+
     def __init__(self, model_path: str, max_new_tokens: int = 64):
         """
         初始化 InternLM Explorer Model。
@@ -33,42 +42,77 @@ class InternLMExplorerModel(BaseExplorerModel):
             model_path, 
             trust_remote_code=True
         )
+        if self.tokenizer.pad_token_id is None and self.tokenizer.eos_token_id is not None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+        # 批量生成时在左侧 padding，保证每行都紧接着自己的 prompt 生成
+        self.tokenizer.padding_side = "left"
         self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PrefixKVCache(self.model, self.tokenizer)
 
     def digest_goal(self, goal: str) -> None:
         pass
 
-    def get_next_action(self, get_action_prompt: str) -> str:
+    def register_prompt_prefix(self, prefix: str) -> None:
+        self.prefix_cache.register(prefix)
+
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        return choose_among(
+            self.model,
+            self.tokenizer,
+            get_action_prompt,
+            choices,
+            sample,
+            temperature=self.sampling_params.get("temperature", 1.0),
+            prefix_cache=self.prefix_cache,
+        )
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        return score_continuations(self.model, self.tokenizer, get_action_prompt, candidates, prefix_cache=self.prefix_cache)
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
         """
         获取下一个动作。
         get_action_prompt 应该已经是构造好的 ChatML 格式，以 <|im_start|>assistant 结尾。
         """
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern, num_samples=num_samples)
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None, num_samples: int = 1) -> list:
+        """一次 generate() 批量生成多个 prompt 的下一个动作"""
         model_inputs = self.tokenizer(
-            [get_action_prompt],
+            list(get_action_prompts),
             return_tensors="pt",
+            padding=True,
         ).to(self.model.device)
 
         with torch.no_grad():
             generated_ids = self.model.generate(
                 **model_inputs,
                 max_new_tokens=self.max_new_tokens,
+                num_return_sequences=num_samples,
                 eos_token_id=self.tokenizer.eos_token_id,
                 pad_token_id=self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id,
-                do_sample=True,
-                temperature=0.8, # 稍微降低温度以保证动作生成的稳定性
-                top_p=0.95,
+                **self.sampling_params,
+                **stopping_kwargs(self.tokenizer, model_inputs.input_ids.shape[1], stop_pattern),
+                **self.prefix_cache.generate_kwargs(get_action_prompts, model_inputs.input_ids, num_return_sequences=num_samples),
             )
 
-        # 去除 prompt 部分的 token
+        # 去除 prompt 部分的 token（左侧 padding，所有 prompt 结束位置相同）以及每行 EOS（或命中 stop pattern）之后的 padding
+        prompt_length = model_inputs.input_ids.shape[1]
         generated_ids = [
-            output_ids[len(input_ids):]
-            for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
+            trim_generated_ids(output_ids[prompt_length:].tolist(), [self.tokenizer.eos_token_id, self.tokenizer.pad_token_id])
+            for output_ids in generated_ids
         ]
         
         # 解码回复，保留特殊 token 以便后续提取函数能定位
-        response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=False)[0]
+        responses = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=False)
 
         # 拼接完整的文本用于提取
-        full_text = get_action_prompt + response
-        action = extract_internlm_response(full_text)
-        return action
\ No newline at end of file
+        # generate() 为每个 prompt 返回 num_samples 行，按 prompt 顺序排列
+        sample_prompts = [get_action_prompt for get_action_prompt in get_action_prompts for _ in range(num_samples)]
+        return [
+            truncate_at_stop(extract_internlm_response(get_action_prompt + response), stop_pattern)
+            for get_action_prompt, response in zip(sample_prompts, responses)
+        ]
@@ -1,12 +1,21 @@
 from .base_explorer_model import BaseExplorerModel
+from .constrained_choice import choose_among, score_continuations
+from .prefix_cache import PrefixKVCache
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from .model_util import extract_llama3_assistant_response
+from .model_util import extract_llama3_assistant_response, trim_generated_ids, truncate_at_stop
+from .stopping import stopping_kwargs
 import torch
 
 
 LLAMA3_WEBSHOP_SYSTEM_PROMPT = "You are an intelligent exploration agent that navigates through environments to accomplish tasks. Your goal is to analyze the current state, understand the task instruction, and determine the next action to take. Respond with only the action you want to execute, without any additional explanation or formatting."
 
 class Llama3ExplorerModel(BaseExplorerModel):
+    supports_batched_generation = True
+    supports_multiple_samples = True
+    supports_constrained_choice = True
+    supports_candidate_scoring = True
+    sampling_params = {"do_sample": True, "temperature": 0.9, "top_p": 0.95, "num_beams": 1}
+
     def __init__(self, model_path: str, max_new_tokens: int = 64):
         # NOTE:
         # - Using pipeline() will default to moving the entire model onto a single CUDA device,
@@ -21,39 +30,70 @@ class Llama3ExplorerModel(BaseExplorerModel):
         # Some Llama checkpoints do not define a pad token; fall back to EOS.
         if self.tokenizer.pad_token_id is None and self.tokenizer.eos_token_id is not None:
             self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+        # Batched prompts are padded on the left so every row continues right after its prompt
+        self.tokenizer.padding_side = "left"
         self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PrefixKVCache(self.model, self.tokenizer)
         
 
     def digest_goal(self, goal: str) -> None:
         pass
+
+    def register_prompt_prefix(self, prefix: str) -> None:
+        self.prefix_cache.register(prefix)
     
-    def get_next_action(self, get_action_prompt: str) -> str:
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        return choose_among(
+            self.model,
+            self.tokenizer,
+            get_action_prompt,
+            choices,
+            sample,
+            temperature=self.sampling_params.get("temperature", 1.0),
+            prefix_cache=self.prefix_cache,
+        )
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        return score_continuations(self.model, self.tokenizer, get_action_prompt, candidates, prefix_cache=self.prefix_cache)
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern, num_samples=num_samples)
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None, num_samples: int = 1) -> list:
         model_inputs = self.tokenizer(
-            [get_action_prompt],
+            list(get_action_prompts),
             return_tensors="pt",
+            padding=True,
         ).to(self.model.device)
 
         with torch.no_grad():
             generated_ids = self.model.generate(
                 **model_inputs,
                 max_new_tokens=self.max_new_tokens,
+                num_return_sequences=num_samples,
                 eos_token_id=self.tokenizer.eos_token_id,
                 pad_token_id=self.tokenizer.pad_token_id,
-                do_sample=True,
-                temperature=0.9,
-                top_p=0.95,
-                num_beams=1,
+                **self.sampling_params,
+                **stopping_kwargs(self.tokenizer, model_inputs.input_ids.shape[1], stop_pattern),
+                **self.prefix_cache.generate_kwargs(get_action_prompts, model_inputs.input_ids, num_return_sequences=num_samples),
             )
 
-        # Strip the prompt tokens
+        # Strip the prompt tokens (left padded, so every prompt ends at the same position)
+        # and the padding after each row's EOS or stop pattern
+        prompt_length = model_inputs.input_ids.shape[1]
         generated_ids = [
-            output_ids[len(input_ids):]
-            for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
+            trim_generated_ids(output_ids[prompt_length:].tolist(), [self.tokenizer.eos_token_id, self.tokenizer.pad_token_id])
+            for output_ids in generated_ids
         ]
-        response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=False)[0]
+        responses = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=False)
 
         # Keep the same behavior as pipeline(): generated_text = prompt + completion.
-        full_text = get_action_prompt + response
-        action = extract_llama3_assistant_response(full_text)
-        return action
-        
\ No newline at end of file
+        # generate() returns num_samples rows per prompt, in prompt order
+        sample_prompts = [get_action_prompt for get_action_prompt in get_action_prompts for _ in range(num_samples)]
+        return [
+            truncate_at_stop(extract_llama3_assistant_response(get_action_prompt + response), stop_pattern)
+            for get_action_prompt, response in zip(sample_prompts, responses)
+        ]
@@ -1,9 +1,18 @@
 from .base_explorer_model import BaseExplorerModel
+from .constrained_choice import choose_among, score_continuations
+from .prefix_cache import PrefixKVCache
 from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
-from .model_util import extract_mistral_response
+from .model_util import extract_mistral_response, trim_generated_ids, truncate_at_stop
+from .stopping import stopping_kwargs
 import torch
 
 class MistralExplorerModel(BaseExplorerModel):
+    supports_batched_generation = True
+    supports_multiple_samples = True
+    supports_constrained_choice = True
+    supports_candidate_scoring = True
+    sampling_params = {"do_sample": True, "temperature": 0.7, "top_p": 0.95}  # Mistral models often prefer slightly lower temperature
+
     def __init__(self, model_path: str, max_new_tokens: int = 128):
         # Some Mistral weights (model_type="mistral3") are not wired into AutoModelForCausalLM
         # in certain transformers versions, so we special-case them.
@@ -40,42 +49,84 @@ class MistralExplorerModel(BaseExplorerModel):
         # Ensure pad token is set
         if self.tokenizer.pad_token_id is None:
             self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+        # Batched prompts are padded on the left so every row continues right after its prompt
+        self.tokenizer.padding_side = "left"
             
         self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PrefixKVCache(self.model, self.tokenizer)
 
     def digest_goal(self, goal: str) -> None:
         pass
+
+    def register_prompt_prefix(self, prefix: str) -> None:
+        self.prefix_cache.register(prefix)
     
-    def get_next_action(self, get_action_prompt: str) -> str:
-        # Tokenize the prompt
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        return choose_among(
+            self.model,
+            self.tokenizer,
+            get_action_prompt,
+            choices,
+            sample,
+            temperature=self.sampling_params.get("temperature", 1.0),
+            prefix_cache=self.prefix_cache,
+        )
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        return score_continuations(self.model, self.tokenizer, get_action_prompt, candidates, prefix_cache=self.prefix_cache)
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern, num_samples=num_samples)
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None, num_samples: int = 1) -> list:
+        # Tokenize the prompts
         model_inputs = self.tokenizer(
-            [get_action_prompt],
+            list(get_action_prompts),
             return_tensors="pt",
+            padding=True,
         ).to(self.model.device)
 
         with torch.no_grad():
             generated_ids = self.model.generate(
                 **model_inputs,
                 max_new_tokens=self.max_new_tokens,
+                num_return_sequences=num_samples,
                 pad_token_id=self.tokenizer.pad_token_id,
-                do_sample=True,
-                temperature=0.7, # Mistral models often prefer slightly lower temperature
-                top_p=0.95,
+                **self.sampling_params,
+                **stopping_kwargs(self.tokenizer, model_inputs.input_ids.shape[1], stop_pattern),
+                **self.prefix_cache.generate_kwargs(get_action_prompts, model_inputs.input_ids, num_return_sequences=num_samples),
             )
 
-        # Some implementations return full sequences (prompt + continuation) while others may return
-        # only the continuation. Only strip the prompt when it is an exact prefix of the output.
-        input_ids = model_inputs.input_ids[0]
-        output_ids = generated_ids[0]
-        if output_ids.shape[0] >= input_ids.shape[0] and torch.equal(output_ids[: input_ids.shape[0]], input_ids):
-            new_token_ids = output_ids[input_ids.shape[0] :]
-        else:
-            new_token_ids = output_ids
+        # No eos_token_id is passed, generate() stops on the generation config's EOS
+        stop_token_ids = self.model.generation_config.eos_token_id
+        if stop_token_ids is None:
+            stop_token_ids = self.tokenizer.eos_token_id
+        if isinstance(stop_token_ids, int):
+            stop_token_ids = [stop_token_ids]
+        # Rows stopped by a stop pattern are padded without an EOS
+        stop_token_ids = list(stop_token_ids) + [self.tokenizer.pad_token_id]
+
+        # generate() returns num_samples rows per prompt, in prompt order
+        sample_prompts = [get_action_prompt for get_action_prompt in get_action_prompts for _ in range(num_samples)]
+        sample_input_ids = model_inputs.input_ids.repeat_interleave(num_samples, dim=0)
+        actions = []
+        for get_action_prompt, input_ids, output_ids in zip(sample_prompts, sample_input_ids, generated_ids):
+            # Some implementations return full sequences (prompt + continuation) while others may return
+            # only the continuation. Only strip the prompt when it is an exact prefix of the output.
+            if output_ids.shape[0] >= input_ids.shape[0] and torch.equal(output_ids[: input_ids.shape[0]], input_ids):
+                new_token_ids = output_ids[input_ids.shape[0] :]
+            else:
+                new_token_ids = output_ids
+            # Drop the padding after this row's EOS
+            new_token_ids = trim_generated_ids(new_token_ids.tolist(), stop_token_ids)
 
-        # Decode the continuation (keeping special tokens to handle cleanup in utility function)
-        response = self.tokenizer.decode(new_token_ids, skip_special_tokens=False)
+            # Decode the continuation (keeping special tokens to handle cleanup in utility function)
+            response = self.tokenizer.decode(new_token_ids, skip_special_tokens=False)
 
-        # Combine to form full text for consistency with extraction logic
-        full_text = get_action_prompt + response
-        action = extract_mistral_response(full_text)
-        return action
\ No newline at end of file
+            # Combine to form full text for consistency with extraction logic
+            full_text = get_action_prompt + response
+            actions.append(truncate_at_stop(extract_mistral_response(full_text), stop_pattern))
+        return actions
@@ -1,3 +1,30 @@
+import re
+
+
+def trim_generated_ids(token_ids, stop_token_ids) -> list:
+    """
+    Cut one row of a batched generate() output after its first stop token (inclusive).
+    Rows that finish early are padded until the longest row is done; this drops that
+    padding so every row decodes exactly like a batch-size-1 generation.
+    """
+    if isinstance(stop_token_ids, int):
+        stop_token_ids = [stop_token_ids]
+    stop_token_ids = set(token_id for token_id in stop_token_ids if token_id is not None)
+    token_ids = list(token_ids)
+    for index, token_id in enumerate(token_ids):
+        if token_id in stop_token_ids:
+            return token_ids[:index + 1]
+    return token_ids
+
+def truncate_at_stop(response: str, stop_pattern: str = None) -> str:
+    """Cut a response right after the first match of stop_pattern (the token that matched may carry trailing text)."""
+    if stop_pattern is None:
+        return response
+    match = re.search(stop_pattern, response)
+    if match is None:
+        return response
+    return response[:match.end()]
+
 def extract_llama3_assistant_response(full_text):
     assistant_marker = "<|start_header_id|>assistant<|end_header_id|>"
     if assistant_marker not in full_text:
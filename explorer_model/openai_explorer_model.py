@@ -1,10 +1,15 @@
 from .base_explorer_model import BaseExplorerModel
+from .model_util import truncate_at_stop
 from openai import OpenAI
 import os
 from config import api
 
 
 class OpenAIExplorerModel(BaseExplorerModel):
+    supports_concurrent_requests = True
+    supports_multiple_samples = True
+    sampling_params = {"temperature": 0.9, "top_p": 1.0}
+
     def __init__(self, model_name, max_new_tokens: int = 64):
         """
         初始化 OpenAI 模型。
@@ -22,7 +27,11 @@ class OpenAIExplorerModel(BaseExplorerModel):
     def digest_goal(self, goal: str) -> None:
         pass
 
-    def get_next_action(self, get_action_prompt: str) -> str:
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
+        return self.get_next_action_samples(get_action_prompt, 1, stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        """一次请求用 n 返回 num_samples 个独立采样（prompt 只计费一次）"""
         try:
             # 针对 gpt-3.5-turbo-instruct 使用 Completions API
             if self.model_name == "gpt-3.5-turbo-instruct":
@@ -30,10 +39,10 @@ class OpenAIExplorerModel(BaseExplorerModel):
                     model=self.model_name,
                     prompt=get_action_prompt, # 直接传入拼接好的字符串
                     max_tokens=self.max_new_tokens,
-                    temperature=0.9,
-                    top_p=1.0,
+                    n=num_samples,
+                    **self.sampling_params,
                 )
-                action = response.choices[0].text.strip()
+                actions = [choice.text.strip() for choice in response.choices]
             
             # 针对其他 Chat 模型 (GPT-4o, GPT-3.5-turbo 等) 使用 Chat API
             else:
@@ -43,17 +52,17 @@ class OpenAIExplorerModel(BaseExplorerModel):
                         {"role": "user", "content": get_action_prompt}
                     ],
                     max_tokens=self.max_new_tokens,
-                    temperature=0.9,
-                    top_p=1.0,
+                    n=num_samples,
+                    **self.sampling_params,
                 )
-                action = response.choices[0].message.content.strip()
+                actions = [(choice.message.content or "").strip() for choice in response.choices]
 
             # 清理动作文本（防止模型输出换行后的解释）
-            if '\n' in action:
-                 action = action.split('\n')[0]
+            actions = [action.split('\n')[0] for action in actions]
             
-            return action.strip()
+            # 不在服务端用 stop=["\n"]：模型常以换行开头，那样会得到空动作；strip 之后再在客户端截断
+            return [truncate_at_stop(action.strip(), stop_pattern) for action in actions]
             
         except Exception as e:
             print(f"OpenAI API Error: {e}")
-            return ""
\ No newline at end of file
+            return [""]
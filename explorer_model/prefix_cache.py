@@ -0,0 +1,66 @@
+from transformers import DynamicCache
+import copy
+import torch
+
+
+class PrefixKVCache:
+    """
+    past_key_values of the static prompt prefixes of one HF model (e.g. the env system prompt
+    wrapped by format_full_*_prompt), so generate() only prefills the dynamic part of a prompt.
+
+    Prefixes are registered as strings and encoded on first use. A prompt reuses a prefix
+    only when its token ids start with the prefix's token ids (the tokenizer may merge
+    tokens across the boundary, then the prompt is encoded in full as before).
+    Each call gets a copy of the cache, generate() extends the cache it is given.
+    """
+
+    def __init__(self, model, tokenizer, max_prefixes: int = 8) -> None:
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_prefixes = max_prefixes
+        self.prefixes = []
+        # prefix -> (prefix input ids, past_key_values), None when the prefix cannot be cached
+        self._entries = {}
+
+    def register(self, prefix: str) -> None:
+        if not prefix or prefix in self.prefixes:
+            return
+        self.prefixes.append(prefix)
+        if len(self.prefixes) > self.max_prefixes:
+            self._entries.pop(self.prefixes.pop(0), None)
+
+    def _build(self, prefix: str):
+        prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+        try:
+            with torch.no_grad():
+                past_key_values = self.model(input_ids=prefix_ids, past_key_values=DynamicCache(), use_cache=True).past_key_values
+        except Exception:
+            # Not cacheable (e.g. the model rejects an explicit cache): prompts with this prefix are encoded in full
+            return None
+        return prefix_ids[0], past_key_values
+
+    def generate_kwargs(self, prompts: list, input_ids, num_return_sequences: int = 1) -> dict:
+        """{"past_key_values": copy of the prefix cache} for a single prompt starting with a registered prefix, else {}."""
+        # Left padded batches do not share the prefix positions
+        if len(prompts) != 1:
+            return {}
+        for prefix in sorted(self.prefixes, key=len, reverse=True):
+            if not prompts[0].startswith(prefix):
+                continue
+            if prefix not in self._entries:
+                self._entries[prefix] = self._build(prefix)
+            entry = self._entries[prefix]
+            if entry is None:
+                continue
+            prefix_ids, past_key_values = entry
+            prefix_length = prefix_ids.shape[0]
+            # At least one token has to be left for generate() to prefill
+            if input_ids.shape[1] > prefix_length and torch.equal(input_ids[0, :prefix_length], prefix_ids):
+                past_key_values = copy.deepcopy(past_key_values)
+                if num_return_sequences > 1:
+                    # generate() expands input_ids over num_return_sequences but not a given cache
+                    if not hasattr(past_key_values, "batch_repeat_interleave"):
+                        return {}
+                    past_key_values.batch_repeat_interleave(num_return_sequences)
+                return {"past_key_values": past_key_values}
+        return {}
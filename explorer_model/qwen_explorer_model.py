@@ -1,5 +1,9 @@
 from .base_explorer_model import BaseExplorerModel
+from .constrained_choice import choose_among, score_continuations
+from .prefix_cache import PrefixKVCache
 from transformers import AutoModelForCausalLM, AutoTokenizer
+from .model_util import trim_generated_ids, truncate_at_stop
+from .stopping import stopping_kwargs
 
 
 def _extract_qwen_assistant_response(full_text: str) -> str:
@@ -46,6 +50,12 @@ def _extract_qwen_assistant_response(full_text: str) -> str:
 
 
 class QwenExplorerModel(BaseExplorerModel):
+    supports_batched_generation = True
+    supports_multiple_samples = True
+    supports_constrained_choice = True
+    supports_candidate_scoring = True
+    sampling_params = {"do_sample": True, "num_beams": 1, "temperature": 0.9, "top_p": 0.95}
+
     def __init__(self, model_path: str, max_new_tokens: int = 64):
         self.model = AutoModelForCausalLM.from_pretrained(
             model_path,
@@ -53,19 +63,49 @@ class QwenExplorerModel(BaseExplorerModel):
             device_map="auto"
         )
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        if self.tokenizer.pad_token_id is None and self.tokenizer.eos_token_id is not None:
+            self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+        # Batched prompts are padded on the left so every row continues right after its prompt
+        self.tokenizer.padding_side = "left"
         self.max_new_tokens = max_new_tokens
+        self.prefix_cache = PrefixKVCache(self.model, self.tokenizer)
 
     def digest_goal(self, goal: str) -> None:
         pass
 
-    def get_next_action(self, get_action_prompt: str) -> str:
+    def register_prompt_prefix(self, prefix: str) -> None:
+        self.prefix_cache.register(prefix)
+
+    def choose_action(self, get_action_prompt: str, choices: list, sample: bool = True):
+        return choose_among(
+            self.model,
+            self.tokenizer,
+            get_action_prompt,
+            choices,
+            sample,
+            temperature=self.sampling_params.get("temperature", 1.0),
+            prefix_cache=self.prefix_cache,
+        )
+
+    def score_candidates(self, get_action_prompt: str, candidates: list):
+        return score_continuations(self.model, self.tokenizer, get_action_prompt, candidates, prefix_cache=self.prefix_cache)
+
+    def get_next_action(self, get_action_prompt: str, stop_pattern: str = None) -> str:
         """
         Generate next action using Qwen chat template style prompt.
         The prompt should already be in ChatML format ending with <|im_start|>assistant.
         """
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern)[0]
+
+    def get_next_action_samples(self, get_action_prompt: str, num_samples: int, stop_pattern: str = None) -> list:
+        return self.get_next_actions([get_action_prompt], stop_pattern=stop_pattern, num_samples=num_samples)
+
+    def get_next_actions(self, get_action_prompts: list, stop_pattern: str = None, num_samples: int = 1) -> list:
+        """Generate the next action of several prompts in one batched generate() call."""
         model_inputs = self.tokenizer(
-            [get_action_prompt],
-            return_tensors="pt"
+            list(get_action_prompts),
+            return_tensors="pt",
+            padding=True,
         ).to(self.model.device)
 
         # Get special token IDs for early stopping
@@ -74,12 +114,12 @@ class QwenExplorerModel(BaseExplorerModel):
         generated_ids = self.model.generate(
             **model_inputs,
             max_new_tokens=self.max_new_tokens,
+            num_return_sequences=num_samples,
             eos_token_id=eos_token_id,
             pad_token_id=self.tokenizer.pad_token_id,
-            do_sample=True,  # Use greedy decoding for consistency
-            num_beams=1,      # No beam search
-            temperature=0.9,
-            top_p=0.95,
+            **self.sampling_params,
+            **stopping_kwargs(self.tokenizer, model_inputs.input_ids.shape[1], stop_pattern),
+            **self.prefix_cache.generate_kwargs(get_action_prompts, model_inputs.input_ids, num_return_sequences=num_samples),
             # top_k=50,
             # repetition_penalty=1.2,
             # length_penalty=1.0,
@@ -87,15 +127,14 @@ class QwenExplorerModel(BaseExplorerModel):
             # max_time=10.0,
             # max_length=100,
         )
-        # Strip the prompt tokens
+        # Strip the prompt tokens (left padded, so every prompt ends at the same position)
+        # and the padding after each row's EOS or stop pattern
+        prompt_length = model_inputs.input_ids.shape[1]
         generated_ids = [
-            output_ids[len(input_ids):]
-            for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
+            trim_generated_ids(output_ids[prompt_length:].tolist(), [eos_token_id, self.tokenizer.pad_token_id])
+            for output_ids in generated_ids
         ]
         # Decode with skip_special_tokens=True to remove most special tokens
         # Then use our custom function to clean up any remaining ones
-        response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        action = _extract_qwen_assistant_response(response)
-        return action
-
-
+        responses = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+        return [truncate_at_stop(_extract_qwen_assistant_response(response), stop_pattern) for response in responses]
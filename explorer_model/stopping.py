@@ -0,0 +1,31 @@
+from transformers import StoppingCriteria, StoppingCriteriaList
+import re
+import torch
+
+
+class PatternStoppingCriteria(StoppingCriteria):
+    """
+    Stop each row of a generate() call once the text generated after the prompt matches a
+    regex, e.g. the first digit of a FrozenLake action or the closing "]" of click[...].
+    Finished rows are padded until every row is done.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, stop_pattern: str) -> None:
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_pattern = re.compile(stop_pattern)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        texts = self.tokenizer.batch_decode(input_ids[:, self.prompt_length:], skip_special_tokens=True)
+        return torch.tensor(
+            [self.stop_pattern.search(text) is not None for text in texts],
+            dtype=torch.bool,
+            device=input_ids.device,
+        )
+
+
+def stopping_kwargs(tokenizer, prompt_length: int, stop_pattern: str = None) -> dict:
+    """generate() kwargs stopping at stop_pattern, {} when there is none."""
+    if stop_pattern is None:
+        return {}
+    return {"stopping_criteria": StoppingCriteriaList([PatternStoppingCriteria(tokenizer, prompt_length, stop_pattern)])}
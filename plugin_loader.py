@@ -1,4 +1,4 @@
-from config import model_path, api_model_name
+from config import model_path, api_model_name, llm_cache, async_openai
 from explorer_model.base_explorer_model import BaseExplorerModel
 from explorer_model.llama3_explorer_model import Llama3ExplorerModel
 from explorer_model.qwen_explorer_model import QwenExplorerModel
@@ -8,11 +8,39 @@ from exp_backend.base_exp_backend import BaseExpBackend
 from explorer_model.internlm_explorer_model import InternLMExplorerModel
 from explorer_model.deepseek_explorer_model import DeepSeekExplorerModel
 from explorer_model.openai_explorer_model import OpenAIExplorerModel
+from explorer_model.cached_explorer_model import CachedExplorerModel
 
 
 def load_explorer_model(model_name: str, use_api: bool = False) -> BaseExplorerModel:
+    explorer_model = _load_explorer_model(model_name, use_api=use_api)
+    if llm_cache["enabled"]:
+        return CachedExplorerModel(
+            explorer_model,
+            cache_path=llm_cache["cache_path"],
+            mode=llm_cache["mode"],
+            num_samples=llm_cache["num_samples"],
+            max_entries=llm_cache["max_entries"],
+            seed=llm_cache["seed"],
+            save_every=llm_cache["save_every"],
+        )
+    return explorer_model
+
+
+def _load_explorer_model(model_name: str, use_api: bool = False) -> BaseExplorerModel:
     # use api model
     if use_api:
+        if async_openai["enabled"]:
+            from explorer_model.async_openai_explorer_model import AsyncOpenAIExplorerModel
+            return AsyncOpenAIExplorerModel(
+                api_model_name[model_name],
+                timeout=async_openai["timeout"],
+                max_attempts=async_openai["max_attempts"],
+                backoff_base=async_openai["backoff_base"],
+                backoff_max=async_openai["backoff_max"],
+                max_concurrency=async_openai["max_concurrency"],
+                requests_per_second=async_openai["requests_per_second"],
+                burst=async_openai["burst"],
+            )
         return OpenAIExplorerModel(api_model_name[model_name])
     # use local model
     if "llama" in model_name:
@@ -64,6 +92,7 @@ def load_adaptor(env_name: str, model_name: str, **kwargs) -> BaseEnvAdaptor:
 
 
 def load_exp_backend(env_name: str, storage_path: str, depreiciate_exp_store_path: str, explorer_model=None, **kwargs) -> BaseExpBackend:
+    # A storage_path ending with .db / .sqlite selects the sqlite storage mode for any backend (see backend_config)
     # Extract common optional kwargs
     log_dir = kwargs.pop("log_dir", None)
     start_timestep = kwargs.pop("start_timestep", None)
@@ -151,6 +151,9 @@ def main() -> int:
             print(f"--- map {map_idx} | episode {i}/{args.episodes_per_map} ---")
             e.explore()
 
+    # Flush and close the experience store before marking the run as finished
+    e.close()
+
     # Create a finish marker file to indicate this run completed successfully.
     marker_dir = os.path.join(args.output_root, "finish_mark")
     os.makedirs(marker_dir, exist_ok=True)
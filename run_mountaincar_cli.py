@@ -137,6 +137,9 @@ def main() -> int:
             print(f"--- force {force_idx} ({force_value}) | episode {i}/{args.episodes} ---")
             e.explore()
 
+    # Flush and close the experience store before marking the run as finished
+    e.close()
+
     # Create a finish marker file to indicate this run completed successfully.
     marker_dir = os.path.join(args.output_root, "finish_mark")
     os.makedirs(marker_dir, exist_ok=True)
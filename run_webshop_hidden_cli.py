@@ -149,6 +149,9 @@ def main() -> int:
     if status is not None:
         ts = status.get("mb_current_timestep", ts)
 
+    # Flush and close the experience store before marking the run as finished
+    e.close()
+
     # Create a finish marker file to indicate this run completed successfully.
     marker_dir = os.path.join(args.output_root, "finish_mark")
     os.makedirs(marker_dir, exist_ok=True)
@@ -0,0 +1,175 @@
+"""
+Checks of AsyncOpenAIExplorerModel against a local mock OpenAI server (no network or API key):
+retries of 429 / 5xx / timeouts, failed requests returning "", the client-side stop pattern,
+the shared concurrency limit and the rate limiter.
+
+    python -m pytest -q test_async_openai_mock.py
+    python test_async_openai_mock.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 确保能引用到 global_verifier 目录
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from explorer_model.async_openai_explorer_model import AsyncOpenAIExplorerModel
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Chat completions; each request takes the next scripted reply ("429", "500", "400", "slow"), else answers."""
+
+    lock = threading.Lock()
+    requests = []
+    script = []
+    inflight = 0
+    max_inflight = 0
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(body)
+            cls.inflight += 1
+            cls.max_inflight = max(cls.max_inflight, cls.inflight)
+            reply = cls.script.pop(0) if cls.script else "ok"
+        try:
+            if reply == "429":
+                self.send_json(429, {"error": {"message": "rate limited"}}, {"retry-after": "0.2"})
+                return
+            if reply in ["500", "400"]:
+                self.send_json(int(reply), {"error": {"message": reply}})
+                return
+            if reply == "slow":
+                time.sleep(1.5)
+            time.sleep(0.05)
+            self.send_json(200, {
+                "id": "mock",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {"index": i, "finish_reason": "stop", "message": {"role": "assistant", "content": f"\nclick[item {i}]. because\nmore"}}
+                    for i in range(body.get("n", 1))
+                ],
+            })
+        finally:
+            with cls.lock:
+                cls.inflight -= 1
+
+    @classmethod
+    def reset(cls, script: list = None) -> None:
+        # Requests the client already gave up on (timeouts) may still be served
+        while cls.inflight:
+            time.sleep(0.05)
+        with cls.lock:
+            cls.requests = []
+            cls.script = list(script or [])
+            cls.max_inflight = 0
+
+
+_base_url = None
+
+
+def mock_base_url() -> str:
+    """base_url of the mock server (started once)."""
+    global _base_url
+    if _base_url is None:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), MockOpenAIHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        _base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    return _base_url
+
+
+def make_model(api_key: str, **kwargs):
+    # Every test gets its own endpoint (base_url + api key), so the shared limits do not leak between tests
+    kwargs = {"timeout": 0.5, "max_attempts": 4, "backoff_base": 0.05, "backoff_max": 1.0, **kwargs}
+    return AsyncOpenAIExplorerModel("gpt-4o", base_url=mock_base_url(), api_key=api_key, **kwargs)
+
+
+def test_retries_429_and_500():
+    model = make_model("retry")
+    MockOpenAIHandler.reset(["429", "500"])
+    start = time.time()
+    assert model.get_next_action("p", stop_pattern=r"\]") == "click[item 0]"
+    assert len(MockOpenAIHandler.requests) == 3
+    # Waited at least the Retry-After of the 429
+    assert time.time() - start >= 0.2
+
+
+def test_timeout_is_retried():
+    model = make_model("timeout")
+    MockOpenAIHandler.reset(["slow"])
+    assert model.get_next_action("p") == "click[item 0]. because"
+    assert len(MockOpenAIHandler.requests) == 2
+
+
+def test_failed_request_returns_empty():
+    model = make_model("failed")
+    MockOpenAIHandler.reset(["400"])
+    assert model.get_next_action("p") == ""
+    # 400 is not retried
+    assert len(MockOpenAIHandler.requests) == 1
+    MockOpenAIHandler.reset(["500"] * 4)
+    assert model.get_next_action_samples("p", 3) == ["", "", ""]
+    assert len(MockOpenAIHandler.requests) == 4
+
+
+def test_stop_pattern_is_client_side():
+    model = make_model("stop")
+    MockOpenAIHandler.reset()
+    samples = model.get_next_action_samples("p", 3, stop_pattern=r"\]")
+    assert samples == [f"click[item {i}]" for i in range(3)]
+    # One request for all samples, without a server-side stop (the reply starts with a newline)
+    assert len(MockOpenAIHandler.requests) == 1
+    assert MockOpenAIHandler.requests[0]["n"] == 3
+    assert "stop" not in MockOpenAIHandler.requests[0]
+
+
+def test_concurrency_limit_is_shared():
+    model = make_model("concurrency", max_concurrency=3)
+    MockOpenAIHandler.reset()
+    assert len(model.get_next_actions([f"p{i}" for i in range(12)])) == 12
+    assert MockOpenAIHandler.max_inflight <= 3
+    # Another instance and other threads on the same endpoint use the first instance's limits
+    other = make_model("concurrency", max_concurrency=50)
+    MockOpenAIHandler.reset()
+    threads = [threading.Thread(target=other.get_next_action, args=("q",)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(MockOpenAIHandler.requests) == 10
+    assert MockOpenAIHandler.max_inflight <= 3
+
+
+def test_rate_limit():
+    model = make_model("rate", requests_per_second=10, burst=1)
+    MockOpenAIHandler.reset()
+    start = time.time()
+    model.get_next_actions([f"r{i}" for i in range(6)])
+    # 5 requests after the first wait for the bucket at 10 per second
+    assert time.time() - start >= 0.45
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name} passed")
@@ -0,0 +1,684 @@
+"""
+Persistence checks of the experience backend on a temporary directory (no env or model needed).
+
+    python -m pytest -q test_exp_store.py
+"""
+import copy
+import gc
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import pytest
+
+# 确保能引用到 global_verifier 目录
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from exp_backend import base_exp_backend
+from exp_backend.backend_config import base_backend_config
+from exp_backend import frozenLake_exp_generative_backend, frozenLake_exp_voyager_backend
+from exp_backend.frozenLake_exp_backend import FrozenLakeExpBackend
+from exp_backend.frozenLake_exp_generative_backend import FrozenLakeExpGenerativeBackend
+from exp_backend.frozenLake_exp_memorybank_backend import FrozenLakeExpMemoryBankBackend
+from exp_backend.frozenLake_exp_voyager_backend import FrozenLakeExpVoyagerBackend
+from exp_backend.score_cache import ScoreCache
+from exp_backend.state_table import StateTable
+from exp_backend.store_snapshot import StoreSnapshot
+from exp_backend.trajectory_table import TrajectoryPath, TrajectoryTable
+
+
+def make_exp(trajectory_id: str, step: int) -> dict:
+    """Experience of step `step` (1-based) of a FrozenLake-like trajectory that keeps moving right."""
+    return {
+        "id": f"{trajectory_id}_{step}",
+        "trajectory_id": trajectory_id,
+        "trajectory_step": step,
+        "reproduce_method": "action_path",
+        "action_path": [2] * step,
+        "st": {"cur_pos": [0, step - 1], "tile_type": "F"},
+        "action": 2,
+        "st1": {"cur_pos": [0, step], "tile_type": "F"},
+    }
+
+
+@pytest.fixture
+def open_backend(tmp_path, monkeypatch):
+    """open_backend(**base_backend_config overrides) -> a backend on the same store files every call."""
+    monkeypatch.setitem(base_backend_config, "flush_at_exit", False)
+
+    def open_backend(**config):
+        for key, value in config.items():
+            monkeypatch.setitem(base_backend_config, key, value)
+        return FrozenLakeExpBackend(
+            "frozenlake",
+            str(tmp_path / "exp_store.json"),
+            str(tmp_path / "depreiciate_exp_store.json"),
+            log_dir=str(tmp_path / "log"),
+        )
+    return open_backend
+
+
+def test_wal_replay_after_crash(open_backend, tmp_path):
+    backend = open_backend(storage_mode="wal", wal_compact_every=None)
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+    # Killed mid-write: the last record is cut off, nothing was compacted into the snapshot
+    with open(tmp_path / "exp_store.json.wal", "a") as file:
+        file.write('{"op": "store", "exp": {"id": "t0_4", "st"')
+    with open(tmp_path / "exp_store.json") as file:
+        assert json.load(file) == {}
+
+    backend = open_backend(storage_mode="wal", wal_compact_every=None)
+    assert list(backend.exp_store) == ["t0_1", "t0_2", "t0_3"]
+    for step in range(1, 4):
+        exp = backend.exp_store[f"t0_{step}"]
+        assert exp["action_path"] == [2] * step
+        assert exp["st"] == make_exp("t0", step)["st"]
+        assert exp["st1"] == make_exp("t0", step)["st1"]
+    # The st1 of a step and the st of the next one are one interned state
+    assert backend.exp_store["t0_1"]["st1"] is backend.exp_store["t0_2"]["st"]
+    assert backend.get_exp_ids_by_state({"cur_pos": [0, 1], "tile_type": "F"}) == ["t0_2"]
+
+
+def test_wal_compaction(open_backend, tmp_path):
+    wal_path = tmp_path / "exp_store.json.wal"
+    backend = open_backend(storage_mode="wal", wal_compact_every=6)
+    # Step 1 writes 4 records (st, st1, trajectory, store), step 2 writes 3 (st1, trajectory, store)
+    backend.store_experience(make_exp("t0", 1))
+    assert backend._wal.num_records == 4
+    backend.store_experience(make_exp("t0", 2))
+    # 7 >= 6: the stores were written as a snapshot and the log was reset
+    assert backend._wal.num_records == 0
+    assert os.path.getsize(wal_path) == 0
+    with open(tmp_path / "exp_store.json") as file:
+        assert list(json.load(file)) == ["t0_1", "t0_2"]
+    with open(tmp_path / "exp_store_trajectories.json") as file:
+        assert json.load(file) == {"t0": [2, 2]}
+
+    # Records after the compaction go to the log again and are replayed on top of the snapshot
+    backend.store_experience(make_exp("t0", 3))
+    assert backend._wal.num_records == 3
+    backend = open_backend(storage_mode="wal", wal_compact_every=6)
+    assert list(backend.exp_store) == ["t0_1", "t0_2", "t0_3"]
+    assert backend.exp_store["t0_3"]["action_path"] == [2, 2, 2]
+
+
+def test_wal_update_and_deprecate_survive_reload(open_backend):
+    backend = open_backend(storage_mode="wal", wal_compact_every=None)
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+    exp = backend.exp_store["t0_2"]
+    exp["mb_timestep"] = 7
+    backend._persist_update(exp)
+    backend._deprecate_experience("t0_1")
+
+    backend = open_backend(storage_mode="wal", wal_compact_every=None)
+    assert list(backend.exp_store) == ["t0_2", "t0_3"]
+    assert backend.exp_store["t0_2"]["mb_timestep"] == 7
+    assert list(backend.depreiciate_exp_store) == ["t0_1"]
+    assert backend.depreiciate_exp_store["t0_1"]["deprecated_at"] is not None
+    # The deprecated experience keeps its action path
+    assert backend.depreiciate_exp_store["t0_1"]["action_path"] == [2]
+    assert backend.get_exp_ids_by_state({"cur_pos": [0, 0], "tile_type": "F"}) == []
+
+
+def test_sqlite_round_trip(open_backend, tmp_path):
+    backend = open_backend(storage_mode="sqlite", flush_every_n=1)
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+    exp = backend.exp_store["t0_2"]
+    exp["mb_timestep"] = 7
+    backend._persist_update(exp)
+    backend._deprecate_experience("t0_1")
+    backend.close()
+
+    backend = open_backend(storage_mode="sqlite", flush_every_n=1)
+    assert list(backend.exp_store) == ["t0_2", "t0_3"]
+    assert backend.exp_store["t0_2"]["mb_timestep"] == 7
+    assert backend.exp_store["t0_3"]["action_path"] == [2, 2, 2]
+    assert list(backend.depreiciate_exp_store) == ["t0_1"]
+    assert backend.exp_store["t0_2"]["st1"] is backend.exp_store["t0_3"]["st"]
+    assert backend.get_exp_ids_by_state({"cur_pos": [0, 1], "tile_type": "F"}) == ["t0_2"]
+    # One database file, the trajectories live in its trajectory_actions table
+    assert backend._sqlite.conn.execute("SELECT COUNT(*) FROM trajectory_actions").fetchone() == (3,)
+    backend.close()
+
+
+def test_update_follows_flush_policy(open_backend, tmp_path):
+    backend = open_backend(storage_mode="json", flush_every_n=1)
+    backend.store_experience(make_exp("t0", 1))
+    exp = backend.exp_store["t0_1"]
+    exp["mb_timestep"] = 5
+    backend._persist_update(exp)
+    # flush_every_n=1 writes on every change, updates included
+    with open(tmp_path / "exp_store.json") as file:
+        assert json.load(file)["t0_1"]["mb_timestep"] == 5
+
+
+def test_replaced_backend_never_writes(open_backend, tmp_path):
+    old = open_backend(storage_mode="json", flush_every_n=None, flush_at_exit=True)
+    for step in range(1, 4):
+        old.store_experience(make_exp("t0", step))
+    # What the explorer does before loading a new backend on the same files
+    old.close()
+    new = open_backend(storage_mode="json", flush_every_n=None, flush_at_exit=True)
+    assert list(new.exp_store) == ["t0_1", "t0_2", "t0_3"]
+    for step in range(1, 6):
+        new.store_experience(make_exp("t1", step))
+
+    # At exit only the backends still open flush
+    assert old not in base_exp_backend._open_backends
+    base_exp_backend._close_open_backends()
+    old.flush_store()
+    with open(tmp_path / "exp_store.json") as file:
+        assert len(json.load(file)) == 8
+    with pytest.raises(ValueError):
+        old.store_experience(make_exp("t2", 1))
+
+
+def test_open_backends_are_weak(open_backend):
+    backend = open_backend(storage_mode="json", flush_at_exit=True)
+    assert backend in base_exp_backend._open_backends
+    num_open = len(base_exp_backend._open_backends)
+    del backend
+    gc.collect()
+    assert len(base_exp_backend._open_backends) == num_open - 1
+
+
+def write_json(path, content) -> None:
+    with open(path, "w") as file:
+        json.dump(content, file)
+
+
+def read_json(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def snapshot_files(tmp_path) -> tuple:
+    paths = [str(tmp_path / name) for name in ["exp_store.json", "depreiciate_exp_store.json", "exp_store_states.json", "exp_store_trajectories.json"]]
+    return paths, StoreSnapshot(paths, f"{paths[0]}.commit")
+
+
+def test_snapshot_recover_rolls_forward(tmp_path):
+    paths, snapshot = snapshot_files(tmp_path)
+    for path in paths:
+        write_json(path, {"generation": "old"})
+    # Crashed after the commit marker and the first two renames
+    for path in paths:
+        write_json(f"{path}.tmp", {"generation": "new"})
+    write_json(snapshot.marker_path, {"paths": paths})
+    for path in paths[:2]:
+        os.replace(f"{path}.tmp", path)
+
+    assert snapshot.recover() == "rolled_forward"
+    assert [read_json(path) for path in paths] == [{"generation": "new"}] * 4
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths)
+    assert snapshot.recover() is None
+
+
+def test_snapshot_recover_discards_uncommitted(tmp_path):
+    paths, snapshot = snapshot_files(tmp_path)
+    for path in paths:
+        write_json(path, {"generation": "old"})
+    # Crashed while writing the temp files, before the marker was committed
+    for path in paths[:3]:
+        write_json(f"{path}.tmp", {"generation": "new"})
+    write_json(f"{snapshot.marker_path}.tmp", {"paths": paths})
+
+    assert snapshot.recover() == "discarded"
+    assert [read_json(path) for path in paths] == [{"generation": "old"}] * 4
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(path) for path in paths)
+
+
+def test_backend_loads_rolled_forward_snapshot(open_backend, tmp_path):
+    backend = open_backend(storage_mode="json", flush_every_n=1)
+    backend.store_experience(make_exp("t0", 1))
+    backend.close()
+    # A later save of a second experience crashed between its marker and the renames
+    paths, snapshot = snapshot_files(tmp_path)
+    backend = open_backend(storage_mode="json", flush_every_n=None)
+    backend.store_experience(make_exp("t0", 2))
+    # Only the temp files and the marker of that save are written
+    saved = []
+    backend._snapshot.save = saved.extend
+    backend.flush_store()
+    for path, content in zip(paths, saved):
+        write_json(f"{path}.tmp", content)
+    write_json(snapshot.marker_path, {"paths": paths})
+
+    backend = open_backend(storage_mode="json")
+    assert list(backend.exp_store) == ["t0_1", "t0_2"]
+    assert backend.exp_store["t0_2"]["action_path"] == [2, 2]
+    assert not os.path.exists(snapshot.marker_path)
+
+
+def test_state_table_interning():
+    table = StateTable()
+    digest, state = table.intern({"cur_pos": [0, 1], "tile_type": "F"})
+    # Equal content (any key order) is one entry and one object
+    same_digest, same_state = table.intern({"tile_type": "F", "cur_pos": [0, 1]})
+    assert (same_digest, same_state) == (digest, state)
+    assert same_state is state
+    assert table.intern({"cur_pos": [0, 2], "tile_type": "F"})[0] != digest
+    assert len(table) == 2
+    # key() does not intern
+    assert table.key({"cur_pos": [0, 3], "tile_type": "F"}) == StateTable.digest({"cur_pos": [0, 3], "tile_type": "F"})
+    assert len(table) == 2
+    assert table.export([digest]) == {digest: {"cur_pos": [0, 1], "tile_type": "F"}}
+
+
+def test_state_table_round_trip(open_backend, tmp_path):
+    backend = open_backend(storage_mode="json", flush_every_n=1)
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+
+    # The stores reference the states by digest, every distinct state is written once
+    states = read_json(tmp_path / "exp_store_states.json")
+    stored = read_json(tmp_path / "exp_store.json")
+    assert len(states) == 4
+    assert stored["t0_1"]["st1"] == stored["t0_2"]["st"]
+    assert states[stored["t0_2"]["st"]] == {"cur_pos": [0, 1], "tile_type": "F"}
+
+    backend = open_backend(storage_mode="json")
+    for step in range(1, 4):
+        assert backend.exp_store[f"t0_{step}"]["st"] == make_exp("t0", step)["st"]
+        assert backend.exp_store[f"t0_{step}"]["st1"] == make_exp("t0", step)["st1"]
+    assert backend.exp_store["t0_1"]["st1"] is backend.exp_store["t0_2"]["st"]
+
+
+def test_inline_states_are_interned_on_load(open_backend, tmp_path):
+    # A store written before interning holds the states (and action paths) inline
+    exps = {f"t0_{step}": dict(make_exp("t0", step)) for step in range(1, 3)}
+    for exp in exps.values():
+        del exp["trajectory_id"]
+    write_json(tmp_path / "exp_store.json", exps)
+    backend = open_backend(storage_mode="json", flush_every_n=1)
+    assert backend.exp_store["t0_1"]["st1"] is backend.exp_store["t0_2"]["st"]
+    backend.store_experience(make_exp("t1", 1))
+    stored = read_json(tmp_path / "exp_store.json")
+    assert isinstance(stored["t0_1"]["st"], str)
+    assert read_json(tmp_path / "exp_store_states.json")[stored["t0_1"]["st"]] == {"cur_pos": [0, 0], "tile_type": "F"}
+
+
+def test_trajectory_path_view():
+    table = TrajectoryTable()
+    first = table.attach("t0", [2, 1])
+    second = table.attach("t0", [2, 1, 0])
+    assert isinstance(second, TrajectoryPath)
+    # Both views share one record, the shorter one still sees its own length
+    assert second.actions is first.actions
+    assert len(first) == 2 and first == [2, 1] and list(first) == [2, 1]
+    assert first[-1] == 1 and second[-1] == 0
+    assert second[:-1] == [2, 1] and isinstance(second[:-1], list)
+    with pytest.raises(IndexError):
+        first[2]
+    assert repr(first) == "[2, 1]"
+    assert first.to_list() == [2, 1]
+    # Copies handed out by the retrieval functions are plain lists
+    copied = copy.deepcopy({"action_path": first})
+    assert type(copied["action_path"]) is list and copied["action_path"] == [2, 1]
+    with pytest.raises(ValueError):
+        table.attach("t0", [3])
+
+
+def test_trajectory_table_round_trip(open_backend, tmp_path):
+    backend = open_backend(storage_mode="json", flush_every_n=1)
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+    backend.store_experience(make_exp("t1", 1))
+
+    # The episode's actions are written once, the experiences only reference them
+    assert read_json(tmp_path / "exp_store_trajectories.json") == {"t0": [2, 2, 2], "t1": [2]}
+    stored = read_json(tmp_path / "exp_store.json")
+    assert "action_path" not in stored["t0_2"]
+    assert (stored["t0_2"]["trajectory_id"], stored["t0_2"]["trajectory_step"]) == ("t0", 2)
+
+    backend = open_backend(storage_mode="json")
+    for step in range(1, 4):
+        action_path = backend.exp_store[f"t0_{step}"]["action_path"]
+        assert isinstance(action_path, TrajectoryPath)
+        assert action_path == [2] * step
+    assert backend.exp_store["t0_1"]["action_path"].actions is backend.exp_store["t0_3"]["action_path"].actions
+    assert copy.deepcopy(backend.exp_store["t0_2"])["action_path"] == [2, 2]
+
+
+@pytest.fixture
+def memorybank_backend(tmp_path, monkeypatch):
+    monkeypatch.setitem(base_backend_config, "flush_at_exit", False)
+    monkeypatch.setitem(base_backend_config, "storage_mode", "json")
+    monkeypatch.setitem(base_backend_config, "flush_every_n", None)
+    # retention(4) = 0.264, retention(5) = 0.189: an experience is forgotten 5 steps after its last use
+    return FrozenLakeExpMemoryBankBackend(
+        "frozenlake",
+        str(tmp_path / "exp_store.json"),
+        str(tmp_path / "depreiciate_exp_store.json"),
+        log_dir=str(tmp_path / "log"),
+        threshold=0.25,
+        decay_rate=3,
+    )
+
+
+def full_scan_forgotten(backend) -> set:
+    """The ids the former cleanup found by scanning every experience."""
+    return {
+        exp_id for exp_id, exp in backend.exp_store.items()
+        if math.exp(-(backend.mb_current_timestep - exp.get("mb_timestep", 0)) / backend.mb_decay_rate) < backend.mb_threshold
+    }
+
+
+def test_memorybank_cleanup_matches_full_scan(memorybank_backend):
+    backend = memorybank_backend
+    assert backend._mb_expiry_interval == 5
+    rng = random.Random(0)
+    for timestep in range(60):
+        backend.store_experience(make_exp(f"t{timestep}", 1))
+        # Refreshed experiences leave stale heap entries behind
+        if backend.exp_store:
+            backend.mb_finish_explore_trail(rng.sample(list(backend.exp_store), min(3, len(backend.exp_store))))
+        expected = full_scan_forgotten(backend)
+        forgotten = backend.mb_cleanup_forgotten()
+        assert set(forgotten) == expected
+        assert len(forgotten) == len(expected)
+        assert all(exp_id in backend.depreiciate_exp_store for exp_id in forgotten)
+        backend.mb_tick()
+    assert full_scan_forgotten(backend) == set()
+
+
+def test_memorybank_stale_entries_and_rebuild(memorybank_backend):
+    backend = memorybank_backend
+    backend.store_experience(make_exp("t0", 1))
+    backend.store_experience(make_exp("t1", 1))
+    # Keep t0_1 in use for 80 steps: one stale entry per refresh, never popped before it expires
+    for _ in range(80):
+        backend.mb_tick()
+        backend.mb_finish_explore_trail(["t0_1"])
+        expected = full_scan_forgotten(backend)
+        assert set(backend.mb_cleanup_forgotten()) == expected
+    assert list(backend.exp_store) == ["t0_1"]
+    assert list(backend.depreiciate_exp_store) == ["t1_1"]
+    # The heap never holds more than 2 entries per experience + 64 after a cleanup
+    assert len(backend._mb_expiry_heap) <= 2 * len(backend.exp_store) + 64
+
+    backend.mb_finish_explore_trail(["t0_1"] * 70)
+    assert len(backend._mb_expiry_heap) > 2 * len(backend.exp_store) + 64
+    assert backend.mb_cleanup_forgotten() == []
+    # Rebuilt from the store: one entry for t0_1, at its current timestep
+    assert len(backend._mb_expiry_heap) == 1
+    assert backend._mb_expiry_heap[0][3] == backend.mb_current_timestep
+    for _ in range(5):
+        backend.mb_tick()
+    assert full_scan_forgotten(backend) == {"t0_1"}
+    assert backend.mb_cleanup_forgotten() == ["t0_1"]
+
+
+class CountingModel:
+    """Stands in for an explorer model: answers every prompt with a fixed reply and counts the calls."""
+
+    supports_concurrent_requests = True
+
+    def __init__(self, reply: str, model_name: str = "mock-model") -> None:
+        self.reply = reply
+        self.model_name = model_name
+        self.calls = 0
+
+    def get_next_action(self, prompt: str, **kwargs) -> str:
+        self.calls += 1
+        return self.reply
+
+
+@pytest.fixture
+def generative_backend(tmp_path, monkeypatch):
+    """generative_backend(model) -> a FrozenLake generative backend on the same store files every call."""
+    monkeypatch.setitem(base_backend_config, "flush_at_exit", False)
+    monkeypatch.setitem(base_backend_config, "storage_mode", "json")
+
+    def generative_backend(model):
+        return FrozenLakeExpGenerativeBackend(
+            "frozenlake",
+            str(tmp_path / "exp_store.json"),
+            str(tmp_path / "depreiciate_exp_store.json"),
+            explorer_model=model,
+            log_dir=str(tmp_path / "log"),
+        )
+    return generative_backend
+
+
+START = {"cur_pos": [0, 0], "tile_type": "F"}
+
+
+def test_score_cache_key_scheme(generative_backend, monkeypatch):
+    model = CountingModel("7")
+    backend = generative_backend(model)
+    for trajectory_id in ["t0", "t1"]:
+        backend.store_experience(make_exp(trajectory_id, 1))
+    backend.store_experience(make_exp("t0", 2))
+
+    assert [exp["generative_score"] for exp in backend.retrieve_experience(START)] == [7, 7]
+    assert model.calls == 2
+    scoring_key = ScoreCache.scoring_key(backend.state_table.key(START), backend._score_prompt_hash, "mock-model")
+    assert backend.score_cache.get("t0_1", scoring_key) == 7
+    # Same query, prompt and model: served from the cache
+    backend.retrieve_experience(START)
+    assert model.calls == 2
+    # Another query state is another key
+    backend.retrieve_experience({"cur_pos": [0, 1], "tile_type": "F"})
+    assert model.calls == 3
+    # So is another model
+    model.model_name = "other-model"
+    backend.retrieve_experience(START)
+    assert model.calls == 5
+    backend.close()
+
+    # The cache survives a restart, but edited prompt templates miss every old entry
+    model = CountingModel("7")
+    backend = generative_backend(model)
+    assert len(backend.score_cache) == 5
+    backend.retrieve_experience(START)
+    assert model.calls == 0
+    backend.close()
+    monkeypatch.setattr(frozenLake_exp_generative_backend, "FROZENLAKE_SCORE_PROMPT", frozenLake_exp_generative_backend.FROZENLAKE_SCORE_PROMPT + "\n")
+    backend = generative_backend(model)
+    backend.retrieve_experience(START)
+    assert model.calls == 2
+    backend.close()
+
+
+class FailingModel(CountingModel):
+    def get_next_action(self, prompt: str, **kwargs) -> str:
+        super().get_next_action(prompt)
+        raise RuntimeError("rate limited")
+
+
+def test_score_cache_failed_scores_are_not_cached(generative_backend):
+    model = FailingModel("")
+    backend = generative_backend(model)
+    backend.store_experience(make_exp("t0", 1))
+    backend.retrieve_experience(START)
+    backend.retrieve_experience(START)
+    assert model.calls == 2
+    assert len(backend.score_cache) == 0
+    backend.close()
+
+
+def test_score_cache_invalidated_on_deprecation(generative_backend, tmp_path):
+    model = CountingModel("7")
+    backend = generative_backend(model)
+    for trajectory_id in ["t0", "t1", "t2"]:
+        backend.store_experience(make_exp(trajectory_id, 1))
+    backend.retrieve_experience(START)
+    scoring_key = ScoreCache.scoring_key(backend.state_table.key(START), backend._score_prompt_hash, "mock-model")
+    assert backend.score_cache.get("t0_1", scoring_key) == 7
+    backend.bulk_deprecate(["t0_1"])
+    assert backend.score_cache.get("t0_1", scoring_key) is None
+    assert set(backend.score_cache.entries) == {"t1_1", "t2_1"}
+    backend.close()
+    assert set(read_json(tmp_path / "exp_store_scores.json")) == {"t1_1", "t2_1"}
+
+    # Deprecated while the score cache was not written (e.g. killed): dropped when loading
+    backend = generative_backend(model)
+    backend.score_cache.save = lambda: False
+    backend._deprecate_experience("t1_1")
+    backend.close()
+    assert set(read_json(tmp_path / "exp_store_scores.json")) == {"t1_1", "t2_1"}
+    backend = generative_backend(model)
+    assert set(backend.score_cache.entries) == {"t2_1"}
+    backend.close()
+
+
+class SlowModel(CountingModel):
+    def get_next_action(self, prompt: str, **kwargs) -> str:
+        time.sleep(0.05)
+        return super().get_next_action(prompt)
+
+
+@pytest.fixture
+def voyager_backend(tmp_path, monkeypatch):
+    """voyager_backend(model) -> a FrozenLake voyager backend (async summaries) on the same store files every call."""
+    # Registered with the exit hook, written only when flushed by close() / the hook
+    monkeypatch.setitem(base_backend_config, "flush_at_exit", True)
+    monkeypatch.setitem(base_backend_config, "storage_mode", "json")
+    monkeypatch.setitem(base_backend_config, "flush_every_n", None)
+    monkeypatch.setitem(base_backend_config, "flush_on_episode_end", True)
+    backends = []
+
+    def voyager_backend(model):
+        backend = FrozenLakeExpVoyagerBackend(
+            "frozenlake",
+            str(tmp_path / "exp_store.json"),
+            str(tmp_path / "depreiciate_exp_store.json"),
+            explorer_model=model,
+            log_dir=str(tmp_path / "log"),
+        )
+        backends.append(backend)
+        return backend
+    yield voyager_backend
+    for backend in backends:
+        backend.close()
+
+
+def test_voyager_close_drains_summaries(voyager_backend, tmp_path):
+    backend = voyager_backend(SlowModel("Moved right, SAFE."))
+    assert backend.voyager_summary_mode == "async"
+    for step in range(1, 4):
+        backend.store_experience(make_exp("t0", step))
+    assert any(exp.get("voyager_summary_pending") for exp in backend.exp_store.values())
+    backend.close()
+
+    stored = read_json(tmp_path / "exp_store.json")
+    assert list(stored) == ["t0_1", "t0_2", "t0_3"]
+    for exp in stored.values():
+        assert exp["voyager_summary"] == "Moved right, SAFE."
+        assert "voyager_summary_pending" not in exp
+    assert len(read_json(tmp_path / "exp_store_summaries.json")) == 3
+    # Closing again (e.g. from the exit hook) does nothing
+    backend.close()
+
+
+def test_voyager_finish_episode_writes_summaries(voyager_backend, tmp_path):
+    backend = voyager_backend(SlowModel("Moved right, SAFE."))
+    backend.store_experience(make_exp("t0", 1))
+    time.sleep(0.2)
+    backend.finish_episode()
+    assert read_json(tmp_path / "exp_store.json")["t0_1"]["voyager_summary"] == "Moved right, SAFE."
+    assert len(read_json(tmp_path / "exp_store_summaries.json")) == 1
+
+
+def test_replaced_voyager_backend_never_writes(voyager_backend, tmp_path):
+    old = voyager_backend(SlowModel("Moved right, SAFE."))
+    for step in range(1, 5):
+        old.store_experience(make_exp("t0", step))
+    # The explorer closes the backend it replaces before loading the new one
+    old.close()
+    new = voyager_backend(SlowModel("Moved right, SAFE."))
+    assert len(new.exp_store) == 4
+    for step in range(1, 5):
+        new.store_experience(make_exp("t1", step))
+    assert old not in base_exp_backend._open_backends
+    assert new in base_exp_backend._open_backends
+
+    # At exit only the open backend writes, the old one cannot overwrite it with its 4 experiences
+    base_exp_backend._close_open_backends()
+    stored = read_json(tmp_path / "exp_store.json")
+    assert len(stored) == 8
+    assert all("voyager_summary_pending" not in exp for exp in stored.values())
+
+
+def sync_model(reply: str, model_name: str = "mock-model") -> CountingModel:
+    """A model the voyager backend has to call in the main thread (sync summaries)."""
+    model = CountingModel(reply, model_name)
+    model.supports_concurrent_requests = False
+    return model
+
+
+def test_summary_cache_key_scheme(voyager_backend, monkeypatch):
+    model = sync_model("Moved right, SAFE.")
+    backend = voyager_backend(model)
+    assert backend.voyager_summary_mode == "sync"
+    # Same (st, action, st1), other id and path: one summary
+    backend.store_experience(make_exp("t0", 1))
+    backend.store_experience(make_exp("t1", 1))
+    assert model.calls == 1
+    key = backend._voyager_summary_key(backend.exp_store["t0_1"])
+    assert key == f"{backend._voyager_transition_digest(backend.exp_store['t0_1'])}:{backend._summary_prompt_hash}:mock-model"
+    assert backend.summary_cache.get(key) == "Moved right, SAFE."
+    assert backend.exp_store["t1_1"]["voyager_summary"] == "Moved right, SAFE."
+    # Another transition, another model: new summaries
+    backend.store_experience(make_exp("t0", 2))
+    assert model.calls == 2
+    model.model_name = "other-model"
+    backend.store_experience(make_exp("t2", 1))
+    assert model.calls == 3
+    assert len(backend.summary_cache) == 3
+    backend.close()
+
+    # The cache survives a restart, but an edited prompt template misses every old entry
+    model = sync_model("Moved right, SAFE.")
+    backend = voyager_backend(model)
+    assert len(backend.summary_cache) == 3
+    backend.store_experience(make_exp("t3", 1))
+    assert model.calls == 0
+    backend.close()
+    monkeypatch.setattr(frozenLake_exp_voyager_backend, "FROZENLAKE_SUMMARY_PROMPT", frozenLake_exp_voyager_backend.FROZENLAKE_SUMMARY_PROMPT + "\n")
+    backend = voyager_backend(model)
+    backend.store_experience(make_exp("t4", 1))
+    assert model.calls == 1
+
+
+def test_summary_cache_failed_summaries_are_not_cached(voyager_backend):
+    model = sync_model("")
+    backend = voyager_backend(model)
+    backend.store_experience(make_exp("t0", 1))
+    backend.store_experience(make_exp("t1", 1))
+    assert model.calls == 2
+    assert len(backend.summary_cache) == 0
+
+
+def test_summary_cache_invalidated_on_deprecation(voyager_backend, tmp_path):
+    model = sync_model("Moved right, SAFE.")
+    backend = voyager_backend(model)
+    backend.store_experience(make_exp("t0", 1))
+    backend.store_experience(make_exp("t1", 1))
+    backend.store_experience(make_exp("t0", 2))
+    shared = backend._voyager_summary_key(backend.exp_store["t0_1"])
+    # t1_1 still uses the transition of t0_1
+    backend.bulk_deprecate(["t0_1"])
+    assert backend.summary_cache.get(shared) == "Moved right, SAFE."
+    # Its last experience is gone
+    backend.bulk_deprecate(["t1_1"])
+    assert backend.summary_cache.get(shared) is None
+    assert len(backend.summary_cache) == 1
+    backend.close()
+    assert len(read_json(tmp_path / "exp_store_summaries.json")) == 1
+
+    # Deprecated while the summary cache was not written (e.g. killed): dropped when loading
+    backend = voyager_backend(model)
+    backend.summary_cache.save = lambda: False
+    backend._deprecate_experience("t0_2")
+    backend.close()
+    assert len(read_json(tmp_path / "exp_store_summaries.json")) == 1
+    backend = voyager_backend(model)
+    assert len(backend.summary_cache) == 0
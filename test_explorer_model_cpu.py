@@ -0,0 +1,229 @@
+"""
+CPU checks of the local HF explorer models on a tiny random Llama checkpoint that is built on
+the fly (tokenizer trained on a few prompts, random weights), so no download or GPU is needed.
+
+    python -m pytest -q test_explorer_model_cpu.py
+    python test_explorer_model_cpu.py
+"""
+import os
+import sys
+import tempfile
+
+# 确保能引用到 global_verifier 目录
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, processors, trainers
+from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+
+from env_adaptors.adopter_util import (
+    static_prompt_prefix,
+    format_full_llama_prompt,
+    format_full_qwen_prompt,
+    format_full_mistral_prompt,
+    format_full_internlm_prompt,
+    format_full_deepseek_prompt,
+)
+from explorer_model.llama3_explorer_model import Llama3ExplorerModel
+from explorer_model.qwen_explorer_model import QwenExplorerModel
+from explorer_model.mistral_explorer_model import MistralExplorerModel
+from explorer_model.internlm_explorer_model import InternLMExplorerModel
+from explorer_model.deepseek_explorer_model import DeepSeekExplorerModel
+from explorer_model.constrained_choice import score_continuations
+from explorer_model.model_util import trim_generated_ids, truncate_at_stop
+from explorer_model.stopping import PatternStoppingCriteria
+
+
+SYSTEM_PROMPT = "You are an intelligent exploration agent navigating a web shop. Respond with only the action."
+USER_PROMPTS = [
+    "Instruction: buy a red shirt.\nAvailable actions: search, click[back to search]",
+    "Go.",
+    "Instruction: find blue running shoes under 50 dollars, size 9.\nCurrent page: results\nAvailable actions: click[next >], click[b0123], click[b0456]",
+]
+MODEL_CLASSES = [
+    (Llama3ExplorerModel, format_full_llama_prompt),
+    (QwenExplorerModel, format_full_qwen_prompt),
+    (MistralExplorerModel, format_full_mistral_prompt),
+    (InternLMExplorerModel, format_full_internlm_prompt),
+    (DeepSeekExplorerModel, format_full_deepseek_prompt),
+]
+MAX_NEW_TOKENS = 12
+
+_checkpoint_dir = None
+
+
+def tiny_checkpoint() -> str:
+    """Directory of a tiny random Llama checkpoint with a byte-level BPE tokenizer (built once)."""
+    global _checkpoint_dir
+    if _checkpoint_dir is not None:
+        return _checkpoint_dir
+    path = tempfile.mkdtemp(prefix="tiny_llama_")
+    corpus = [format_full_prompt(SYSTEM_PROMPT, user_prompt) for _, format_full_prompt in MODEL_CLASSES for user_prompt in USER_PROMPTS]
+    corpus += ["click[buy now]", "click[< prev]", "search[red shirt]", "0 1 2 3"]
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=512,
+        special_tokens=["<s>", "</s>"],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(corpus, trainer)
+    # A BOS on every encoding, like the real checkpoints
+    tokenizer.post_processor = processors.TemplateProcessing(single="<s> $A", special_tokens=[("<s>", tokenizer.token_to_id("<s>"))])
+    # No pad token: the models fall back to EOS
+    hf_tokenizer = PreTrainedTokenizerFast(tokenizer_object=tokenizer, bos_token="<s>", eos_token="</s>")
+    hf_tokenizer.save_pretrained(path)
+
+    torch.manual_seed(0)
+    config = LlamaConfig(
+        vocab_size=len(hf_tokenizer),
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=1024,
+        bos_token_id=hf_tokenizer.bos_token_id,
+        eos_token_id=hf_tokenizer.eos_token_id,
+        # Large random weights give peaked logits, so greedy decoding is not decided by float noise
+        initializer_range=0.5,
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+    _checkpoint_dir = path
+    return path
+
+
+def load_greedy(model_class):
+    model = model_class(tiny_checkpoint(), max_new_tokens=MAX_NEW_TOKENS)
+    model.model.float()
+    model.sampling_params = {"do_sample": False}
+    return model
+
+
+def test_batched_generation_matches_single():
+    """Left padded batches (prompts of different lengths) decode like one prompt at a time."""
+    for model_class, format_full_prompt in MODEL_CLASSES:
+        model = load_greedy(model_class)
+        prompts = [format_full_prompt(SYSTEM_PROMPT, user_prompt) for user_prompt in USER_PROMPTS]
+        batched = model.get_next_actions(prompts)
+        single = [model.get_next_action(prompt) for prompt in prompts]
+        assert batched == single, (model_class.__name__, batched, single)
+        assert any(single), model_class.__name__
+
+
+def test_trim_generated_ids():
+    assert trim_generated_ids([5, 6, 2, 2, 2], 2) == [5, 6, 2]
+    assert trim_generated_ids([5, 6, 7], [2, None]) == [5, 6, 7]
+    assert trim_generated_ids([5, 3, 2], [2, 3]) == [5, 3]
+
+
+def test_prefix_cache_multiple_samples():
+    """num_return_sequences > 1 repeats the cached prefix KV over the samples."""
+    for model_class, format_full_prompt in MODEL_CLASSES:
+        model = load_greedy(model_class)
+        # generate() only returns several sequences when sampling, top_k=1 samples the greedy tokens
+        model.sampling_params = {"do_sample": True, "top_k": 1}
+        prompt = format_full_prompt(SYSTEM_PROMPT, USER_PROMPTS[0])
+        single = model.get_next_action(prompt)
+        model.register_prompt_prefix(static_prompt_prefix(format_full_prompt, SYSTEM_PROMPT))
+        model_inputs = model.tokenizer([prompt], return_tensors="pt")
+        if model_class is not DeepSeekExplorerModel:
+            assert "past_key_values" in model.prefix_cache.generate_kwargs([prompt], model_inputs.input_ids, num_return_sequences=3)
+        assert model.get_next_action_samples(prompt, 3) == [single] * 3, model_class.__name__
+
+
+def test_prefix_cache_generation_matches_uncached():
+    """generate() from a copy of the static prefix KV produces the same tokens as a full prefill."""
+    for model_class, format_full_prompt in MODEL_CLASSES:
+        if model_class is DeepSeekExplorerModel:
+            # No prefix KV cache (use_cache=False)
+            continue
+        model = load_greedy(model_class)
+        model.register_prompt_prefix(static_prompt_prefix(format_full_prompt, SYSTEM_PROMPT))
+        for user_prompt in USER_PROMPTS:
+            prompt = format_full_prompt(SYSTEM_PROMPT, user_prompt)
+            model_inputs = model.tokenizer([prompt], return_tensors="pt")
+            prefix_kwargs = model.prefix_cache.generate_kwargs([prompt], model_inputs.input_ids)
+            assert "past_key_values" in prefix_kwargs, model_class.__name__
+            generate_kwargs = {"max_new_tokens": MAX_NEW_TOKENS, "do_sample": False, "pad_token_id": model.tokenizer.pad_token_id}
+            with torch.no_grad():
+                cached = model.model.generate(**model_inputs, **generate_kwargs, **prefix_kwargs)
+                uncached = model.model.generate(**model_inputs, **generate_kwargs)
+            assert torch.equal(cached, uncached), model_class.__name__
+            # The stored prefix cache is not extended by the calls
+            assert model.get_next_action(prompt) == model.get_next_action(prompt)
+
+
+def test_prefix_cache_constrained_choice_matches_uncached():
+    """choose_action() feeds only the tokens after the cached prefix to forward()."""
+    model = load_greedy(Llama3ExplorerModel)
+    choices = ["0", "1", "2", "3"]
+    prompts = [format_full_llama_prompt(SYSTEM_PROMPT, user_prompt) for user_prompt in USER_PROMPTS]
+    uncached = [model.choose_action(prompt, choices, sample=False) for prompt in prompts]
+    model.register_prompt_prefix(static_prompt_prefix(format_full_llama_prompt, SYSTEM_PROMPT))
+    cached = [model.choose_action(prompt, choices, sample=False) for prompt in prompts]
+    assert cached == uncached
+    assert all(choice in choices for choice in cached)
+
+
+def test_pattern_stopping_per_row():
+    """A stop pattern ends each row of a batch on its own, like stopping the unstopped output at the match."""
+    # Matches at different positions of the random outputs, or not at all
+    stop_pattern = "[A-Z]"
+    for model_class, format_full_prompt in MODEL_CLASSES:
+        model = load_greedy(model_class)
+        prompts = [format_full_prompt(SYSTEM_PROMPT, user_prompt) for user_prompt in USER_PROMPTS]
+        unstopped = [model.get_next_action(prompt) for prompt in prompts]
+        single = [model.get_next_action(prompt, stop_pattern=stop_pattern) for prompt in prompts]
+        batched = model.get_next_actions(prompts, stop_pattern=stop_pattern)
+        assert batched == single, (model_class.__name__, batched, single)
+        assert single == [truncate_at_stop(response, stop_pattern) for response in unstopped], model_class.__name__
+        assert single != unstopped, model_class.__name__
+
+
+def test_pattern_stopping_criteria_rows():
+    model = load_greedy(Llama3ExplorerModel)
+    prompt_ids = model.tokenizer("Go.").input_ids
+    rows = [model.tokenizer(text, add_special_tokens=False).input_ids for text in ["click[b0123]", "click[b0"]]
+    length = max(len(row) for row in rows)
+    # generate() pads the rows that already stopped
+    input_ids = torch.tensor([prompt_ids + row + [model.tokenizer.eos_token_id] * (length - len(row)) for row in rows])
+    criteria = PatternStoppingCriteria(model.tokenizer, len(prompt_ids), r"\]")
+    assert criteria(input_ids, None).tolist() == [True, False]
+
+
+def naive_continuation_score(model, prompt: str, continuation: str) -> float:
+    """Mean log-prob of the continuation tokens, one unpadded forward pass per candidate."""
+    prompt_ids = model.tokenizer(prompt).input_ids
+    full_ids = model.tokenizer(prompt + continuation).input_ids
+    start = 0
+    while start < min(len(prompt_ids), len(full_ids)) and full_ids[start] == prompt_ids[start]:
+        start += 1
+    with torch.no_grad():
+        logits = model.model(input_ids=torch.tensor([full_ids])).logits
+    log_probs = torch.log_softmax(logits.float(), dim=-1)[0]
+    return sum(log_probs[t - 1, full_ids[t]].item() for t in range(start, len(full_ids))) / (len(full_ids) - start)
+
+
+def test_score_continuations_matches_naive():
+    """Batched, right padded scoring (with and without the prefix KV) matches scoring each candidate alone."""
+    model = load_greedy(Llama3ExplorerModel)
+    candidates = ["click[buy now]", "search[red shirt]", "click[< prev]", "0", "click[b0123] because it is red"]
+    for user_prompt in USER_PROMPTS:
+        prompt = format_full_llama_prompt(SYSTEM_PROMPT, user_prompt)
+        expected = [naive_continuation_score(model, prompt, candidate) for candidate in candidates]
+        # batch_size=2: several batches, rows of different lengths in each
+        uncached = score_continuations(model.model, model.tokenizer, prompt, candidates, batch_size=2)
+        model.register_prompt_prefix(static_prompt_prefix(format_full_llama_prompt, SYSTEM_PROMPT))
+        cached = score_continuations(model.model, model.tokenizer, prompt, candidates, prefix_cache=model.prefix_cache, batch_size=2)
+        for scores in [uncached, cached]:
+            assert all(abs(score - expected_score) < 1e-4 for score, expected_score in zip(scores, expected)), (scores, expected)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name} passed")
@@ -1,4 +1,5 @@
 from datetime import datetime
+import uuid
 
 def log_flush(fileIO, txt: str):
     """
@@ -14,6 +15,13 @@ def get_timestamp() -> str:
 def get_timestamp_ms() -> str:
     return datetime.now().strftime('%m-%d_%H:%M:%S.%f')
 
+def new_trajectory_id(label: str) -> str:
+    """
+    Unique id of a new episode. The timestamp keeps ids readable and ordered, the uuid keeps
+    episodes started at the same time (concurrent runners, fast resets) apart.
+    """
+    return f"{get_timestamp_ms()}_{uuid.uuid4().hex}_{label}"
+
 def is_success_trail(score):
     # return score > 0
     return score == 1